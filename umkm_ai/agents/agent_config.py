@@ -0,0 +1,25 @@
+import logging
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Any
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+CONFIG_PATH = Path(__file__).parent.parent / "config" / "agents.yaml"
+
+
+@lru_cache(maxsize=1)
+def load_agent_config() -> Dict[str, Any]:
+    """Load agent configuration from config/agents.yaml (empty when the file is missing)"""
+    if not CONFIG_PATH.exists():
+        logger.warning(f"Agent configuration not found: {CONFIG_PATH}, using defaults")
+        return {}
+    with open(CONFIG_PATH, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f) or {}
+
+
+def get_section(name: str) -> Dict[str, Any]:
+    """Get one top-level section of the agent configuration"""
+    return load_agent_config().get(name) or {}
@@ -0,0 +1,85 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any
+
+from langchain.memory import ConversationSummaryBufferMemory
+from monitoring.tracing import get_tracer
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundSummarizer:
+    """
+    Keeps ConversationSummaryBufferMemory pruning off the request path.
+    Turns are saved to the buffer immediately; when the buffer exceeds
+    max_token_limit, the summarization LLM call runs on a background worker
+    and the new summary is swapped in when it is ready.
+    """
+
+    def __init__(self, memory: ConversationSummaryBufferMemory, background: bool = True):
+        self.memory = memory
+        self.background = background
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="summarizer")
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.prune_pending = False
+
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]):
+        """Save a raw turn now and schedule summarization if the buffer is over its limit"""
+        if not self.background:
+            self.memory.save_context(inputs, outputs)
+            return
+
+        with self.lock:
+            self.memory.chat_memory.add_user_message(inputs["input"])
+            self.memory.chat_memory.add_ai_message(outputs["output"])
+            if self.prune_pending:
+                return
+            self.prune_pending = True
+            generation = self.generation
+
+        self.executor.submit(self._prune, generation)
+
+    def _prune(self, generation: int):
+        """Summarize the oldest messages beyond the token limit, then swap the summary in"""
+        try:
+            with self.lock:
+                self.prune_pending = False
+                if generation != self.generation:
+                    return
+                buffer = list(self.memory.chat_memory.messages)
+                summary = self.memory.moving_summary_buffer
+
+            llm = self.memory.llm
+            buffer_length = llm.get_num_tokens_from_messages(buffer)
+            if buffer_length <= self.memory.max_token_limit:
+                return
+
+            pruned = []
+            while buffer and buffer_length > self.memory.max_token_limit:
+                pruned.append(buffer.pop(0))
+                buffer_length = llm.get_num_tokens_from_messages(buffer)
+
+            with get_tracer().trace("memory.summarize", pruned_messages=len(pruned)):
+                new_summary = self.memory.predict_new_summary(pruned, summary)
+
+            with self.lock:
+                if generation != self.generation:
+                    logger.info("Memory cleared during summarization, discarding summary")
+                    return
+                # Only appends happened meanwhile, so the pruned messages are still at the front
+                del self.memory.chat_memory.messages[:len(pruned)]
+                self.memory.moving_summary_buffer = new_summary
+
+            logger.info(f"Background summarization folded {len(pruned)} messages into the summary")
+
+        except Exception as e:
+            logger.error(f"Error in background summarization: {str(e)}")
+
+    def clear(self):
+        """Clear memory and discard any summarization still in flight"""
+        with self.lock:
+            self.generation += 1
+            self.prune_pending = False
+            self.memory.clear()
@@ -0,0 +1,145 @@
+import logging
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+
+from langchain.schema import HumanMessage, AIMessage, BaseMessage
+
+logger = logging.getLogger(__name__)
+
+# Per-message framing overhead of the chat format (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+class TokenCounter:
+    """Local token counter: tiktoken when its encoding is available, ~4 chars per token otherwise"""
+
+    _encodings = {}
+    _lock = threading.Lock()
+
+    def __init__(self, model_name: str = "gpt-4o"):
+        self.model_name = model_name
+        self.encoding = self._get_encoding(model_name)
+
+    @classmethod
+    def _get_encoding(cls, model_name: str):
+        with cls._lock:
+            if model_name not in cls._encodings:
+                try:
+                    import tiktoken
+                    try:
+                        cls._encodings[model_name] = tiktoken.encoding_for_model(model_name)
+                    except KeyError:
+                        cls._encodings[model_name] = tiktoken.get_encoding("cl100k_base")
+                except Exception as e:
+                    # Missing package or encoding file (offline): fall back to the heuristic for good
+                    logger.warning(f"tiktoken unavailable for {model_name}, using approximate counts: {str(e)}")
+                    cls._encodings[model_name] = None
+            return cls._encodings[model_name]
+
+    def count(self, text: str) -> int:
+        """Count tokens in a string"""
+        if not text:
+            return 0
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        return max(1, (len(text) + 3) // 4)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Cut text to at most max_tokens tokens"""
+        if max_tokens <= 0 or not text:
+            return ""
+        if self.encoding is not None:
+            tokens = self.encoding.encode(text, disallowed_special=())
+            if len(tokens) <= max_tokens:
+                return text
+            return self.encoding.decode(tokens[:max_tokens])
+        return text[:max_tokens * 4]
+
+
+def count_tokens(text: str, model_name: str = "gpt-4o") -> int:
+    """Count tokens in a string for the given model"""
+    return TokenCounter(model_name).count(text)
+
+
+class ContextBuilder:
+    """
+    Token-aware prompt context assembly shared by the SQL and RAG agents.
+    Fills a hard per-request budget in priority order: current question,
+    conversation summary, recent turns (newest first), knowledge snippets.
+    """
+
+    def __init__(self, max_tokens: int, model_name: str = "gpt-4o", max_turns: int = 4,
+                 answer_tokens: Optional[int] = None):
+        self.max_tokens = max_tokens
+        self.max_turns = max_turns
+        self.answer_tokens = answer_tokens
+        self.counter = TokenCounter(model_name)
+
+    def _cost(self, text: str) -> int:
+        return self.counter.count(text) + MESSAGE_OVERHEAD_TOKENS
+
+    def _pair_turns(self, history: List[BaseMessage]) -> List[Tuple[str, str]]:
+        """Group chat history into (question, answer) turns"""
+        turns = []
+        pending_question = None
+        for message in history:
+            if isinstance(message, HumanMessage):
+                pending_question = message.content
+            elif isinstance(message, AIMessage) and pending_question is not None:
+                turns.append((pending_question, message.content))
+                pending_question = None
+        return turns
+
+    def build(self, question: str, summary: str = "", history: Optional[List[BaseMessage]] = None,
+              snippets: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Select the context that fits the token budget
+
+        Args:
+            question (str): Current user question (always included, truncated only if it alone exceeds the budget)
+            summary (str): Conversation summary
+            history (List[BaseMessage]): Chat history, oldest first
+            snippets (List[str]): Knowledge snippets in priority order
+
+        Returns:
+            Dict[str, Any]: Selected question, summary, turns (chronological), snippets and token total
+        """
+        remaining = self.max_tokens
+
+        question = self.counter.truncate(question, remaining - MESSAGE_OVERHEAD_TOKENS)
+        remaining -= self._cost(question)
+
+        selected_summary = ""
+        if summary and remaining > MESSAGE_OVERHEAD_TOKENS:
+            selected_summary = self.counter.truncate(summary, remaining - MESSAGE_OVERHEAD_TOKENS)
+            remaining -= self._cost(selected_summary)
+
+        selected_turns = []
+        for turn_question, turn_answer in reversed(self._pair_turns(history or [])[-self.max_turns:]):
+            if self.answer_tokens is not None:
+                shortened = self.counter.truncate(turn_answer, self.answer_tokens)
+                turn_answer = shortened if shortened == turn_answer else f"{shortened}..."
+            cost = self._cost(turn_question) + self._cost(turn_answer)
+            if cost > remaining:
+                break
+            selected_turns.append((turn_question, turn_answer))
+            remaining -= cost
+        selected_turns.reverse()
+
+        selected_snippets = []
+        for snippet in snippets or []:
+            cost = self._cost(snippet)
+            if cost <= remaining:
+                selected_snippets.append(snippet)
+                remaining -= cost
+
+        used = self.max_tokens - remaining
+        logger.debug(f"Context built: {used}/{self.max_tokens} tokens, {len(selected_turns)} turns, "
+                     f"{len(selected_snippets)}/{len(snippets or [])} snippets")
+        return {
+            "question": question,
+            "summary": selected_summary,
+            "turns": selected_turns,
+            "snippets": selected_snippets,
+            "tokens": used
+        }
@@ -0,0 +1,106 @@
+import logging
+import os
+from pathlib import Path
+from typing import Optional
+
+from agents.sql_tools import UMKM_TABLES
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = Path(__file__).parent.parent / "data" / "snapshots"
+DIALECT_PROMPT = Path(__file__).parent.parent / "prompts" / "sql_dialect_duckdb.txt"
+
+
+def _import_duckdb():
+    try:
+        import duckdb
+        import duckdb_engine  # noqa: F401  (SQLAlchemy dialect used by SQLDatabase)
+    except ImportError:
+        raise ImportError("duckdb and duckdb-engine are required for the DuckDB backend: "
+                          "pip install duckdb duckdb-engine")
+    return duckdb
+
+
+def _parquet_glob(snapshot_dir: Path, table_name: str) -> str:
+    # One directory per table; any hive-style partition subdirectories below it
+    return str((snapshot_dir / table_name).resolve() / "**" / "*.parquet").replace("'", "''")
+
+
+def build_snapshot_database(snapshot_dir: Path = SNAPSHOT_DIR, database_path: Optional[Path] = None,
+                            materialize: bool = True) -> Path:
+    """
+    Build a DuckDB database exposing the Parquet snapshots as the `umkm` schema
+
+    Args:
+        snapshot_dir (Path): Snapshot root with one directory of Parquet files per table
+        database_path (Path): DuckDB file to (re)build (default: <snapshot_dir>/umkm.duckdb)
+        materialize (bool): Load the snapshots into columnar tables (True) or query the
+            Parquet files in place through views (False, less memory, slower queries)
+
+    Returns:
+        Path: The database file
+    """
+    duckdb = _import_duckdb()
+    snapshot_dir = Path(snapshot_dir)
+    database_path = Path(database_path or snapshot_dir / "umkm.duckdb")
+    database_path.parent.mkdir(parents=True, exist_ok=True)
+
+    # Build next to the live file and swap it in, so running readers never see a partial database
+    build_path = database_path.with_name(database_path.name + ".build")
+    for stale in (build_path, build_path.with_name(build_path.name + ".wal")):
+        if stale.exists():
+            stale.unlink()
+
+    connection = duckdb.connect(str(build_path))
+    try:
+        connection.execute("CREATE SCHEMA IF NOT EXISTS umkm")
+        kind = "TABLE" if materialize else "VIEW"
+        for table_name in UMKM_TABLES:
+            if not any((snapshot_dir / table_name).rglob("*.parquet")):
+                logger.warning(f"No Parquet snapshot for {table_name} in {snapshot_dir}")
+                continue
+            # Files carry every column (partition directories are for pruning and tooling only)
+            connection.execute(
+                f"CREATE {kind} umkm.{table_name} AS SELECT * FROM "
+                f"read_parquet('{_parquet_glob(snapshot_dir, table_name)}', hive_partitioning = false, "
+                f"union_by_name = true)"
+            )
+            rows = connection.execute(f"SELECT count(*) FROM umkm.{table_name}").fetchone()[0]
+            logger.info(f"DuckDB {kind.lower()} umkm.{table_name}: {rows:,} rows")
+        connection.execute("CHECKPOINT")
+    finally:
+        connection.close()
+
+    os.replace(build_path, database_path)
+    return database_path
+
+
+def connect_snapshot_database(snapshot_dir: Path = SNAPSHOT_DIR, materialize: bool = True,
+                              rebuild: bool = True):
+    """
+    SQLDatabase over the DuckDB snapshot database, opened read-only
+
+    The agent then runs in-process against the same `umkm` schema as PostgreSQL,
+    with vectorized aggregation and no network hop.
+    """
+    _import_duckdb()
+    from langchain_community.utilities import SQLDatabase
+
+    snapshot_dir = Path(snapshot_dir)
+    database_path = snapshot_dir / "umkm.duckdb"
+    if rebuild or not database_path.exists():
+        build_snapshot_database(snapshot_dir, database_path, materialize=materialize)
+
+    return SQLDatabase.from_uri(
+        f"duckdb:///{database_path}",
+        schema="umkm",
+        include_tables=list(UMKM_TABLES),
+        view_support=True,
+        engine_args={"connect_args": {"read_only": True}}
+    )
+
+
+def dialect_prompt() -> str:
+    """System prompt addendum describing DuckDB's differences from PostgreSQL"""
+    with open(DIALECT_PROMPT, "r", encoding="utf-8") as f:
+        return f.read()
@@ -0,0 +1,99 @@
+import contextvars
+import hashlib
+import logging
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional, Tuple
+
+from knowledge.bm25 import STOPWORDS
+from monitoring.metrics import CACHE_REQUESTS
+from monitoring.tracing import get_tracer, get_callbacks
+from pipeline.data_version import DataVersionStore
+
+logger = logging.getLogger(__name__)
+
+INSIGHT_MODES = ("inline", "deferred", "off")
+
+# Stopwords for retrieval, but they flip the meaning of a question ("produk yang tidak laku", "belum lunas")
+MEANING_WORDS = {"tidak", "belum", "sudah", "bukan", "tanpa", "kurang", "not", "no", "without"}
+
+
+def intent_key(question: str) -> str:
+    """Order- and stopword-insensitive form of a question (negations kept), so rephrasings share cached insights"""
+    words = re.findall(r"\w+", question.lower())
+    return " ".join(sorted({word for word in words if word not in STOPWORDS or word in MEANING_WORDS}))
+
+
+def data_key(answer: str) -> str:
+    """Hash of the data answer the insights are generated from"""
+    return hashlib.sha256(answer.encode("utf-8")).hexdigest()[:16]
+
+
+class InsightService:
+    """
+    Business insights for SQL answers, generated off the answer path.
+
+    Insights are cached per (question intent, data answer, data version): the
+    same question answered with the same figures never pays for a second LLM
+    call, and a data reload invalidates them. Generation runs on a small background pool; concurrent
+    requests for the same key share one Future.
+    """
+
+    def __init__(self, llm, build_prompt: Callable[[str, str], Tuple[str, bool]],
+                 mode: str = "deferred", cache_size: int = 256, max_workers: int = 2,
+                 data_version: Optional[DataVersionStore] = None):
+        if mode not in INSIGHT_MODES:
+            raise ValueError(f"Unknown insights mode {mode!r}, expected one of {INSIGHT_MODES}")
+        self.llm = llm
+        self.build_prompt = build_prompt
+        self.mode = mode
+        self.cache_size = cache_size
+        self.data_version = data_version or DataVersionStore()
+        self.cache: "OrderedDict[Tuple[str, str, int], Future]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="insights")
+
+    def _key(self, question: str, answer: str) -> Tuple[str, str, int]:
+        return intent_key(question), data_key(answer), self.data_version.current()
+
+    def _generate(self, question: str, answer: str) -> str:
+        prompt, is_indonesian = self.build_prompt(question, answer)
+        with get_tracer().span("sql_agent.business_insights", language="id" if is_indonesian else "en"):
+            return self.llm.invoke(prompt, config={"callbacks": get_callbacks()}).content
+
+    def request(self, question: str, answer: str) -> Future:
+        """Get (or start generating) the insights for an answer"""
+        key = self._key(question, answer)
+        with self.lock:
+            future = self.cache.get(key)
+            if future is not None and not (future.done() and future.exception() is not None):
+                self.cache.move_to_end(key)
+                CACHE_REQUESTS.inc(cache="insights", result="hit")
+                return future
+
+            CACHE_REQUESTS.inc(cache="insights", result="miss")
+            # Keep the caller's trace context so the span nests under the chat message
+            future = self.executor.submit(contextvars.copy_context().run, self._generate, question, answer)
+            self.cache[key] = future
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+            return future
+
+    def pending(self, question: str, answer: str) -> Optional[Future]:
+        """Insights already requested for this answer on the current data, if any"""
+        with self.lock:
+            return self.cache.get(self._key(question, answer))
+
+    def get(self, question: str, answer: str, timeout: Optional[float] = None) -> str:
+        """Insights for an answer, waiting for generation (empty string on failure)"""
+        try:
+            return self.request(question, answer).result(timeout=timeout)
+        except Exception as e:
+            logger.error(f"Error adding insights: {str(e)}")
+            return ""
+
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
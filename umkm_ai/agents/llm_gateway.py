@@ -0,0 +1,332 @@
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, List, Optional, Sequence
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from agents.agent_config import get_section
+from agents.context_builder import count_tokens, MESSAGE_OVERHEAD_TOKENS
+from monitoring.metrics import LLM_GATEWAY_EVENTS
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+# Used for tasks (or settings) missing from the models section of config/agents.yaml
+TASK_DEFAULTS = {
+    "router": {"model": "gpt-4o-mini", "temperature": 0, "max_tokens": 20},
+    # No fallback: switching models in the middle of a tool-calling loop mixes two planners
+    "sql_planning": {"model": "gpt-4o", "temperature": 0.3, "fallback_model": ""},
+    "narration": {"model": "gpt-4o-mini", "temperature": 0.3},
+    "insights": {"model": "gpt-4o-mini", "temperature": 0.5},
+    "summarization": {"model": "gpt-4o-mini", "temperature": 0},
+    "rag": {"model": "gpt-4o", "temperature": 0.7}
+}
+
+# Shared by every gateway so hedges and fallbacks never block on each other's slot.
+# Calls that lose the race stop at their next retry, so abandoned work holds a worker
+# for at most one request timeout.
+_EXECUTOR = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-gateway")
+
+
+class CallAbandoned(Exception):
+    """Raised inside a hedge/fallback/primary call once another attempt has already answered"""
+
+
+class TokenBucket:
+    """Blocking token bucket: `rate` units per minute with bursts up to `capacity`"""
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.available = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, amount: float = 1, timeout: Optional[float] = None) -> bool:
+        """Take `amount` units, waiting for the bucket to refill; False on timeout"""
+        amount = min(amount, self.capacity)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.available >= amount:
+                    self.available -= amount
+                    return True
+                delay = (amount - self.available) / self.rate
+            if deadline is not None and time.monotonic() + delay > deadline:
+                return False
+            time.sleep(min(delay, 1.0))
+
+
+class RateLimiter:
+    """Client-side request and token limits for one model"""
+
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    def acquire(self, tokens: int, timeout: Optional[float] = None) -> bool:
+        if self.requests and not self.requests.acquire(1, timeout):
+            return False
+        if self.tokens and not self.tokens.acquire(tokens, timeout):
+            return False
+        return True
+
+
+_LIMITERS: Dict[str, RateLimiter] = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+def get_rate_limiter(model_name: str) -> RateLimiter:
+    """Process-wide limiter per model (limits from llm_gateway.rate_limits in config/agents.yaml)"""
+    with _LIMITERS_LOCK:
+        if model_name not in _LIMITERS:
+            limits = (get_section("llm_gateway").get("rate_limits") or {}).get(model_name) or {}
+            _LIMITERS[model_name] = RateLimiter(limits.get("requests_per_minute"), limits.get("tokens_per_minute"))
+        return _LIMITERS[model_name]
+
+
+def _model_name(model: BaseChatModel) -> str:
+    return getattr(model, "model_name", None) or getattr(model, "model", None) or model._llm_type
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None and getattr(error, "response", None) is not None:
+        status = getattr(error.response, "status_code", None)
+    return status
+
+
+def is_retryable(error: BaseException) -> bool:
+    """429, 5xx, timeouts and connection errors are worth retrying; 4xx request errors are not"""
+    status = _status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return type(error).__name__ in {"APITimeoutError", "APIConnectionError", "Timeout", "TimeoutError",
+                                    "ConnectionError", "ReadTimeout", "ConnectTimeout"}
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    """Honor the provider's Retry-After header when present"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        value = headers.get("retry-after-ms")
+        if value:
+            return float(value) / 1000
+        value = headers.get("retry-after")
+        return float(value) if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+class GatewayChatModel(BaseChatModel):
+    """
+    Chat model wrapper that all agents call through.
+
+    Per model it applies a client-side token-bucket rate limit, retries
+    429/5xx/timeouts with exponential backoff and jitter, optionally sends a
+    duplicate (hedged) request when the primary is slow, and falls back to a
+    cheaper/faster model when the primary is slow or keeps failing. Hedge and
+    fallback requests retry at most `secondary_max_retries` times, and every
+    attempt still running once one has answered stops before its next retry.
+    The wrapped models should be created with max_retries=0 so retries happen here.
+    """
+
+    primary: BaseChatModel
+    fallback: Optional[BaseChatModel] = None
+    max_retries: int = 3
+    secondary_max_retries: int = 1
+    backoff_base: float = 0.5
+    backoff_max: float = 8.0
+    hedge_after: Optional[float] = None
+    fallback_after: Optional[float] = None
+    rate_limit_timeout: float = 30.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "llm-gateway"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        # Callbacks label metrics and spans with the primary model
+        return {"model_name": _model_name(self.primary),
+                "fallback": _model_name(self.fallback) if self.fallback else None}
+
+    def get_num_tokens(self, text: str) -> int:
+        # Counted locally (cached tiktoken encoding, heuristic offline) for memory pruning
+        return count_tokens(text, _model_name(self.primary))
+
+    def get_num_tokens_from_messages(self, messages: List[BaseMessage], tools: Optional[Sequence] = None) -> int:
+        return sum(self.get_num_tokens(str(message.content)) + MESSAGE_OVERHEAD_TOKENS for message in messages)
+
+    def bind_tools(self, tools: Sequence[Any], *, tool_choice: Optional[str] = None, **kwargs):
+        """Bind OpenAI-format tools; they are passed through to whichever model answers"""
+        formatted = [convert_to_openai_tool(tool) for tool in tools]
+        if tool_choice:
+            if tool_choice == "any":
+                tool_choice = "required"
+            if tool_choice not in ("auto", "none", "required"):
+                tool_choice = {"type": "function", "function": {"name": tool_choice}}
+            kwargs["tool_choice"] = tool_choice
+        return self.bind(tools=formatted, **kwargs)
+
+    def _call_with_retries(self, model: BaseChatModel, messages: List[BaseMessage],
+                           stop: Optional[List[str]], max_retries: Optional[int] = None,
+                           answered: Optional[threading.Event] = None, **kwargs) -> ChatResult:
+        """Rate-limit, call and retry one model; gives up as soon as `answered` is set"""
+        name = _model_name(model)
+        limiter = get_rate_limiter(name)
+        prompt_tokens = sum(count_tokens(str(message.content), name) for message in messages)
+        max_retries = self.max_retries if max_retries is None else max_retries
+        answered = answered or threading.Event()
+
+        for attempt in range(max_retries + 1):
+            if answered.is_set():
+                raise CallAbandoned(f"{name} call no longer needed")
+            if not limiter.acquire(prompt_tokens, timeout=self.rate_limit_timeout):
+                LLM_GATEWAY_EVENTS.inc(model=name, event="rate_limited")
+                raise TimeoutError(f"Client-side rate limit for {name} not available within {self.rate_limit_timeout}s")
+            try:
+                result = model._generate(messages, stop=stop, **kwargs)
+                result.llm_output = dict(result.llm_output or {}, served_by=name)
+                return result
+            except Exception as e:
+                if attempt >= max_retries or not is_retryable(e) or answered.is_set():
+                    raise
+                delay = _retry_after(e) or min(self.backoff_max, self.backoff_base * 2 ** attempt)
+                delay *= random.uniform(0.8, 1.2)
+                LLM_GATEWAY_EVENTS.inc(model=name, event="retry")
+                logger.warning(f"{name} call failed ({_status_code(e) or type(e).__name__}), "
+                               f"retry {attempt + 1}/{max_retries} in {delay:.1f}s")
+                # Wakes early when another attempt answers during the backoff
+                answered.wait(delay)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs) -> ChatResult:
+        # Attempts start at these offsets (seconds); a failed attempt starts the next one immediately
+        schedule = [(0.0, self.primary, "primary")]
+        if self.hedge_after is not None:
+            schedule.append((self.hedge_after, self.primary, "hedge"))
+        if self.fallback is not None:
+            schedule.append((self.fallback_after if self.fallback_after is not None else float("inf"),
+                             self.fallback, "fallback"))
+        schedule.sort(key=lambda item: item[0])
+
+        started = time.monotonic()
+        answered = threading.Event()
+        pending, last_error = {}, None
+        while schedule or pending:
+            now = time.monotonic() - started
+            if schedule and (not pending or schedule[0][0] <= now):
+                _, model, kind = schedule.pop(0)
+                max_retries = None
+                if kind != "primary":
+                    max_retries = self.secondary_max_retries
+                    LLM_GATEWAY_EVENTS.inc(model=_model_name(model), event=kind)
+                    logger.info(f"LLM gateway: starting {kind} request on {_model_name(model)} after {now:.1f}s")
+                pending[_EXECUTOR.submit(self._call_with_retries, model, messages, stop,
+                                         max_retries=max_retries, answered=answered, **kwargs)] = kind
+                continue
+
+            timeout = max(0.0, schedule[0][0] - now) if schedule and schedule[0][0] != float("inf") else None
+            done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                kind = pending.pop(future)
+                if future.exception() is None:
+                    # Attempts still in flight finish their current request, then stop; queued ones never start
+                    answered.set()
+                    for loser in pending:
+                        loser.cancel()
+                    return future.result()
+                last_error = future.exception()
+                logger.warning(f"LLM gateway {kind} attempt failed: {str(last_error)}")
+                if kind != "fallback":
+                    # The primary already used up its retries; a hedge would only repeat them
+                    schedule = [item for item in schedule if item[2] != "hedge"]
+
+        raise last_error
+
+
+def create_chat_model(model_name: str, temperature: float = 0.0, base_url: Optional[str] = None,
+                      api_key_env: str = "OPENAI_API_KEY", fallback_model: Optional[str] = None,
+                      fallback_base_url: Optional[str] = None, fallback_api_key_env: Optional[str] = None,
+                      **model_kwargs) -> BaseChatModel:
+    """
+    Create an OpenAI-compatible chat model behind the gateway, configured from llm_gateway in config/agents.yaml
+
+    Args:
+        model_name (str): Primary model
+        temperature (float): Sampling temperature (also used for the fallback model)
+        base_url (str): OpenAI-compatible endpoint (e.g. a local vLLM/Ollama server); default is OpenAI
+        api_key_env (str): Environment variable holding the API key for the endpoint
+        fallback_model (str): Model used when the primary is slow or failing; "" disables it. None uses
+            llm_gateway.fallback_model, except on a custom base_url without fallback_base_url (a local
+            server rarely serves that model), where the fallback is off
+        fallback_base_url (str): Endpoint of the fallback model; default is base_url
+        fallback_api_key_env (str): API key variable for fallback_base_url; default is api_key_env
+        **model_kwargs: Extra ChatOpenAI arguments (e.g. max_tokens)
+    """
+    from langchain_openai import ChatOpenAI
+
+    config = get_section("llm_gateway")
+
+    def build(name: str, url: Optional[str], key_env: str) -> ChatOpenAI:
+        endpoint = {"openai_api_base": url} if url else {}
+        return ChatOpenAI(
+            model_name=name,
+            temperature=temperature,
+            # Local servers usually accept any key
+            openai_api_key=os.getenv(key_env) or ("not-needed" if url else None),
+            max_retries=0,
+            timeout=config.get("request_timeout_seconds", 60),
+            **endpoint,
+            **model_kwargs
+        )
+
+    if fallback_model is None:
+        fallback_model = "" if base_url and not fallback_base_url else config.get("fallback_model")
+    fallback_base_url = fallback_base_url or base_url
+    fallback = None
+    if fallback_model and (fallback_model != model_name or fallback_base_url != base_url):
+        fallback = build(fallback_model, fallback_base_url, fallback_api_key_env or api_key_env)
+    return GatewayChatModel(
+        primary=build(model_name, base_url, api_key_env),
+        fallback=fallback,
+        max_retries=config.get("max_retries", 3),
+        secondary_max_retries=config.get("secondary_max_retries", 1),
+        backoff_base=config.get("backoff_base_seconds", 0.5),
+        backoff_max=config.get("backoff_max_seconds", 8.0),
+        hedge_after=config.get("hedge_after_seconds"),
+        fallback_after=config.get("fallback_after_seconds"),
+        rate_limit_timeout=config.get("rate_limit_timeout_seconds", 30.0)
+    )
+
+
+def get_task_settings(task: str) -> Dict[str, Any]:
+    """Model settings for a task: TASK_DEFAULTS overlaid with the models section of config/agents.yaml"""
+    return dict(TASK_DEFAULTS.get(task, {}), **(get_section("models").get(task) or {}))
+
+
+def create_task_model(task: str, **overrides) -> BaseChatModel:
+    """
+    Create the chat model assigned to a task (router, sql_planning, narration, insights, summarization, rag)
+
+    Args:
+        task (str): Task name in the models section of config/agents.yaml
+        **overrides: Settings that take precedence over the configuration (used by the evaluation harness)
+    """
+    settings = dict(get_task_settings(task), **overrides)
+    model_name = settings.pop("model")
+    return create_chat_model(model_name, **settings)
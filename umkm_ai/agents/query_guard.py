@@ -0,0 +1,193 @@
+import logging
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from monitoring.metrics import QUERY_GUARD_EVENTS
+from monitoring.tracing import get_tracer
+
+logger = logging.getLogger(__name__)
+
+_READ_STATEMENT = re.compile(r"^\s*(?:\(\s*)*(select|with|values|table)\b", re.IGNORECASE)
+# Tokens that may legitimately contain ';', matched leftmost-first like the PostgreSQL lexer:
+# E'' strings (backslash escapes), '' strings, $tag$ quotes, "identifiers" and comments
+_NON_CODE = re.compile(
+    r"(?<![\w$])[eE]'(?:[^'\\]|\\.|'')*'"
+    r"|'(?:[^']|'')*'"
+    r"|(?<![\w$])(\$(?:[A-Za-z_]\w*)?\$).*?\1"
+    r'|"(?:[^"]|"")*"'
+    r"|--[^\n]*"
+    r"|/\*.*?\*/",
+    re.DOTALL
+)
+# Agent SQL is sent verbatim: stops the driver treating % in LIKE patterns as parameter markers
+_RAW = {"no_parameters": True}
+
+
+class QueryRejected(Exception):
+    """Raised when agent SQL is refused before or during execution"""
+
+
+def is_single_statement(sql: str) -> bool:
+    """
+    True when no ';' is left outside literals, quoted identifiers and comments.
+    psycopg2 sends text through the simple protocol, which runs every statement
+    in it: `SELECT 1; COMMIT; DELETE ...` would end the read-only transaction.
+    """
+    return ";" not in _NON_CODE.sub(" ", sql)
+
+
+def _truncate_value(value: Any, max_length: int) -> Any:
+    if isinstance(value, str) and len(value) > max_length:
+        return value[:max_length] + "..."
+    return value
+
+
+class QueryGuard:
+    """
+    Executes agent-generated SQL with hard limits so one bad query cannot hog
+    the database or blow up the prompt:
+
+    - only single read statements, inside a READ ONLY transaction
+    - a per-statement `statement_timeout`
+    - an EXPLAIN cost estimate checked against `max_cost` before running
+    - at most `max_rows` rows / `max_bytes` of result text, with the total row
+      count appended when the result was truncated
+
+    On other engines than PostgreSQL (the DuckDB snapshot, opened read-only)
+    only the row and byte caps apply. Replica failover happens in the engine
+    itself (see SQLAgent._connect_database).
+    """
+
+    def __init__(self, engine, schema: Optional[str] = "umkm", statement_timeout_ms: int = 15000,
+                 max_cost: float = 5_000_000, max_rows: int = 200, max_bytes: int = 16_000,
+                 max_string_length: int = 300):
+        self.engine = engine
+        self.schema = schema
+        self.statement_timeout_ms = int(statement_timeout_ms)
+        self.max_cost = max_cost
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.max_string_length = max_string_length
+        self.is_postgres = engine is not None and engine.dialect.name == "postgresql"
+
+    @classmethod
+    def from_config(cls, db, config: Dict[str, Any]) -> "QueryGuard":
+        """Build a guard for a LangChain SQLDatabase from the query_guard config section"""
+        return cls(
+            db._engine,
+            schema=db._schema,
+            statement_timeout_ms=config.get("statement_timeout_ms", 15000),
+            max_cost=config.get("max_cost", 5_000_000),
+            max_rows=config.get("max_rows", 200),
+            max_bytes=config.get("max_bytes", 16_000)
+        )
+
+    def _prepare(self, connection):
+        """Pin the transaction to read-only with a local timeout (must run before any other statement)"""
+        if not self.is_postgres:
+            if self.schema:
+                connection.exec_driver_sql(f"SET search_path TO {self.schema}")
+            return
+        connection.exec_driver_sql("SET TRANSACTION READ ONLY")
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {self.statement_timeout_ms}")
+        if self.schema:
+            connection.exec_driver_sql(f"SET LOCAL search_path TO {self.schema}")
+
+    def _explain(self, connection, sql: str) -> Tuple[float, int]:
+        """Planner estimate (total cost, rows) of a statement"""
+        plan = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}", execution_options=_RAW).scalar()
+        root = plan[0]["Plan"] if isinstance(plan, list) else plan["Plan"]
+        return float(root.get("Total Cost", 0)), int(root.get("Plan Rows", 0))
+
+    def _count(self, connection, sql: str) -> Optional[int]:
+        """Exact row count of a truncated result (None if counting itself hits the timeout)"""
+        try:
+            if not self.is_postgres:
+                return connection.exec_driver_sql(
+                    f"SELECT count(*) FROM ({sql}) AS guarded_count", execution_options=_RAW).scalar()
+            with connection.begin_nested():
+                return connection.exec_driver_sql(
+                    f"SELECT count(*) FROM ({sql}) AS guarded_count", execution_options=_RAW).scalar()
+        except Exception as e:
+            logger.info(f"Could not count rows of truncated result: {str(e)}")
+            return None
+
+    def _format(self, columns: List[str], rows: List[tuple], include_columns: bool) -> Tuple[str, int]:
+        """Render rows like SQLDatabase.run, stopping once the byte budget is used; returns (text, rows kept)"""
+        rendered = []
+        size = 2
+        for row in rows:
+            values = tuple(_truncate_value(v, self.max_string_length) for v in row)
+            item = repr(dict(zip(columns, values)) if include_columns else values)
+            if rendered and size + len(item) + 2 > self.max_bytes:
+                break
+            rendered.append(item)
+            size += len(item) + 2
+        return "[" + ", ".join(rendered) + "]", len(rendered)
+
+    def run(self, sql: str, include_columns: bool = False) -> str:
+        """Execute one read statement under the guard and return its (possibly truncated) rows as text"""
+        statement = sql.strip().rstrip(";").strip()
+        if not _READ_STATEMENT.match(statement):
+            QUERY_GUARD_EVENTS.inc(event="rejected_write")
+            raise QueryRejected("Only read-only SELECT queries are allowed.")
+        if not is_single_statement(statement):
+            QUERY_GUARD_EVENTS.inc(event="rejected_write")
+            raise QueryRejected("Only one statement per query is allowed; remove the ';' separators.")
+
+        with get_tracer().span("sql_agent.guarded_query") as span:
+            try:
+                with self.engine.connect() as connection, connection.begin():
+                    self._prepare(connection)
+
+                    cost, estimated_rows = self._explain(connection, statement) if self.is_postgres else (0.0, 0)
+                    span.set_attribute("estimated_cost", cost)
+                    if self.max_cost and cost > self.max_cost:
+                        QUERY_GUARD_EVENTS.inc(event="rejected_cost")
+                        raise QueryRejected(
+                            f"Query rejected: estimated cost {cost:,.0f} exceeds the limit of {self.max_cost:,.0f} "
+                            f"(about {estimated_rows:,} rows). Add filters (bisnis_id, date range), aggregate "
+                            f"with GROUP BY or use LIMIT instead of selecting raw rows."
+                        )
+
+                    result = connection.exec_driver_sql(statement, execution_options=_RAW)
+                    if not result.returns_rows:
+                        return ""
+                    columns = list(result.keys())
+                    rows = result.fetchmany(self.max_rows + 1)
+                    text, kept = self._format(columns, rows[:self.max_rows], include_columns)
+                    truncated = len(rows) > kept
+                    result.close()
+
+                    if not rows:
+                        return ""
+                    if not truncated:
+                        span.set_attribute("rows", kept)
+                        return text
+
+                    total = self._count(connection, statement)
+                    span.set_attribute("rows", kept)
+                    span.set_attribute("total_rows", total)
+                    QUERY_GUARD_EVENTS.inc(event="truncated")
+                    total_text = f"{total:,}" if total is not None else f"about {estimated_rows:,} (estimated)"
+                    return (
+                        f"{text}\n(Showing the first {kept:,} of {total_text} rows. "
+                        f"Aggregate or filter the query to cover all rows.)"
+                    )
+            except QueryRejected:
+                raise
+            except Exception as e:
+                if "statement timeout" in str(e).lower():
+                    QUERY_GUARD_EVENTS.inc(event="timeout")
+                    raise QueryRejected(
+                        f"Query cancelled after {self.statement_timeout_ms / 1000:g}s (statement_timeout). "
+                        f"Simplify the query or narrow it with filters."
+                    ) from e
+                raise
+
+    def run_no_throw(self, sql: str, include_columns: bool = False) -> str:
+        """Like run, but errors come back as text for the agent to act on (SQLDatabase.run_no_throw style)"""
+        try:
+            return self.run(sql, include_columns=include_columns)
+        except Exception as e:
+            return f"Error: {e}"
@@ -1,10 +1,17 @@
 import logging
-from typing import Dict, Any
-from langchain_openai import ChatOpenAI
+from typing import Dict, Any, List
 from langchain.memory import ConversationSummaryBufferMemory
-from langchain.schema import HumanMessage, SystemMessage
+from langchain.schema import HumanMessage, AIMessage, SystemMessage
 import os
 from dotenv import load_dotenv
+from monitoring.tracing import get_tracer, get_callbacks
+from monitoring.metrics import AGENT_LATENCY, AGENT_QUERIES
+import time
+from agents.agent_config import get_section
+from agents.llm_gateway import create_task_model
+from agents.context_builder import ContextBuilder
+from agents.background_memory import BackgroundSummarizer
+from knowledge.retriever import KnowledgeRetriever
 
 # Load environment variables
 load_dotenv()
@@ -20,11 +27,26 @@ class RAGAgent:
     
     def __init__(self):
         self.llm = None
+        self.summary_llm = None
         self.memory = None
+        self.summarizer = None
         self.knowledge_base = {}
+        self.retriever = None
+        self.context_builder = self._create_context_builder()
         self.response_count = 0
         self._initialize()
     
+    def _create_context_builder(self) -> ContextBuilder:
+        """Create the token-budgeted context builder from config/agents.yaml"""
+        budget = get_section("context_budget")
+        settings = budget.get("rag_agent", {})
+        return ContextBuilder(
+            max_tokens=settings.get("max_tokens", 3000),
+            model_name=budget.get("model_name", "gpt-4o"),
+            max_turns=settings.get("max_turns", 3),
+            answer_tokens=settings.get("answer_tokens")
+        )
+    
     def _initialize(self):
         """Initialize the RAG agent with ConversationSummaryBufferMemory"""
         try:
@@ -33,21 +55,23 @@ class RAGAgent:
                 raise ValueError("Missing required environment variable: OPENAI_API_KEY")
             
             # Initialize LLM
-            self.llm = ChatOpenAI(
-                model_name="gpt-4o",
-                temperature=0.7,
-                openai_api_key=os.getenv("OPENAI_API_KEY")
-            )
+            self.llm = create_task_model("rag")
+            self.summary_llm = create_task_model("summarization")
             
             # Initialize ConversationSummaryBufferMemory
+            memory_config = get_section("memory")
             self.memory = ConversationSummaryBufferMemory(
-                llm=self.llm,
-                max_token_limit=4000,
+                llm=self.summary_llm,
+                max_token_limit=memory_config.get("max_token_limit", 4000),
                 memory_key="chat_history",
                 return_messages=True,
                 ai_prefix="Assistant",
                 human_prefix="User"
             )
+            self.summarizer = BackgroundSummarizer(
+                self.memory,
+                background=memory_config.get("summarize_in_background", True)
+            )
             
             # Load knowledge base
             self._load_knowledge_base()
@@ -59,14 +83,16 @@ class RAGAgent:
             raise
     
     def _load_knowledge_base(self):
-        """Load UMKM-specific knowledge base from prompts folder"""
+        """Load UMKM-specific knowledge base from prompts folder and the retrieval index"""
         try:
             # Load base context from prompts folder
             with open("prompts/base_context.txt", "r", encoding="utf-8") as f:
                 base_context = f.read()
             
+            # The opening paragraph is Mas Warung's persona and goes into every prompt
             self.knowledge_base = {
-                "base_context": base_context
+                "base_context": base_context,
+                "persona": base_context.strip().split("\n\n")[0]
             }
             
             logger.info("Knowledge base loaded from prompts/base_context.txt")
@@ -74,10 +100,29 @@ class RAGAgent:
         except Exception as e:
             logger.error(f"Error loading knowledge base: {str(e)}")
             raise FileNotFoundError("prompts/base_context.txt is required but not found")
+        
+        self.retriever = KnowledgeRetriever(get_section("retrieval"))
+        self.retriever.load_or_build()
+    
+    def _get_knowledge_snippets(self, question: str) -> List[str]:
+        """Persona first, then the top-k chunks retrieved for the question"""
+        persona = self.knowledge_base.get("persona", "")
+        snippets = [persona] if persona else []
+        with get_tracer().span("rag_agent.retrieve") as span:
+            chunks = self.retriever.retrieve(question)
+            span.set_attribute("chunks", len(chunks))
+        for chunk in chunks:
+            text = chunk["text"].replace(persona, "").strip() if persona else chunk["text"]
+            if text:
+                snippets.append(text)
+        return snippets
     
-    def _build_system_message(self, question: str) -> str:
-        """Build system message from base context"""
-        return self.knowledge_base.get("base_context", "")
+    def _build_system_message(self, snippets: List[str], summary: str = "") -> str:
+        """Build system message from selected knowledge snippets and conversation summary"""
+        system_message = "\n\n".join(snippets)
+        if summary:
+            system_message += f"\n\nRINGKASAN PERCAKAPAN SEBELUMNYA:\n{summary}"
+        return system_message
     
     def query(self, question: str) -> str:
         """
@@ -89,37 +134,43 @@ class RAGAgent:
         Returns:
             str: Agent's response with business guidance
         """
+        start_time = time.perf_counter()
+        AGENT_QUERIES.inc(agent="rag")
         try:
             self.response_count += 1
             logger.info(f"Processing RAG query #{self.response_count}: {question[:50]}...")
             
-            # Build system message
-            system_message = self._build_system_message(question)
-            
-            # Get conversation history from memory
-            chat_history = self.memory.chat_memory.messages
+            # Select question, summary, recent turns and knowledge within the token budget
+            context = self.context_builder.build(
+                question,
+                summary=getattr(self.memory, 'moving_summary_buffer', "") or "",
+                history=self.memory.chat_memory.messages,
+                snippets=self._get_knowledge_snippets(question)
+            )
             
             # Build messages for LLM
-            messages = [SystemMessage(content=system_message)]
+            messages = [SystemMessage(content=self._build_system_message(context["snippets"], context["summary"]))]
             
             # Add relevant conversation history
-            if chat_history:
-                # Include last 6 messages (3 exchanges) for context
-                recent_history = chat_history[-6:]
-                messages.extend(recent_history)
+            for previous_question, previous_answer in context["turns"]:
+                messages.append(HumanMessage(content=previous_question))
+                messages.append(AIMessage(content=previous_answer))
             
             # Add current question
-            messages.append(HumanMessage(content=question))
+            messages.append(HumanMessage(content=context["question"]))
             
             # Get response from LLM
-            response = self.llm.invoke(messages)
+            with get_tracer().span("rag_agent.llm", history_messages=len(messages) - 2,
+                                   context_tokens=context["tokens"]):
+                response = self.llm.invoke(messages, config={"callbacks": get_callbacks()})
             answer = response.content
             
             # Save to memory
-            self.memory.save_context(
-                {"input": question},
-                {"output": answer}
-            )
+            with get_tracer().span("memory.save_context", agent="rag"):
+                self.summarizer.save_context(
+                    {"input": question},
+                    {"output": answer}
+                )
             
             logger.info(f"RAG query #{self.response_count} completed successfully")
             return answer
@@ -128,6 +179,8 @@ class RAGAgent:
             error_msg = f"Maaf, terjadi kesalahan saat memproses pertanyaan Anda: {str(e)}"
             logger.error(f"Error in RAG query #{self.response_count}: {str(e)}")
             return error_msg
+        finally:
+            AGENT_LATENCY.observe(time.perf_counter() - start_time, agent="rag")
     
     def get_memory_summary(self) -> str:
         """Get current conversation summary from memory"""
@@ -142,7 +195,7 @@ class RAGAgent:
     def clear_memory(self):
         """Clear conversation memory"""
         try:
-            self.memory.clear()
+            self.summarizer.clear()
             self.response_count = 0
             logger.info("Conversation memory cleared")
         except Exception as e:
@@ -166,21 +219,31 @@ class RAGAgent:
             return []
     
     def add_knowledge(self, content: str):
-        """Add new knowledge to the base context"""
+        """Add new knowledge to the retrieval index"""
         try:
-            self.knowledge_base["base_context"] += f"\n\n{content}"
-            logger.info("Added new knowledge to base context")
+            self.retriever.add_text(content)
+            logger.info("Added new knowledge to retrieval index")
         except Exception as e:
             logger.error(f"Error adding knowledge: {str(e)}")
     
+    def index_insight(self, question: str, answer: str, data_version: int = None):
+        """Make a SQL-agent answer retrievable for later advice questions (until the data is reloaded)"""
+        try:
+            if get_section("retrieval").get("index_sql_insights", True):
+                self.retriever.index_insight(question, answer, data_version)
+        except Exception as e:
+            logger.error(f"Error indexing insight: {str(e)}")
+    
     def get_knowledge_base_info(self) -> Dict[str, Any]:
         """Get information about the current knowledge base"""
         try:
             base_length = len(self.knowledge_base.get("base_context", ""))
             return {
                 "base_context_length": base_length,
+                "indexed_chunks": self.retriever.index.size if self.retriever else 0,
+                "embedder": self.retriever.embedder.name if self.retriever else None,
                 "response_count": self.response_count,
-                "status": "loaded_from_prompts_folder"
+                "status": "retrieval_index"
             }
         except Exception as e:
             logger.error(f"Error getting knowledge base info: {str(e)}")
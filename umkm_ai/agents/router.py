@@ -1,8 +1,9 @@
 import logging
-from typing import Literal
-from langchain_openai import ChatOpenAI
-import os
+from typing import Literal, Tuple
 from dotenv import load_dotenv
+from monitoring.tracing import get_tracer, get_callbacks
+from monitoring.metrics import MESSAGES
+from agents.llm_gateway import create_task_model
 
 load_dotenv()
 logger = logging.getLogger(__name__)
@@ -11,12 +12,7 @@ class Router:
     """Router for UMKM chatbot classification"""
     
     def __init__(self):
-        self.llm = ChatOpenAI(
-            model_name="gpt-3.5-turbo",
-            temperature=0,
-            max_tokens=20,
-            openai_api_key=os.getenv("OPENAI_API_KEY")
-        )
+        self.llm = create_task_model("router")
         
         # SQL patterns
         self.sql_keywords = [
@@ -131,6 +127,15 @@ class Router:
     
     def classify(self, question: str) -> Literal["SQL", "RAG"]:
         """Classification with better bilingual support"""
+        with get_tracer().span("router.classify") as span:
+            classification, method = self._classify(question)
+            span.set_attribute("classification", classification)
+            span.set_attribute("method", method)
+            MESSAGES.inc(route=classification, method=method)
+            return classification
+    
+    def _classify(self, question: str) -> Tuple[Literal["SQL", "RAG"], str]:
+        """Classify a question and report whether keywords or the LLM decided"""
         try:
             logger.info(f"Classifying question: {question[:50]}...")
             
@@ -142,21 +147,21 @@ class Router:
             # Clear SQL indicators - prioritize data queries
             if sql_score >= 2:  # Need at least 2 matching keywords for confidence
                 logger.info(f"Classification: SQL (score: {sql_score})")
-                return "SQL"
+                return "SQL", "keyword"
             elif rag_score >= 1:  # RAG needs fewer matches since advice keywords are more specific
                 logger.info(f"Classification: RAG (score: {rag_score})")
-                return "RAG"
+                return "RAG", "keyword"
             elif sql_score > 0:  # Any SQL keyword without RAG keywords
                 logger.info(f"Classification: SQL (score: {sql_score})")
-                return "SQL"
+                return "SQL", "keyword"
             else:
                 # Use LLM for unclear cases
                 logger.info("No clear patterns, using LLM")
-                return self._llm_classify(question)
+                return self._llm_classify(question), "llm"
                 
         except Exception as e:
             logger.error(f"Error in classification: {str(e)}")
-            return "RAG"
+            return "RAG", "error"
     
     def _llm_classify(self, question: str) -> Literal["SQL", "RAG"]:
         """LLM classification with better context"""
@@ -187,7 +192,7 @@ Question: {question}
 
 Answer only "SQL" or "RAG":"""
 
-            response = self.llm.invoke(prompt)
+            response = self.llm.invoke(prompt, config={"callbacks": get_callbacks()})
             classification = response.content.strip().upper()
             
             if classification not in ["SQL", "RAG"]:
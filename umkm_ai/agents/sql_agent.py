@@ -1,26 +1,52 @@
 import logging
-from typing import Dict, Any
-from langchain_openai import ChatOpenAI
+from typing import Dict, Any, List, Optional, Tuple
 from langchain.memory import ConversationSummaryBufferMemory
 from langchain.schema import HumanMessage, SystemMessage
-from langchain_community.utilities import SQLDatabase
-from langchain_community.agent_toolkits import SQLDatabaseToolkit
-from langchain_community.agent_toolkits.sql.base import create_sql_agent
 import os
+from pathlib import Path
 from dotenv import load_dotenv
+from monitoring.tracing import get_tracer, get_callbacks
+from monitoring.metrics import AGENT_LATENCY, AGENT_ITERATIONS, AGENT_QUERIES, AGENT_RETRIES, DB_FAILOVERS
+from agents.agent_config import get_section
+from agents.llm_gateway import create_task_model
+from agents.context_builder import ContextBuilder
+from agents.background_memory import BackgroundSummarizer
+from agents.insights import InsightService
+import time
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 
+READ_ONLY_CONNECT_ARGS = {"options": "-c default_transaction_read_only=on"}
+REPLICA_CONNECT_TIMEOUT_SECONDS = 5
+REPLICA_POOL_RECYCLE_SECONDS = 300
+
 class SQLAgent:
     """SQL Agent for UMKM database queries"""
     
-    def __init__(self):
+    def __init__(self, planning_overrides: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            planning_overrides (Dict[str, Any]): Settings that take precedence over the sql_planning
+                model configuration (used by the evaluation harness to plug in a candidate model)
+        """
+        self.planning_overrides = dict(planning_overrides or {})
+        self.backend_config = get_section("sql_backend")
+        self.backend = os.getenv('SQL_BACKEND', self.backend_config.get("engine", "postgres")).lower()
         self.db_config = self._load_db_config()
+        self.read_db_config = self._load_read_db_config()
         self.db = None
         self.llm = None
+        self.insights_llm = None
+        self.narration_llm = None
+        self.insights = None
+        self.result_cache = None
+        self.query_guard = None
+        self.summary_llm = None
         self.agent = None
         self.memory = None
+        self.summarizer = None
+        self.context_builder = self._create_context_builder()
         self.query_count = 0
         self._initialize()
     
@@ -34,43 +60,146 @@ class SQLAgent:
             'password': os.getenv('DB_PASSWORD')
         }
     
+    def _load_read_db_config(self) -> Optional[Dict[str, str]]:
+        """Read-only replica settings (DB_READ_*), unset values default to the primary's; None without DB_READ_HOST"""
+        if not os.getenv('DB_READ_HOST'):
+            return None
+        return {
+            'host': os.getenv('DB_READ_HOST'),
+            'port': os.getenv('DB_READ_PORT', self.db_config['port']),
+            'database': os.getenv('DB_READ_NAME', self.db_config['database']),
+            'user': os.getenv('DB_READ_USER', self.db_config['user']),
+            'password': os.getenv('DB_READ_PASSWORD', self.db_config['password'])
+        }
+    
+    @staticmethod
+    def _connection_string(config: Dict[str, str]) -> str:
+        return (
+            f"postgresql://{config['user']}:{config['password']}@"
+            f"{config['host']}:{config['port']}/{config['database']}"
+        )
+    
+    def _connect_database(self):
+        """
+        Connect to the read replica when one is configured, falling back to the primary per
+        connection. Analytics queries then never wait on the loader's locks on the primary.
+        """
+        from langchain_community.utilities import SQLDatabase
+        
+        if self.backend == "duckdb":
+            from agents.duckdb_backend import connect_snapshot_database, SNAPSHOT_DIR
+            snapshot_dir = self.backend_config.get("snapshot_dir")
+            logger.info("SQL Agent reading from DuckDB Parquet snapshot")
+            return connect_snapshot_database(
+                Path(snapshot_dir) if snapshot_dir else SNAPSHOT_DIR,
+                materialize=self.backend_config.get("materialize", True),
+                rebuild=self.backend_config.get("rebuild_on_start", True)
+            )
+        
+        options = dict(
+            schema="umkm",
+            include_tables=["bisnis", "produk", "penjualan", "detail_penjualan", "pengeluaran", "kas_harian"]
+        )
+        if self.read_db_config:
+            # Every new pooled connection tries the replica first, so the failover covers all tools
+            # (schema lookups included) with or without the query guard; recycling moves
+            # connections opened on the primary back once the replica is reachable again
+            from sqlalchemy import create_engine
+            engine = create_engine("postgresql+psycopg2://", creator=self._connect_replica_or_primary,
+                                   pool_pre_ping=True, pool_recycle=REPLICA_POOL_RECYCLE_SECONDS)
+            logger.info(f"SQL Agent reading from replica {self.read_db_config['host']} (primary as failover)")
+            return SQLDatabase(engine, **options)
+        # The agent never writes: every session starts read-only, not only the guarded transactions
+        return SQLDatabase.from_uri(self._connection_string(self.db_config),
+                                    engine_args={"pool_pre_ping": True, "connect_args": READ_ONLY_CONNECT_ARGS},
+                                    **options)
+    
+    def _connect_replica_or_primary(self):
+        """DBAPI connection to the read replica, or to the primary when the replica cannot be reached"""
+        import psycopg2
+        
+        def connect(config: Dict[str, str], **kwargs):
+            return psycopg2.connect(host=config['host'], port=config['port'], dbname=config['database'],
+                                    user=config['user'], password=config['password'],
+                                    **READ_ONLY_CONNECT_ARGS, **kwargs)
+        
+        try:
+            return connect(self.read_db_config, connect_timeout=REPLICA_CONNECT_TIMEOUT_SECONDS)
+        except psycopg2.OperationalError as e:
+            logger.warning(f"Read replica {self.read_db_config['host']} unreachable, connecting to primary: {str(e)}")
+            DB_FAILOVERS.inc()
+            return connect(self.db_config)
+    
+    def _create_context_builder(self) -> ContextBuilder:
+        """Create the token-budgeted context builder from config/agents.yaml"""
+        budget = get_section("context_budget")
+        settings = budget.get("sql_agent", {})
+        return ContextBuilder(
+            max_tokens=settings.get("max_tokens", 1500),
+            model_name=budget.get("model_name", "gpt-4o"),
+            max_turns=settings.get("max_turns", 4),
+            answer_tokens=settings.get("answer_tokens", 60)
+        )
+    
     def _initialize(self):
         """Initialize the SQL agent with ConversationSummaryBufferMemory"""
         try:
-            required_vars = ['DB_NAME', 'DB_USER', 'DB_PASSWORD', 'OPENAI_API_KEY']
+            # Imported here: the SQL toolkit pulls in SQLAlchemy and is only needed once the agent is used
+            from langchain_community.agent_toolkits.sql.base import create_sql_agent
+            from agents.sql_tools import UMKMSQLToolkit, QueryResultCache
+            from agents.query_guard import QueryGuard
+            
+            required_vars = ['OPENAI_API_KEY']
+            if self.backend != "duckdb":
+                required_vars = ['DB_NAME', 'DB_USER', 'DB_PASSWORD'] + required_vars
             missing_vars = [var for var in required_vars if not os.getenv(var)]
             if missing_vars:
                 raise ValueError(f"Missing required environment variables: {', '.join(missing_vars)}")
             
-            connection_string = (
-                f"postgresql://{self.db_config['user']}:{self.db_config['password']}@"
-                f"{self.db_config['host']}:{self.db_config['port']}/{self.db_config['database']}"
-            )
+            self.db = self._connect_database()
             
-            self.db = SQLDatabase.from_uri(
-                connection_string,
-                schema="umkm",
-                include_tables=["bisnis", "produk", "penjualan", "detail_penjualan", "pengeluaran", "kas_harian"]
-            )
+            # Only tool-calling SQL planning needs the large model; see models in config/agents.yaml
+            self.llm = create_task_model("sql_planning", **self.planning_overrides)
+            self.insights_llm = create_task_model("insights")
+            self.narration_llm = create_task_model("narration")
+            self.summary_llm = create_task_model("summarization")
             
-            self.llm = ChatOpenAI(
-                model_name="gpt-4o",
-                temperature=0.3,
-                openai_api_key=os.getenv("OPENAI_API_KEY")
+            insights_config = get_section("insights")
+            self.insights = InsightService(
+                self.insights_llm,
+                self.build_insight_prompt,
+                mode=insights_config.get("mode", "deferred"),
+                cache_size=insights_config.get("cache_size", 256),
+                max_workers=insights_config.get("max_workers", 2)
             )
             
             # Initialize ConversationSummaryBufferMemory
+            memory_config = get_section("memory")
             self.memory = ConversationSummaryBufferMemory(
-                llm=self.llm,
-                max_token_limit=4000,
+                llm=self.summary_llm,
+                max_token_limit=memory_config.get("max_token_limit", 4000),
                 memory_key="chat_history",
                 return_messages=True,
                 ai_prefix="Assistant",
                 human_prefix="User"
             )
+            self.summarizer = BackgroundSummarizer(
+                self.memory,
+                background=memory_config.get("summarize_in_background", True)
+            )
             
             system_prompt = self._get_system_prompt()
-            toolkit = SQLDatabaseToolkit(db=self.db, llm=self.llm)
+            cache_config = get_section("sql_cache")
+            if cache_config.get("enabled", True):
+                self.result_cache = QueryResultCache(
+                    max_bytes=int(cache_config.get("max_mb", 64) * 1024 * 1024),
+                    max_entry_bytes=int(cache_config.get("max_entry_mb", 4) * 1024 * 1024)
+                )
+            guard_config = get_section("query_guard")
+            if guard_config.get("enabled", True):
+                self.query_guard = QueryGuard.from_config(self.db, guard_config)
+            toolkit = UMKMSQLToolkit(db=self.db, llm=self.llm, result_cache=self.result_cache,
+                                     query_guard=self.query_guard)
             
             self.agent = create_sql_agent(
                 llm=self.llm,
@@ -80,7 +209,8 @@ class SQLAgent:
                 max_iterations=15,
                 max_execution_time=180,
                 agent_type="openai-tools",
-                system_message=system_prompt
+                system_message=system_prompt,
+                agent_executor_kwargs={"return_intermediate_steps": True}
             )
             
             logger.info("SQL Agent with ConversationSummaryBufferMemory initialized successfully")
@@ -92,7 +222,11 @@ class SQLAgent:
     def _get_system_prompt(self) -> str:
         """Load system prompt from required file"""
         with open("prompts/sql_agent_context.txt", "r", encoding="utf-8") as f:
-            return f.read()
+            prompt = f.read()
+        if self.backend == "duckdb":
+            from agents.duckdb_backend import dialect_prompt
+            prompt += dialect_prompt()
+        return prompt
     
     def _build_context_with_memory(self, question: str) -> str:
         """Build context string with conversation summary memory"""
@@ -103,24 +237,25 @@ class SQLAgent:
             if not chat_history:
                 return question
             
-            # Get summary if available
-            summary = ""
-            if hasattr(self.memory, 'moving_summary_buffer') and self.memory.moving_summary_buffer:
-                summary = f"CONVERSATION SUMMARY: {self.memory.moving_summary_buffer}\n\n"
+            # Select summary and recent turns within the token budget
+            context = self.context_builder.build(
+                question,
+                summary=getattr(self.memory, 'moving_summary_buffer', "") or "",
+                history=chat_history
+            )
             
-            # Get recent messages (last 4 exchanges = 8 messages)
-            recent_history = chat_history[-8:]
+            summary = ""
+            if context["summary"]:
+                summary = f"CONVERSATION SUMMARY: {context['summary']}\n\n"
             
             context_parts = []
-            for i in range(0, len(recent_history), 2):
-                if i + 1 < len(recent_history):
-                    context_parts.append(f"Previous Q: {recent_history[i].content}")
-                    context_parts.append(f"Previous A: {recent_history[i+1].content[:200]}...")
+            for previous_question, previous_answer in context["turns"]:
+                context_parts.append(f"Previous Q: {previous_question}")
+                context_parts.append(f"Previous A: {previous_answer}")
             
             if summary or context_parts:
                 recent_context = "\n".join(context_parts) if context_parts else ""
-                context = f"{summary}RECENT CONVERSATION:\n{recent_context}\n\nCURRENT QUESTION: {question}"
-                return context
+                return f"{summary}RECENT CONVERSATION:\n{recent_context}\n\nCURRENT QUESTION: {context['question']}"
             
             return question
             
@@ -128,15 +263,45 @@ class SQLAgent:
             logger.error(f"Error building context with memory: {str(e)}")
             return question
     
-    def _add_business_insights(self, question: str, response: str) -> str:
-        """Add business insights and recommendations based on data patterns"""
+    def _wants_insights(self, response: str) -> bool:
+        """Only data answers without insights of their own get an insights pass"""
         if len(response) < 50:
-            return response
-            
+            return False
         # Check if response already has insights
-        if "From what I can see" in response or "Rekomendasi:" in response or "My recommendations" in response:
+        return not ("From what I can see" in response or "Rekomendasi:" in response or "My recommendations" in response)
+    
+    def _add_business_insights(self, question: str, response: str) -> str:
+        """
+        Add business insights and recommendations based on data patterns.
+        In deferred mode the data answer is returned as is and insights are
+        generated in the background (see pending_insights / get_insights).
+        """
+        if self.insights.mode == "off" or not self._wants_insights(response):
+            return response
+        
+        if self.insights.mode == "deferred":
+            self.insights.request(question, response)
             return response
         
+        insights = self.insights.get(question, response)
+        # APPEND insights to original response, don't replace
+        return f"{response}\n\n{insights}" if insights else response
+    
+    def pending_insights(self, question: str, answer: str):
+        """Future for the insights of an answer generated in deferred mode (None if there are none)"""
+        if self.insights is None or self.insights.mode != "deferred":
+            return None
+        return self.insights.pending(question, answer)
+    
+    def get_insights(self, question: str, answer: str, timeout: float = None) -> str:
+        """Business insights for an earlier answer on demand (cached per question intent, answer and data version)"""
+        if not self._wants_insights(answer):
+            return ""
+        return self.insights.get(question, answer, timeout=timeout)
+    
+    @staticmethod
+    def build_insight_prompt(question: str, response: str) -> Tuple[str, bool]:
+        """Build the insights prompt in the question's language; returns (prompt, is_indonesian)"""
         # Detect language from question
         is_indonesian = any(word in question.lower() for word in [
             'bagaimana', 'apa', 'berapa', 'dimana', 'kapan', 'mengapa', 'kenapa',
@@ -175,14 +340,32 @@ My recommendations would be:
 - [Second practical suggestion] 
 - [Third helpful suggestion if relevant]
 """
-        
-        try:
-            insight_response = self.llm.invoke(insight_prompt)
-            # APPEND insights to original response, don't replace
-            return f"{response}\n\n{insight_response.content}"
-        except Exception as e:
-            logger.error(f"Error adding insights: {str(e)}")
-            return response
+        return insight_prompt, is_indonesian
+    
+    @staticmethod
+    def build_narration_prompt(question: str, sql_results: List[str]) -> str:
+        """Build the prompt that turns raw query results into the final answer (narration model)"""
+        results = "\n\n".join(sql_results)
+        return f"""Answer the question using ONLY these SQL query results from the UMKM database.
+
+Rules:
+- Answer in the language of the question
+- Use the actual business names: 'Warung Kopi Gembira', 'Warung Sayur Buah Sehat', 'Warung Sembako Berkah'. NEVER write 'Bisnis 1/2/3'
+- Show complete numbers with proper formatting (e.g., 283,469,657.00) and transaction counts when available
+- Do not invent numbers that are not in the results
+
+Question: {question}
+
+Query results:
+{results}
+
+Answer:"""
+    
+    @staticmethod
+    def _count_business_mentions(text: str) -> int:
+        """How many of the three businesses are named in the text"""
+        text = text.lower()
+        return sum(short_name in text for short_name in ('kopi gembira', 'sayur buah sehat', 'sembako berkah'))
     
     def _is_incomplete_response(self, question: str, response: str) -> bool:
         """Check if response is incomplete for multi-business queries"""
@@ -199,13 +382,7 @@ My recommendations would be:
             return False
         
         # Check if response mentions all 3 business names properly
-        business_mentions = [
-            'warung kopi gembira' in response_lower or 'kopi gembira' in response_lower,
-            'warung sayur buah sehat' in response_lower or 'sayur buah sehat' in response_lower,  
-            'warung sembako berkah' in response_lower or 'sembako berkah' in response_lower
-        ]
-        
-        complete_businesses = sum(business_mentions)
+        complete_businesses = self._count_business_mentions(response_lower)
         
         # Also check for generic "Bisnis 1/2/3" patterns which are wrong
         has_generic_labels = any(label in response_lower for label in [
@@ -215,8 +392,78 @@ My recommendations would be:
         # If less than 3 businesses mentioned OR using generic labels, it's incomplete
         return complete_businesses < 3 or has_generic_labels
     
+    @staticmethod
+    def _captured_queries(intermediate_steps: list) -> List[Tuple[str, str]]:
+        """(sql, result) pairs of the successful sql_db_query calls the agent made, in order"""
+        queries = []
+        for action, observation in intermediate_steps:
+            if getattr(action, "tool", None) != "sql_db_query":
+                continue
+            tool_input = action.tool_input
+            sql = tool_input.get("query", "") if isinstance(tool_input, dict) else str(tool_input)
+            observation = str(observation)
+            if sql and not observation.startswith("Error"):
+                queries.append((sql.strip(), observation))
+        return queries
+    
+    def _rerun_with_business_names(self, sql: str) -> Optional[str]:
+        """Re-run the agent's SQL joined to umkm.bisnis so rows carry nama_bisnis (no LLM involved)"""
+        # A scalar lookup instead of a JOIN: no row is dropped, no helper column is added, and the plan
+        # stays a plain projection of the agent's rows. Assumes PostgreSQL keeps the subquery's ORDER BY
+        # (e.g. top-N) for such a projection, as it does in practice; SQL itself does not promise it.
+        # The newline ends a trailing -- comment in the agent's SQL.
+        repaired_sql = (
+            f"SELECT (SELECT b.nama_bisnis FROM umkm.bisnis b WHERE b.bisnis_id = q.bisnis_id) AS nama_bisnis, q.* "
+            f"FROM ({sql.rstrip().rstrip(';')}\n) q"
+        )
+        try:
+            if self.query_guard is not None:
+                return self.query_guard.run(repaired_sql, include_columns=True)
+            return str(self.db.run(repaired_sql, include_columns=True))
+        except Exception as e:
+            # Typically the query has no bisnis_id column to join on
+            logger.info(f"Could not repair SQL with business names: {str(e)}")
+            return None
+    
+    def _repair_incomplete_response(self, question: str, intermediate_steps: list) -> Optional[str]:
+        """
+        Fix an answer that misses business names by validating the agent's own query results:
+        if the rows already name every business, only the wording is wrong and the narration
+        model re-phrases them; if the rows only carry bisnis_id, the SQL is re-run with a JOIN
+        to umkm.bisnis first. Returns None when the rows still lack business names (caller falls back to a retry).
+        """
+        queries = self._captured_queries(intermediate_steps)
+        if not queries:
+            return None
+        
+        with get_tracer().span("sql_agent.repair", captured_queries=len(queries)) as span:
+            results = [result for _, result in queries]
+            if self._count_business_mentions(" ".join(results)) < 3:
+                last_sql = queries[-1][0]
+                repaired = self._rerun_with_business_names(last_sql)
+                if repaired and self._count_business_mentions(repaired) > self._count_business_mentions(results[-1]):
+                    results[-1] = repaired
+                    span.set_attribute("strategy", "rerun_sql")
+                    AGENT_RETRIES.inc(agent="sql", reason="repair_sql")
+                else:
+                    # Narrating rows without every business name would reproduce the incomplete answer
+                    span.set_attribute("strategy", "unrepairable")
+                    return None
+            else:
+                span.set_attribute("strategy", "reformat")
+                AGENT_RETRIES.inc(agent="sql", reason="reformat")
+            
+            try:
+                prompt = self.build_narration_prompt(question, results)
+                return self.narration_llm.invoke(prompt, config={"callbacks": get_callbacks()}).content
+            except Exception as e:
+                logger.error(f"Error narrating repaired results: {str(e)}")
+                return None
+    
     def query(self, question: str) -> str:
         """Process a question using the SQL agent with summary memory context"""
+        start_time = time.perf_counter()
+        AGENT_QUERIES.inc(agent="sql")
         try:
             self.query_count += 1
             logger.info(f"Processing SQL query #{self.query_count}: {question[:50]}...")
@@ -225,24 +472,35 @@ My recommendations would be:
             enhanced_question = self._build_context_with_memory(question)
             
             # Get response from agent
-            response = self.agent.invoke({"input": enhanced_question})
+            with get_tracer().span("sql_agent.run"):
+                response = self.agent.invoke({"input": enhanced_question}, config={"callbacks": get_callbacks()})
             result = response["output"]
+            AGENT_ITERATIONS.observe(len(response.get("intermediate_steps", [])), agent="sql")
             
             # Validate response completeness and number formatting
             if self._is_incomplete_response(question, result):
-                logger.warning("Detected incomplete response, retrying...")
-                retry_question = f"{enhanced_question}\n\nIMPORTANT: Use actual business names from database - 'Warung Kopi Gembira', 'Warung Sayur Buah Sehat', 'Warung Sembako Berkah'. NEVER use 'Bisnis 1/2/3'. Always JOIN with umkm.bisnis table to get nama_bisnis. ALWAYS show complete numbers with proper formatting (e.g., 283,469,657.00) and transaction counts."
-                retry_response = self.agent.invoke({"input": retry_question})
-                result = retry_response["output"]
+                logger.warning("Detected incomplete response, repairing...")
+                repaired = self._repair_incomplete_response(question, response.get("intermediate_steps", []))
+                if repaired:
+                    result = repaired
+                else:
+                    # No SQL was captured, so only a full agent re-run can help
+                    AGENT_RETRIES.inc(agent="sql", reason="incomplete_response")
+                    retry_question = f"{enhanced_question}\n\nIMPORTANT: Use actual business names from database - 'Warung Kopi Gembira', 'Warung Sayur Buah Sehat', 'Warung Sembako Berkah'. NEVER use 'Bisnis 1/2/3'. Always JOIN with umkm.bisnis table to get nama_bisnis. ALWAYS show complete numbers with proper formatting (e.g., 283,469,657.00) and transaction counts."
+                    with get_tracer().span("sql_agent.retry_incomplete"):
+                        retry_response = self.agent.invoke({"input": retry_question}, config={"callbacks": get_callbacks()})
+                    result = retry_response["output"]
+                    AGENT_ITERATIONS.observe(len(retry_response.get("intermediate_steps", [])), agent="sql")
             
             # Add business insights and recommendations
             final_result = self._add_business_insights(question, result)
             
             # Save to memory
-            self.memory.save_context(
-                {"input": question},
-                {"output": final_result}
-            )
+            with get_tracer().span("memory.save_context", agent="sql"):
+                self.summarizer.save_context(
+                    {"input": question},
+                    {"output": final_result}
+                )
             
             logger.info(f"SQL query #{self.query_count} completed successfully")
             return final_result
@@ -251,6 +509,8 @@ My recommendations would be:
             error_msg = f"Maaf, terjadi kesalahan saat memproses pertanyaan Anda: {str(e)}"
             logger.error(f"Error in SQL query #{self.query_count}: {str(e)}")
             return error_msg
+        finally:
+            AGENT_LATENCY.observe(time.perf_counter() - start_time, agent="sql")
     
     def get_memory_summary(self) -> str:
         """Get current conversation summary from memory"""
@@ -265,7 +525,7 @@ My recommendations would be:
     def clear_memory(self):
         """Clear conversation memory"""
         try:
-            self.memory.clear()
+            self.summarizer.clear()
             self.query_count = 0
             logger.info("Conversation memory cleared")
         except Exception as e:
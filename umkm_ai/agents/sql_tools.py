@@ -0,0 +1,172 @@
+import logging
+import re
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.callbacks import CallbackManagerForToolRun
+from langchain_core.tools import BaseTool
+from langchain_community.agent_toolkits import SQLDatabaseToolkit
+from langchain_community.tools.sql_database.tool import QuerySQLDataBaseTool
+
+from monitoring.metrics import CACHE_REQUESTS
+from pipeline.data_version import DataVersionStore
+
+logger = logging.getLogger(__name__)
+
+UMKM_TABLES = ("bisnis", "produk", "penjualan", "detail_penjualan", "pengeluaran", "kas_harian")
+
+_STRING_LITERAL = re.compile(r"('(?:[^']|'')*')")
+_LINE_COMMENT = re.compile(r"--[^\n]*")
+_BLOCK_COMMENT = re.compile(r"/\*.*?\*/", re.DOTALL)
+_TABLE_PATTERN = re.compile(r"\b(?:umkm\.)?(" + "|".join(UMKM_TABLES) + r")\b", re.IGNORECASE)
+# Functions whose value changes between runs of the same statement
+_VOLATILE_PATTERN = re.compile(
+    r"\b(?:now|random|setseed|gen_random_uuid|clock_timestamp|statement_timestamp|transaction_timestamp|timeofday"
+    r"|current_date|current_time|current_timestamp|localtime|localtimestamp)\b",
+    re.IGNORECASE,
+)
+
+
+def normalize_sql(sql: str) -> str:
+    """Canonical form of a statement: no comments, collapsed whitespace, lowercase outside string literals"""
+    parts = _STRING_LITERAL.split(sql)
+    normalized = []
+    for i, part in enumerate(parts):
+        if i % 2:
+            normalized.append(part)  # string literal, kept verbatim ('QRIS' != 'qris')
+        else:
+            part = _BLOCK_COMMENT.sub(" ", _LINE_COMMENT.sub(" ", part))
+            normalized.append(re.sub(r"\s+", " ", part).lower())
+    return "".join(normalized).strip().rstrip(";").strip()
+
+
+def _code(sql: str) -> str:
+    return "".join(part for i, part in enumerate(_STRING_LITERAL.split(sql)) if i % 2 == 0)
+
+
+def referenced_tables(sql: str) -> Tuple[str, ...]:
+    """UMKM tables a statement reads (used for per-table invalidation)"""
+    return tuple(sorted({match.lower() for match in _TABLE_PATTERN.findall(_code(sql))}))
+
+
+def is_cacheable(sql: str) -> bool:
+    """
+    Whether a result can be reused until the tables it reads change: statements reading the
+    clock or random() give a different answer on every run, and statements reading no UMKM
+    table (catalog queries, views the pattern does not know) are never invalidated.
+    """
+    code = _BLOCK_COMMENT.sub(" ", _LINE_COMMENT.sub(" ", _code(sql)))
+    return not _VOLATILE_PATTERN.search(code) and bool(referenced_tables(sql))
+
+
+class QueryResultCache:
+    """
+    Byte-bounded LRU cache of SQL result strings keyed by normalized SQL.
+    Each entry remembers the data version of the tables it read; an entry is
+    dropped on lookup once the pipeline loader has bumped any of them.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_entry_bytes: int = 4 * 1024 * 1024,
+                 data_version: Optional[DataVersionStore] = None):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.data_version = data_version or DataVersionStore()
+        self.entries: "OrderedDict[str, Tuple[str, Dict[str, int], int]]" = OrderedDict()
+        self.size_bytes = 0
+        self.lock = threading.Lock()
+
+    def _versions(self, tables: Tuple[str, ...]) -> Dict[str, int]:
+        return {table: self.data_version.table_version(table) for table in tables}
+
+    def versions_for(self, sql: str) -> Dict[str, int]:
+        """Data versions of the tables a statement reads; take them before running it"""
+        return self._versions(referenced_tables(sql))
+
+    def _drop(self, key: str):
+        _, _, size = self.entries.pop(key)
+        self.size_bytes -= size
+
+    def get(self, sql: str) -> Optional[str]:
+        key = normalize_sql(sql)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] != self._versions(tuple(entry[1])):
+                self._drop(key)
+                entry = None
+            if entry is None:
+                CACHE_REQUESTS.inc(cache="sql_results", result="miss")
+                return None
+            self.entries.move_to_end(key)
+            CACHE_REQUESTS.inc(cache="sql_results", result="hit")
+            return entry[0]
+
+    def put(self, sql: str, result: str, versions: Optional[Dict[str, int]] = None):
+        """
+        Store a result under the data versions it was computed from. Pass the versions read
+        before the query ran: reading them afterwards would file a result computed before a
+        concurrent load under the new version.
+        """
+        if not is_cacheable(sql):
+            return
+        key = normalize_sql(sql)
+        size = sys.getsizeof(result) + sys.getsizeof(key)
+        if size > self.max_entry_bytes:
+            return
+        if versions is None:
+            versions = self.versions_for(sql)
+        with self.lock:
+            if key in self.entries:
+                self._drop(key)
+            self.entries[key] = (result, versions, size)
+            self.size_bytes += size
+            while self.size_bytes > self.max_bytes and self.entries:
+                self._drop(next(iter(self.entries)))
+
+    def invalidate(self, tables: Optional[List[str]] = None):
+        """Drop entries reading any of the given tables (all entries when tables is None)"""
+        with self.lock:
+            for key in list(self.entries):
+                if tables is None or set(self.entries[key][1]) & set(tables):
+                    self._drop(key)
+
+
+class CachedQuerySQLDatabaseTool(QuerySQLDataBaseTool):
+    """sql_db_query tool that runs statements through a QueryGuard and serves repeats from a QueryResultCache"""
+
+    result_cache: Any = None
+    query_guard: Any = None
+
+    def _run(self, query: str, run_manager: Optional[CallbackManagerForToolRun] = None) -> str:
+        cache = self.result_cache if self.result_cache is not None and is_cacheable(query) else None
+        cached = cache.get(query) if cache is not None else None
+        if cached is not None:
+            return cached
+        versions = cache.versions_for(query) if cache is not None else None
+        if self.query_guard is not None:
+            result = self.query_guard.run_no_throw(query)
+        else:
+            result = super()._run(query, run_manager)
+        # Errors are not cached: the agent is expected to rewrite the query
+        if cache is not None and isinstance(result, str) and not result.startswith("Error"):
+            cache.put(query, result, versions)
+        return result
+
+
+class UMKMSQLToolkit(SQLDatabaseToolkit):
+    """SQLDatabaseToolkit whose query tool is guarded and backed by a shared result cache"""
+
+    result_cache: Any = None
+    query_guard: Any = None
+
+    def get_tools(self) -> List[BaseTool]:
+        tools = super().get_tools()
+        if self.result_cache is None and self.query_guard is None:
+            return tools
+        return [
+            CachedQuerySQLDatabaseTool(db=self.db, description=tool.description,
+                                       result_cache=self.result_cache, query_guard=self.query_guard)
+            if tool.name == "sql_db_query" else tool
+            for tool in tools
+        ]
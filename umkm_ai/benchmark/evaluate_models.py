@@ -0,0 +1,182 @@
+import argparse
+import json
+import logging
+import re
+import time
+from pathlib import Path
+from typing import Dict, Any, List
+
+import yaml
+
+from agents.llm_gateway import create_task_model
+from benchmark.run_benchmark import percentile
+
+logger = logging.getLogger(__name__)
+
+BENCHMARK_DIR = Path(__file__).parent
+DEFAULT_EVAL_SET = BENCHMARK_DIR / "eval_set.yaml"
+TASKS = ("router", "narration", "insights", "summarization", "rag", "sql_planning")
+
+JUDGE_PROMPT = """You are grading an AI assistant for Indonesian small businesses (UMKM).
+Rate the ANSWER for correctness, completeness and usefulness for the QUESTION on a scale of 1 to 5.
+Reply with the number only.
+
+QUESTION:
+{question}
+
+ANSWER:
+{answer}
+"""
+
+
+def load_eval_set(path: Path) -> Dict[str, List[Dict[str, Any]]]:
+    with open(path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f) or {}
+
+
+def check_expectations(item: Dict[str, Any], answer: str) -> bool:
+    """All `expect_all` phrases and at least one `expect_any` phrase must appear (case-insensitive)"""
+    text = answer.lower()
+    if not all(phrase.lower() in text for phrase in item.get("expect_all", [])):
+        return False
+    expect_any = item.get("expect_any", [])
+    return not expect_any or any(phrase.lower() in text for phrase in expect_any)
+
+
+class TaskRunner:
+    """Builds the production prompt/component for a task with a candidate model and answers one item"""
+
+    def __init__(self, task: str, model: str):
+        self.task = task
+        self.model = model
+        self.llm = create_task_model(task, model=model, fallback_model="")
+        self.component = None
+
+        if task == "router":
+            from agents.router import Router
+            self.component = Router()
+            self.component.llm = self.llm
+        elif task == "rag":
+            from agents.rag_agent import RAGAgent
+            self.component = RAGAgent()
+            self.component.llm = self.llm
+        elif task == "sql_planning":
+            # Same overrides as self.llm: the candidate alone, without the gateway fallback
+            from agents.sql_agent import SQLAgent
+            self.component = SQLAgent(planning_overrides={"model": model, "fallback_model": ""})
+
+    def run(self, item: Dict[str, Any]) -> str:
+        if self.task == "router":
+            return self.component._llm_classify(item["question"])
+        if self.task == "narration":
+            from agents.sql_agent import SQLAgent
+            prompt = SQLAgent.build_narration_prompt(item["question"], item["results"])
+            return self.llm.invoke(prompt).content
+        if self.task == "insights":
+            from agents.sql_agent import SQLAgent
+            prompt, _ = SQLAgent.build_insight_prompt(item["question"], item["data"])
+            return self.llm.invoke(prompt).content
+        if self.task == "summarization":
+            from langchain.memory.prompt import SUMMARY_PROMPT
+            prompt = SUMMARY_PROMPT.format(summary="", new_lines=item["conversation"])
+            return self.llm.invoke(prompt).content
+        # rag and sql_planning answer through the full agent (fresh memory per item)
+        self.component.clear_memory()
+        return self.component.query(item["question"])
+
+    def passed(self, item: Dict[str, Any], answer: str) -> bool:
+        if self.task == "router":
+            return answer == item["route"]
+        return check_expectations(item, answer)
+
+
+def judge_score(judge, item: Dict[str, Any], answer: str) -> float:
+    """1-5 grade from the judge model (0 when it cannot be parsed)"""
+    question = item.get("question") or item.get("conversation", "")
+    response = judge.invoke(JUDGE_PROMPT.format(question=question, answer=answer)).content
+    match = re.search(r"[1-5]", response)
+    return float(match.group()) if match else 0.0
+
+
+def evaluate(task: str, models: List[str], items: List[Dict[str, Any]], judge_model: str = None) -> List[Dict[str, Any]]:
+    """
+    Run every item of a task against each candidate model
+
+    Returns:
+        List[Dict[str, Any]]: One summary per model (pass rate, judge score, latency, failures)
+    """
+    judge = create_task_model("rag", model=judge_model, temperature=0, fallback_model="") if judge_model else None
+    summaries = []
+    for model in models:
+        runner = TaskRunner(task, model)
+        latencies, passes, scores, failures = [], 0, [], []
+        for item in items:
+            start = time.perf_counter()
+            try:
+                answer = runner.run(item)
+            except Exception as e:
+                answer = f"ERROR: {str(e)}"
+            latencies.append(time.perf_counter() - start)
+
+            ok = runner.passed(item, answer)
+            passes += ok
+            if not ok:
+                label = (item.get("question") or item.get("conversation", ""))[:60]
+                failures.append({"item": label, "answer": answer[:200]})
+            if judge and task != "router":
+                scores.append(judge_score(judge, item, answer))
+
+        summaries.append({
+            "task": task,
+            "model": model,
+            "items": len(items),
+            "pass_rate": round(passes / len(items), 3) if items else 0.0,
+            "judge_score": round(sum(scores) / len(scores), 2) if scores else None,
+            "p50_seconds": round(percentile(latencies, 50), 2),
+            "p95_seconds": round(percentile(latencies, 95), 2),
+            "failures": failures
+        })
+    return summaries
+
+
+def print_summaries(summaries: List[Dict[str, Any]]):
+    print(f"{'task':<14} {'model':<28} {'pass':>6} {'judge':>6} {'p50 s':>7} {'p95 s':>7}")
+    for s in summaries:
+        judge = f"{s['judge_score']:.2f}" if s["judge_score"] is not None else "-"
+        print(f"{s['task']:<14} {s['model']:<28} {s['pass_rate']:>6.0%} {judge:>6} "
+              f"{s['p50_seconds']:>7.2f} {s['p95_seconds']:>7.2f}")
+        for failure in s["failures"][:3]:
+            print(f"    FAIL {failure['item']!r}: {failure['answer']!r}")
+
+
+def main():
+    """Command line entry point (run from the umkm_ai directory)"""
+    parser = argparse.ArgumentParser(description="Compare models per task on the UMKM evaluation set")
+    parser.add_argument("--task", "-t", action="append", choices=TASKS,
+                        help="Task to evaluate (repeatable; default: all tasks except sql_planning)")
+    parser.add_argument("--models", "-m", required=True,
+                        help="Comma-separated candidate models, e.g. gpt-4o,gpt-4o-mini")
+    parser.add_argument("--judge", help="Optional judge model for 1-5 quality scores, e.g. gpt-4o")
+    parser.add_argument("--eval-set", type=Path, default=DEFAULT_EVAL_SET, help="Evaluation set (YAML)")
+    parser.add_argument("--output", "-o", type=Path, help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    eval_set = load_eval_set(args.eval_set)
+    models = [m.strip() for m in args.models.split(",") if m.strip()]
+    tasks = args.task or [t for t in TASKS if t != "sql_planning"]
+
+    summaries = []
+    for task in tasks:
+        logger.info(f"Evaluating {task} on {len(eval_set.get(task, []))} items with {', '.join(models)}")
+        summaries.extend(evaluate(task, models, eval_set.get(task, []), args.judge))
+    print_summaries(summaries)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summaries, f, indent=2, ensure_ascii=False)
+        logger.info(f"Evaluation report written to {args.output}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    main()
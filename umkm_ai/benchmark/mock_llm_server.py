@@ -0,0 +1,187 @@
+import json
+import logging
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Optional
+
+from agents.context_builder import count_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class MockLLMServer:
+    """
+    OpenAI-compatible stand-in server for offline benchmarking.
+    Serves scripted chat completions and tool calls with configurable latency,
+    and records round-trips and tokens per benchmark question.
+    """
+
+    def __init__(self, script: Dict[str, Any], questions: Optional[List[str]] = None,
+                 host: str = "127.0.0.1", port: int = 0):
+        self.script = script
+        self.questions = sorted(questions or [], key=len, reverse=True)
+        self.host = host
+        self.port = port
+        self.server = None
+        self.thread = None
+        self.request_count = 0
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.server.server_address[1]}/v1"
+
+    def start(self) -> str:
+        """Start serving in a background thread and return the base URL"""
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if self.path.endswith("/chat/completions"):
+                    self._send(200, mock.handle_chat_completion(body))
+                else:
+                    self._send(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+            def do_GET(self):
+                if self.path.endswith("/stats"):
+                    self._send(200, mock.get_stats())
+                else:
+                    self._send(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+            def _send(self, status: int, payload: Dict[str, Any]):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        logger.info(f"Mock LLM server listening on {self.base_url}")
+        return self.base_url
+
+    def stop(self):
+        """Stop the server"""
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            logger.info("Mock LLM server stopped")
+
+    def _attribute_question(self, prompt_text: str) -> str:
+        """Find which benchmark question a request belongs to"""
+        prompt_lower = prompt_text.lower()
+        for question in self.questions:
+            if question.lower() in prompt_lower:
+                return question
+        return "(unattributed)"
+
+    def _message_text(self, message: Dict[str, Any]) -> str:
+        content = message.get("content") or ""
+        if isinstance(content, list):
+            content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+        tool_calls = message.get("tool_calls") or []
+        arguments = " ".join(call.get("function", {}).get("arguments", "") for call in tool_calls)
+        return f"{content} {arguments}".strip()
+
+    def _pick_response(self, body: Dict[str, Any], prompt_text: str) -> Dict[str, Any]:
+        """Choose the scripted reply for a request"""
+        messages = body.get("messages", [])
+
+        # Tool-calling agent: follow the scripted steps, then give the final answer
+        if body.get("tools"):
+            agent_script = self.script.get("agent", {})
+            steps = agent_script.get("steps", [])
+            step = sum(1 for m in messages if m.get("role") == "assistant" and m.get("tool_calls"))
+            if step < len(steps):
+                return {"rule": f"agent_step_{step + 1}", "tool_call": steps[step]}
+            return {"rule": "agent_final", "content": agent_script.get("final", "")}
+
+        for rule in self.script.get("rules", []):
+            if rule.get("match", "") in prompt_text:
+                return {"rule": rule.get("name", rule["match"][:30]), "content": rule.get("response", "")}
+
+        return {"rule": "default", "content": self.script.get("default_response", "OK")}
+
+    def handle_chat_completion(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """Build an OpenAI chat.completion payload for a request"""
+        prompt_text = "\n".join(self._message_text(m) for m in body.get("messages", []))
+        question = self._attribute_question(prompt_text)
+        reply = self._pick_response(body, prompt_text)
+
+        with self.lock:
+            self.request_count += 1
+            request_id = self.request_count
+
+        message = {"role": "assistant", "content": None}
+        if "tool_call" in reply:
+            call = reply["tool_call"]
+            arguments = json.dumps(call.get("args", {}))
+            message["tool_calls"] = [{
+                "id": f"call_mock_{request_id}",
+                "type": "function",
+                "function": {"name": call["tool"], "arguments": arguments}
+            }]
+            finish_reason = "tool_calls"
+            completion_text = arguments
+        else:
+            message["content"] = reply["content"].replace("{question}", question)
+            finish_reason = "stop"
+            completion_text = message["content"]
+
+        # Tool schemas are sent with every agent round-trip, so they count as prompt tokens
+        prompt_tokens = count_tokens(prompt_text + json.dumps(body.get("tools", [])))
+        completion_tokens = count_tokens(completion_text)
+
+        latency = self.script.get("latency", {})
+        delay_ms = (
+            latency.get("base_ms", 0)
+            + random.uniform(0, latency.get("jitter_ms", 0))
+            + completion_tokens * latency.get("per_output_token_ms", 0)
+        )
+        time.sleep(delay_ms / 1000)
+
+        with self.lock:
+            entry = self.stats.setdefault(question, {
+                "round_trips": 0, "prompt_tokens": 0, "completion_tokens": 0, "rules": {}
+            })
+            entry["round_trips"] += 1
+            entry["prompt_tokens"] += prompt_tokens
+            entry["completion_tokens"] += completion_tokens
+            entry["rules"][reply["rule"]] = entry["rules"].get(reply["rule"], 0) + 1
+
+        return {
+            "id": f"chatcmpl-mock-{request_id}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get per-question round-trip and token statistics"""
+        with self.lock:
+            return {
+                "request_count": self.request_count,
+                "questions": json.loads(json.dumps(self.stats))
+            }
+
+    def reset_stats(self):
+        """Reset recorded statistics"""
+        with self.lock:
+            self.request_count = 0
+            self.stats = {}
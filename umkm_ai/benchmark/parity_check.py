@@ -0,0 +1,131 @@
+import argparse
+import datetime
+import decimal
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import yaml
+from dotenv import load_dotenv
+
+from agents.duckdb_backend import SNAPSHOT_DIR, build_snapshot_database
+
+logger = logging.getLogger(__name__)
+
+BENCHMARK_DIR = Path(__file__).parent
+DEFAULT_QUERIES = BENCHMARK_DIR / "parity_queries.yaml"
+TOLERANCE = 0.01
+
+
+def postgres_uri() -> str:
+    """Primary database from the DB_* environment variables (same as the SQL agent)"""
+    missing = [var for var in ("DB_NAME", "DB_USER", "DB_PASSWORD") if not os.getenv(var)]
+    if missing:
+        raise ValueError(f"Missing required environment variables: {', '.join(missing)}")
+    return (
+        f"postgresql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@"
+        f"{os.getenv('DB_HOST', 'localhost')}:{os.getenv('DB_PORT', '5432')}/{os.getenv('DB_NAME')}"
+    )
+
+
+def normalize_value(value: Any) -> Any:
+    """Engine-neutral form of a value: numbers as floats, dates and timestamps as ISO strings"""
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (int, float, decimal.Decimal)):
+        return float(value)
+    if isinstance(value, datetime.datetime):
+        return value.replace(tzinfo=None).isoformat(sep=" ")
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    return str(value)
+
+
+def rows_match(expected: List[tuple], actual: List[tuple], ordered: bool) -> bool:
+    if len(expected) != len(actual):
+        return False
+    key = lambda row: tuple((v is None, "" if v is None else str(round(v, 2)) if isinstance(v, float) else v)
+                            for v in row)
+    if not ordered:
+        expected, actual = sorted(expected, key=key), sorted(actual, key=key)
+    for expected_row, actual_row in zip(expected, actual):
+        if len(expected_row) != len(actual_row):
+            return False
+        for e, a in zip(expected_row, actual_row):
+            if isinstance(e, float) and isinstance(a, float):
+                if abs(e - a) > TOLERANCE:
+                    return False
+            elif e != a:
+                return False
+    return True
+
+
+def run_query(engine, sql: str) -> Tuple[List[tuple], float]:
+    """Rows (normalized) and wall time of one statement"""
+    start = time.perf_counter()
+    with engine.connect() as connection:
+        rows = connection.exec_driver_sql(sql, execution_options={"no_parameters": True}).fetchall()
+    elapsed = time.perf_counter() - start
+    return [tuple(normalize_value(v) for v in row) for row in rows], elapsed
+
+
+def check_parity(queries: List[Dict[str, Any]], snapshot_dir: Path) -> List[Dict[str, Any]]:
+    """Run every query on PostgreSQL and on the DuckDB snapshot and compare the results"""
+    from sqlalchemy import create_engine
+
+    database_path = build_snapshot_database(snapshot_dir)
+    postgres = create_engine(postgres_uri())
+    duckdb = create_engine(f"duckdb:///{database_path}", connect_args={"read_only": True})
+
+    results = []
+    for query in queries:
+        result = {"name": query["name"], "ok": False, "postgres_ms": None, "duckdb_ms": None, "error": None}
+        try:
+            expected, postgres_seconds = run_query(postgres, query["sql"])
+            actual, duckdb_seconds = run_query(duckdb, query["sql"])
+            result.update(
+                ok=rows_match(expected, actual, query.get("ordered", False)),
+                rows=len(expected),
+                postgres_ms=round(postgres_seconds * 1000, 1),
+                duckdb_ms=round(duckdb_seconds * 1000, 1)
+            )
+            if not result["ok"]:
+                result["error"] = f"postgres {expected[:3]} ... vs duckdb {actual[:3]} ..."
+        except Exception as e:
+            result["error"] = str(e)
+        results.append(result)
+    return results
+
+
+def main() -> int:
+    """Command line entry point (run from the umkm_ai directory)"""
+    parser = argparse.ArgumentParser(description="Check that the DuckDB snapshot answers like PostgreSQL")
+    parser.add_argument("--queries", type=Path, default=DEFAULT_QUERIES, help="Parity queries (YAML)")
+    parser.add_argument("--snapshot-dir", type=Path, default=SNAPSHOT_DIR, help="Parquet snapshot directory")
+    args = parser.parse_args()
+
+    load_dotenv()
+    with open(args.queries, "r", encoding="utf-8") as f:
+        queries = (yaml.safe_load(f) or {}).get("queries", [])
+
+    results = check_parity(queries, args.snapshot_dir)
+    print(f"{'query':<28} {'result':<6} {'rows':>6} {'postgres ms':>12} {'duckdb ms':>10}")
+    for r in results:
+        status = "OK" if r["ok"] else "FAIL"
+        print(f"{r['name']:<28} {status:<6} {r.get('rows', '-'):>6} "
+              f"{r['postgres_ms'] if r['postgres_ms'] is not None else '-':>12} "
+              f"{r['duckdb_ms'] if r['duckdb_ms'] is not None else '-':>10}")
+        if r["error"]:
+            print(f"    {r['error']}")
+
+    failed = sum(not r["ok"] for r in results)
+    logger.info(f"{len(results) - failed}/{len(results)} parity queries match")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    sys.exit(main())
@@ -0,0 +1,86 @@
+import argparse
+import logging
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Any
+
+from benchmark.run_benchmark import percentile, load_questions, DEFAULT_QUESTIONS
+from knowledge.bm25 import BM25Index
+from knowledge.embeddings import HashingEmbedder
+from knowledge.retriever import KnowledgeRetriever
+from knowledge.vector_index import VectorIndex
+
+logger = logging.getLogger(__name__)
+
+VOCABULARY = (
+    "penjualan omzet modal kas laba rugi pelanggan produk harga stok pemasok pembayaran qris "
+    "tunai sembako warung kopi kuliner fashion kerajinan promosi diskon media sosial marketplace "
+    "karyawan gaji sewa listrik bahan baku resep kemasan pengiriman piutang utang pinjaman kur "
+    "bunga cicilan pajak izin halal sertifikat ekspor pameran musiman ramadan lebaran"
+).split()
+
+
+def build_synthetic_index(index_dir: Path, n_chunks: int, embedder: HashingEmbedder,
+                          batch_size: int = 2000) -> VectorIndex:
+    """Fill a vector index with synthetic UMKM-style chunks"""
+    rng = random.Random(42)
+    index = VectorIndex(index_dir)
+    index.create(embedder.dim, {"embedder": embedder.name, "chunk_chars": 800})
+    for start in range(0, n_chunks, batch_size):
+        chunks = []
+        for i in range(start, min(start + batch_size, n_chunks)):
+            text = " ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(40, 120)))
+            chunks.append({"text": text, "source": "synthetic", "position": i, "hash": f"synthetic-{i}"})
+        index.append(chunks, embedder.embed([chunk["text"] for chunk in chunks]))
+    return index
+
+
+def run_retrieval_benchmark(n_chunks: int = 100_000, queries: int = 200) -> Dict[str, Any]:
+    """Measure hybrid retrieval latency over a synthetic index of n_chunks"""
+    embedder = HashingEmbedder()
+    questions = load_questions(DEFAULT_QUESTIONS)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        started = time.perf_counter()
+        index = build_synthetic_index(Path(tmp), n_chunks, embedder)
+        bm25 = BM25Index()
+        bm25.add([chunk["text"] for chunk in index.chunks])
+        bm25.consolidate()
+        build_seconds = time.perf_counter() - started
+
+        retriever = KnowledgeRetriever({"embedder": "hashing", "top_k": 4})
+        retriever.index, retriever.bm25 = index, bm25
+
+        latencies = []
+        for i in range(queries):
+            started = time.perf_counter()
+            retriever.retrieve(questions[i % len(questions)])
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    return {
+        "chunks": n_chunks,
+        "queries": queries,
+        "build_seconds": round(build_seconds, 1),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2)
+    }
+
+
+def main():
+    """Command line entry point (run from the umkm_ai directory)"""
+    parser = argparse.ArgumentParser(description="Hybrid retrieval latency benchmark on a synthetic index")
+    parser.add_argument("--chunks", "-n", type=int, default=100_000, help="Synthetic chunks to index")
+    parser.add_argument("--queries", "-q", type=int, default=200, help="Queries to time")
+    args = parser.parse_args()
+
+    report = run_retrieval_benchmark(args.chunks, args.queries)
+    print(f"Chunks: {report['chunks']}  Build: {report['build_seconds']}s  "
+          f"p50: {report['p50_ms']} ms  p95: {report['p95_ms']} ms  p99: {report['p99_ms']} ms")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,188 @@
+import argparse
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Any, List
+
+import yaml
+
+from benchmark.mock_llm_server import MockLLMServer
+
+logger = logging.getLogger(__name__)
+
+BENCHMARK_DIR = Path(__file__).parent
+DEFAULT_CONFIG = BENCHMARK_DIR.parent / "config" / "benchmark.yaml"
+DEFAULT_QUESTIONS = BENCHMARK_DIR / "questions.txt"
+INSIGHTS_MODES = ("inline", "deferred", "off")
+INSIGHTS_WAIT_SECONDS = 120
+
+
+def load_questions(path: Path) -> List[str]:
+    """Load the question corpus, one question per line ('#' lines are comments)"""
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def run_benchmark(config_path: Path = DEFAULT_CONFIG, questions_path: Path = DEFAULT_QUESTIONS,
+                  concurrency: int = 4, repeat: int = 1, insights_mode: str = "inline") -> Dict[str, Any]:
+    """
+    Replay the question corpus through GradioApp.process_message against the mock LLM server
+
+    Args:
+        config_path (Path): Mock server script and latency configuration
+        questions_path (Path): Question corpus
+        concurrency (int): Number of questions processed in parallel
+        repeat (int): Number of passes over the corpus
+        insights_mode (str): Insights mode to measure, overriding config/agents.yaml. In
+            deferred mode each question also waits for its insights, so their LLM calls are
+            counted and do not run on into the next question's latency
+
+    Returns:
+        Dict[str, Any]: Latency percentiles, round-trips and tokens per question
+    """
+    with open(config_path, "r", encoding="utf-8") as f:
+        script = yaml.safe_load(f)
+    questions = load_questions(questions_path)
+
+    server = MockLLMServer(script, questions=questions)
+    base_url = server.start()
+
+    # Point every ChatOpenAI client at the mock server
+    os.environ["OPENAI_API_BASE"] = base_url
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ.setdefault("OPENAI_API_KEY", "mock-key")
+
+    try:
+        from interfaces.gradioapp import GradioApp
+
+        app = GradioApp(warmup="eager")
+        if app.sql_agent.insights is not None:
+            app.sql_agent.insights.mode = insights_mode
+        server.reset_stats()
+
+        def timed(question: str) -> Dict[str, Any]:
+            start = time.perf_counter()
+            _, history = app.process_message(question, [])
+            elapsed = time.perf_counter() - start
+            answer = history[-1][1] if history else ""
+            insights = app.sql_agent.pending_insights(question, answer)
+            if insights is not None:
+                try:
+                    insights.result(timeout=INSIGHTS_WAIT_SECONDS)
+                except Exception as e:
+                    logger.warning(f"Deferred insights failed for {question[:40]}: {e}")
+            return {"question": question, "latency": elapsed, "error": answer.startswith("Maaf"),
+                    "latency_with_insights": time.perf_counter() - start}
+
+        workload = questions * repeat
+        logger.info(f"Replaying {len(workload)} questions with concurrency {concurrency}")
+
+        wall_start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(timed, workload))
+        wall_time = time.perf_counter() - wall_start
+
+        server_stats = server.get_stats()
+    finally:
+        server.stop()
+
+    latencies = [r["latency"] for r in results]
+    complete_latencies = [r["latency_with_insights"] for r in results]
+    per_question = server_stats["questions"]
+    attributed = {q: s for q, s in per_question.items() if q in questions}
+    round_trips = [s["round_trips"] / repeat for s in attributed.values()]
+    tokens_sent = [s["prompt_tokens"] / repeat for s in attributed.values()]
+
+    return {
+        "questions": len(workload),
+        "concurrency": concurrency,
+        "insights_mode": insights_mode,
+        "wall_time_s": wall_time,
+        "throughput_qps": len(workload) / wall_time if wall_time else 0.0,
+        "errors": sum(1 for r in results if r["error"]),
+        "latency_s": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": max(latencies) if latencies else 0.0
+        },
+        # Until deferred insights are ready too (equals latency_s in inline and off mode)
+        "latency_with_insights_s": {
+            "p50": percentile(complete_latencies, 50),
+            "p95": percentile(complete_latencies, 95),
+            "max": max(complete_latencies) if complete_latencies else 0.0
+        },
+        "llm_round_trips": {
+            "total": server_stats["request_count"],
+            "mean_per_question": sum(round_trips) / len(round_trips) if round_trips else 0.0,
+            "max_per_question": max(round_trips) if round_trips else 0.0
+        },
+        "prompt_tokens_sent": {
+            "total": sum(s["prompt_tokens"] for s in per_question.values()),
+            "mean_per_question": sum(tokens_sent) / len(tokens_sent) if tokens_sent else 0.0
+        },
+        "per_question": per_question
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    """Print a human-readable benchmark summary"""
+    print("=" * 60)
+    print("AGENT LATENCY BENCHMARK (mock LLM)")
+    print("=" * 60)
+    print(f"Questions: {report['questions']}  Concurrency: {report['concurrency']}  "
+          f"Insights: {report['insights_mode']}  Errors: {report['errors']}")
+    print(f"Wall time: {report['wall_time_s']:.2f}s  Throughput: {report['throughput_qps']:.2f} q/s")
+    latency = report["latency_s"]
+    print(f"Latency p50: {latency['p50']:.3f}s  p95: {latency['p95']:.3f}s  "
+          f"p99: {latency['p99']:.3f}s  max: {latency['max']:.3f}s")
+    if report["insights_mode"] == "deferred":
+        complete = report["latency_with_insights_s"]
+        print(f"With insights p50: {complete['p50']:.3f}s  p95: {complete['p95']:.3f}s  max: {complete['max']:.3f}s")
+    trips = report["llm_round_trips"]
+    print(f"LLM round-trips: {trips['total']} total, {trips['mean_per_question']:.2f} mean/question, "
+          f"{trips['max_per_question']:.0f} max/question")
+    tokens = report["prompt_tokens_sent"]
+    print(f"Prompt tokens sent: {tokens['total']:,} total, {tokens['mean_per_question']:.0f} mean/question")
+    print("-" * 60)
+    for question, stats in report["per_question"].items():
+        print(f"{stats['round_trips']:>3} trips {stats['prompt_tokens']:>7,} tok  {question[:60]}")
+    print("=" * 60)
+
+
+def main():
+    """Command line entry point (run from the umkm_ai directory)"""
+    parser = argparse.ArgumentParser(description="Offline agent latency benchmark with a mock LLM server")
+    parser.add_argument("--config", type=Path, default=DEFAULT_CONFIG, help="Mock server script (YAML)")
+    parser.add_argument("--questions", type=Path, default=DEFAULT_QUESTIONS, help="Question corpus")
+    parser.add_argument("--concurrency", "-c", type=int, default=4, help="Parallel questions")
+    parser.add_argument("--repeat", "-r", type=int, default=1, help="Passes over the corpus")
+    parser.add_argument("--insights", choices=INSIGHTS_MODES, default="inline",
+                        help="Insights mode to measure (default inline: insights are part of the answer)")
+    parser.add_argument("--output", "-o", type=Path, help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.config, args.questions, args.concurrency, args.repeat, args.insights)
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        logger.info(f"Benchmark report written to {args.output}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    main()
@@ -1,80 +1,260 @@
 import gradio as gr
 import logging
+import os
+import threading
+import time
+from collections import OrderedDict
 from typing import List, Tuple
-from agents.sql_agent import SQLAgent
-from agents.rag_agent import RAGAgent
-from agents.router import Router
+from monitoring.tracing import get_tracer
+from monitoring.metrics import MetricsServer, SessionTracker
+from monitoring.startup import STARTUP
+from agents.agent_config import get_section
+from interfaces.scheduler import RequestScheduler, QueueFullError, QueueTimeoutError
+from pipeline.data_version import DataVersionStore
 
 logger = logging.getLogger(__name__)
 
+# Warm-up order: cheapest first so the router is ready as early as possible
+AGENT_NAMES = ("router", "rag_agent", "sql_agent")
+QUEUE_POLL_SECONDS = 0.5
+INSIGHTS_WAIT_SECONDS = 60
+MAX_SQL_ANSWERS = 1000
+
 class GradioApp:
     """Mas Warung - AI UMKM Assistant"""
     
-    def __init__(self):
-        self.sql_agent = None
-        self.rag_agent = None
-        self.router = None
+    def __init__(self, warmup: str = None):
+        """
+        Args:
+            warmup (str): "background" (default) builds the agents on a background thread
+                while the UI starts, "eager" builds them before returning, "off" builds
+                each agent on first use. Defaults to the AGENT_WARMUP env var.
+        """
+        self._agents = {}
+        self._agent_locks = {name: threading.Lock() for name in AGENT_NAMES}
         self.chat_history = []
-        self._initialize_agents()
+        # Recent (session, question) pairs answered by the SQL agent (those can get business
+        # insights), with the deferred insights requested for that answer (None if there were none)
+        self.sql_answered = OrderedDict()
+        self.sql_answered_lock = threading.Lock()
+        self.data_version = DataVersionStore()
+        self.sessions = SessionTracker()
+        self.metrics_server = None
+        self.scheduler = RequestScheduler(get_section("scheduler"))
+        
+        self.warmup = warmup or os.getenv("AGENT_WARMUP", "background")
+        if self.warmup == "eager":
+            self.warm_up()
+        elif self.warmup == "background":
+            threading.Thread(target=self.warm_up, name="agent-warmup", daemon=True).start()
     
-    def _initialize_agents(self):
-        """Initialize all agents"""
-        try:
-            logger.info("Initializing agents...")
-            
-            self.sql_agent = SQLAgent()
-            self.rag_agent = RAGAgent()
-            self.router = Router()
-            
-            logger.info("All agents initialized successfully")
-            
-        except Exception as e:
-            logger.error(f"Error initializing agents: {str(e)}")
-            raise
+    @property
+    def router(self):
+        return self._get_agent("router")
     
-    def process_message(self, message: str, history: List[List[str]]) -> Tuple[str, List[List[str]]]:
-        """Process user message and return response"""
-        try:
-            if not message.strip():
-                return "", history
-            
-            logger.info(f"Processing message: {message[:50]}...")
-            
-            # Classify the message
-            classification = self.router.classify(message)
-            logger.info(f"Message classified as: {classification}")
-            
-            # Route to appropriate agent
-            if classification == "SQL":
-                response = self.sql_agent.query(message)
-            else:
-                response = self.rag_agent.query(message)
-            
-            # Update history
-            history.append([message, response])
-            
-            logger.info("Message processed successfully")
+    @property
+    def sql_agent(self):
+        return self._get_agent("sql_agent")
+    
+    @property
+    def rag_agent(self):
+        return self._get_agent("rag_agent")
+    
+    def _build_agent(self, name: str):
+        """Construct an agent; imports are deferred so startup does not pay for them"""
+        if name == "router":
+            from agents.router import Router
+            return Router()
+        if name == "rag_agent":
+            from agents.rag_agent import RAGAgent
+            return RAGAgent()
+        from agents.sql_agent import SQLAgent
+        return SQLAgent()
+    
+    def _get_agent(self, name: str):
+        """Return an agent, constructing it on first use (once, even under concurrent requests)"""
+        agent = self._agents.get(name)
+        if agent is not None:
+            return agent
+        
+        with self._agent_locks[name]:
+            agent = self._agents.get(name)
+            if agent is None:
+                logger.info(f"Initializing {name}...")
+                started = time.perf_counter()
+                agent = self._build_agent(name)
+                STARTUP.record(f"init_{name}", time.perf_counter() - started)
+                self._agents[name] = agent
+                logger.info(f"{name} initialized in {time.perf_counter() - started:.2f}s")
+        return agent
+    
+    def warm_up(self):
+        """Initialize all agents ahead of the first message"""
+        for name in AGENT_NAMES:
+            try:
+                self._get_agent(name)
+            except Exception as e:
+                # The agent is retried (and the error surfaced) on first use
+                logger.error(f"Error initializing {name}: {str(e)}")
+        STARTUP.report("Agent warm-up")
+    
+    def process_message(self, message: str, history: List[List[str]],
+                        request: gr.Request = None) -> Tuple[str, List[List[str]]]:
+        """Process user message and return response (waits for the scheduler)"""
+        if not message.strip():
             return "", history
-            
+        
+        session_id = self._session_id(request)
+        with get_tracer().trace("chat.message", message_chars=len(message)) as trace:
+            try:
+                job = self._submit(message, session_id, trace)
+                response = job.result()
+            except Exception as e:
+                response = self._error_message(e)
+        
+        history.append([message, response])
+        return "", history
+    
+    def stream_message(self, message: str, history: List[List[str]], request: gr.Request = None):
+        """Like process_message, but shows the queue position while the question waits"""
+        if not message.strip():
+            yield "", history
+            return
+        
+        session_id = self._session_id(request)
+        tracer = get_tracer()
+        # Gradio may resume the generator on another thread, so the span is not kept current across yields
+        trace = tracer.start_span("chat.message", message_chars=len(message))
+        job, error = None, None
+        try:
+            with tracer.activate(trace):
+                job = self._submit(message, session_id, trace)
+            while not job.wait(timeout=QUEUE_POLL_SECONDS):
+                position = job.position()
+                if position:
+                    yield "", history + [[message, f"⏳ Pertanyaan Anda di antrean ke-{position}, mohon tunggu..."]]
+            response = job.result()
+        except GeneratorExit as e:
+            # User left or the UI cancelled: free the queue slot if the job has not started
+            error = e
+            if job:
+                job.cancel()
+            raise
         except Exception as e:
-            error_msg = f"Maaf, terjadi kesalahan: {str(e)}"
-            logger.error(f"Error processing message: {str(e)}")
-            history.append([message, error_msg])
-            return "", history
+            error = e
+            response = self._error_message(e)
+        finally:
+            tracer.end_span(trace, error=error)
+        
+        history.append([message, response])
+        yield "", history
+        
+        # Deferred insights: the number is already on screen, the advice follows when ready
+        insights = self._pending_insights(session_id, message, response)
+        if insights is not None:
+            try:
+                extra = insights.result(timeout=INSIGHTS_WAIT_SECONDS)
+            except Exception as e:
+                logger.warning(f"Deferred insights not available: {str(e)}")
+                return
+            if extra:
+                history[-1] = [message, f"{response}\n\n{extra}"]
+                yield "", history
+    
+    def _pending_insights(self, session_id: str, message: str, response: str):
+        if response.startswith("Maaf"):
+            return None
+        with self.sql_answered_lock:
+            return self.sql_answered.get((session_id, message))
+    
+    def _remember_sql_answer(self, session_id: str, message: str, insights):
+        with self.sql_answered_lock:
+            self.sql_answered.pop((session_id, message), None)
+            self.sql_answered[(session_id, message)] = insights
+            while len(self.sql_answered) > MAX_SQL_ANSWERS:
+                self.sql_answered.popitem(last=False)
+    
+    def request_insights(self, history: List[List[str]], request: gr.Request = None) -> List[List[str]]:
+        """On-demand business insights for the last data answer"""
+        if not history:
+            return history
+        message, response = history[-1]
+        session_id = self._session_id(request)
+        sql_agent = self._agents.get("sql_agent")
+        with self.sql_answered_lock:
+            answered = (session_id, message) in self.sql_answered
+        if sql_agent is None or not answered or response.startswith("Maaf"):
+            history.append(["Minta wawasan bisnis", "Wawasan bisnis tersedia untuk jawaban data penjualan, pengeluaran dan kas."])
+            return history
+        
+        insights = sql_agent.get_insights(message, response, timeout=INSIGHTS_WAIT_SECONDS)
+        if insights and insights not in response:
+            history[-1] = [message, f"{response}\n\n{insights}"]
+        return history
+    
+    def _session_id(self, request) -> str:
+        session_id = getattr(request, "session_hash", None) or "anonymous"
+        self.sessions.touch(session_id)
+        return session_id
+    
+    def _submit(self, message: str, session_id: str, trace):
+        """Classify the message on the router pool and queue it on the pool for its route"""
+        logger.info(f"Processing message: {message[:50]}...")
+        
+        # Shed load before paying for a classification (possibly an LLM call) that cannot be queued
+        self.scheduler.check_room(session_id)
+        classification = self.scheduler.submit("router", session_id, self._classify, message).result()
+        logger.info(f"Message classified as: {classification}")
+        trace.set_attribute("route", classification)
+        
+        return self.scheduler.submit(classification, session_id, self._answer, classification, message, session_id)
+    
+    def _classify(self, message: str) -> str:
+        """Route of a message (on a router pool worker)"""
+        return self.router.classify(message)
+    
+    def _answer(self, classification: str, message: str, session_id: str) -> str:
+        """Run the agent for a route (on a scheduler worker)"""
+        if classification == "SQL":
+            # Read before the query: the indexed answer must not outlive the data it was computed from
+            data_version = self.data_version.current()
+            response = self.sql_agent.query(message)
+            # Taken right after this answer, so the session gets the insights requested for it
+            self._remember_sql_answer(session_id, message, self.sql_agent.pending_insights(message, response))
+            rag_agent = self._agents.get("rag_agent")
+            if rag_agent and not response.startswith("Maaf"):
+                rag_agent.index_insight(message, response, data_version)
+        else:
+            response = self.rag_agent.query(message)
+            # The latest answer to this question is advice now, not data
+            with self.sql_answered_lock:
+                self.sql_answered.pop((session_id, message), None)
+        
+        logger.info("Message processed successfully")
+        return response
+    
+    def _error_message(self, error: Exception) -> str:
+        if isinstance(error, (QueueFullError, QueueTimeoutError)):
+            logger.warning(f"Request shed by scheduler: {str(error)}")
+            return "Maaf, Mas Warung sedang melayani banyak pertanyaan. Silakan coba lagi sebentar lagi."
+        logger.error(f"Error processing message: {str(error)}")
+        return f"Maaf, terjadi kesalahan: {str(error)}"
     
     def clear_conversation(self) -> List[List[str]]:
         """Clear conversation history"""
-        try:
-            self.sql_agent.clear_memory()
-            self.rag_agent.clear_memory()
-            self.router.clear_cache()
-            
-            logger.info("Conversation cleared")
-            return []
-            
-        except Exception as e:
-            logger.error(f"Error clearing conversation: {str(e)}")
-            return []
+        # Only the SQL and RAG agents keep conversation memory (the router is stateless);
+        # agents that were never used have nothing to clear
+        for name in ("sql_agent", "rag_agent"):
+            agent = self._agents.get(name)
+            if agent is None:
+                continue
+            try:
+                agent.clear_memory()
+            except Exception as e:
+                logger.error(f"Error clearing {name} memory: {str(e)}")
+        
+        logger.info("Conversation cleared")
+        return []
     
     def create_interface(self):
         """Create Gradio interface"""
@@ -98,21 +278,29 @@ class GradioApp:
                 )
                 send_btn = gr.Button("Kirim", variant="primary", scale=1)
             
-            clear_btn = gr.Button("Hapus Percakapan", variant="secondary")
+            with gr.Row():
+                insights_btn = gr.Button("💡 Wawasan Bisnis", variant="secondary")
+                clear_btn = gr.Button("Hapus Percakapan", variant="secondary")
             
             # Event handlers
             send_btn.click(
-                self.process_message,
+                self.stream_message,
                 inputs=[msg_input, chatbot],
                 outputs=[msg_input, chatbot]
             )
             
             msg_input.submit(
-                self.process_message,
+                self.stream_message,
                 inputs=[msg_input, chatbot],
                 outputs=[msg_input, chatbot]
             )
             
+            insights_btn.click(
+                self.request_insights,
+                inputs=[chatbot],
+                outputs=[chatbot]
+            )
+            
             clear_btn.click(
                 self.clear_conversation,
                 outputs=[chatbot]
@@ -120,11 +308,21 @@ class GradioApp:
         
         return interface
     
-    def launch(self, share=True, server_port=7860):
-        """Launch the Gradio interface"""
+    def launch(self, share=True, server_port=7860, metrics_port=None):
+        """Launch the Gradio interface with the metrics endpoint next to it"""
         try:
-            interface = self.create_interface()
+            with STARTUP.phase("interface"):
+                interface = self.create_interface()
+                # Gradio handlers only wait on scheduler jobs (one per question the answer pools can hold);
+                # classification and answers run on the scheduler's bounded pools
+                interface.queue(default_concurrency_limit=self.scheduler.capacity)
+            
+            with STARTUP.phase("metrics_server"):
+                metrics_port = metrics_port or int(os.getenv("METRICS_PORT", "9090"))
+                self.metrics_server = MetricsServer(port=metrics_port, host=os.getenv("METRICS_HOST", "127.0.0.1"))
+                self.metrics_server.start()
             
+            STARTUP.report("Service startup")
             logger.info(f"Launching Gradio interface on port {server_port}")
             
             interface.launch(
@@ -0,0 +1,216 @@
+import contextvars
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Dict, Any, Callable, Optional
+
+from monitoring.metrics import QUEUE_DEPTH, QUEUE_WAIT_SECONDS, QUEUE_REJECTED
+
+logger = logging.getLogger(__name__)
+
+# Routes whose pools answer questions; "router" only classifies them
+ANSWER_ROUTES = ("sql", "rag")
+
+
+class QueueFullError(Exception):
+    """Raised when a route's queue (or a session's share of it) is full"""
+
+
+class QueueTimeoutError(Exception):
+    """Raised when a job waited longer than the route's max_wait_seconds before starting"""
+
+
+class Job:
+    """A queued unit of work; the result is delivered through a Future"""
+
+    def __init__(self, pool: "RoutePool", session_id: str, fn: Callable, args: tuple):
+        self.pool = pool
+        self.session_id = session_id
+        self.fn = fn
+        self.args = args
+        # Run in the submitter's context so trace spans nest under the chat message
+        self.context = contextvars.copy_context()
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+    def position(self) -> int:
+        """1-based queue position, or 0 once the job has started"""
+        return self.pool.position(self)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait up to timeout seconds; True when the job has finished"""
+        try:
+            self.future.exception(timeout=timeout)
+            return True
+        except Exception:
+            return self.future.done()
+
+    def result(self, timeout: Optional[float] = None) -> Any:
+        return self.future.result(timeout=timeout)
+
+    def cancel(self) -> bool:
+        """Drop the job if it has not started (e.g. the user disconnected)"""
+        return self.future.cancel()
+
+
+class RoutePool:
+    """
+    Fixed-size worker pool for one route with a bounded queue.
+    Queued jobs are kept per session and served round-robin, so one session
+    sending a burst of questions cannot starve the others.
+    """
+
+    def __init__(self, name: str, workers: int = 4, max_queue: int = 32,
+                 max_queued_per_session: int = 3, max_wait_seconds: Optional[float] = None):
+        self.name = name
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_queued_per_session = max_queued_per_session
+        self.max_wait_seconds = max_wait_seconds
+        self.sessions: "OrderedDict[str, deque]" = OrderedDict()
+        self.queued = 0
+        self.condition = threading.Condition()
+        self.threads = [
+            threading.Thread(target=self._work, name=f"{name}-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, session_id: str, fn: Callable, *args) -> Job:
+        """Queue a job, raising QueueFullError instead of letting the backlog grow without bound"""
+        job = Job(self, session_id, fn, args)
+        with self.condition:
+            self._discard_cancelled()
+            rejection = self._rejection(session_id)
+            if rejection:
+                reason, message = rejection
+                QUEUE_REJECTED.inc(route=self.name, reason=reason)
+                raise QueueFullError(message)
+
+            self.sessions.setdefault(session_id, deque()).append(job)
+            self.queued += 1
+            QUEUE_DEPTH.set(self.queued, route=self.name)
+            self.condition.notify()
+        return job
+
+    def _rejection(self, session_id: str):
+        """(reason, message) if a job from this session would be turned away (caller holds the condition)"""
+        session_queue = self.sessions.get(session_id)
+        if self.queued >= self.max_queue:
+            return "queue_full", f"{self.name} queue is full ({self.max_queue} waiting)"
+        if session_queue and len(session_queue) >= self.max_queued_per_session:
+            return "session_limit", f"Session already has {len(session_queue)} {self.name} questions waiting"
+        return None
+
+    def has_room(self, session_id: str) -> bool:
+        """Whether a job from this session would be queued right now"""
+        with self.condition:
+            self._discard_cancelled()
+            return self._rejection(session_id) is None
+
+    def _discard_cancelled(self):
+        for session_id in list(self.sessions):
+            session_queue = self.sessions[session_id]
+            kept = deque(job for job in session_queue if not job.future.cancelled())
+            self.queued -= len(session_queue) - len(kept)
+            if kept:
+                self.sessions[session_id] = kept
+            else:
+                del self.sessions[session_id]
+
+    def _next_job(self) -> Job:
+        """Take the oldest job of the session whose turn it is (caller holds the condition)"""
+        session_id, session_queue = next(iter(self.sessions.items()))
+        job = session_queue.popleft()
+        del self.sessions[session_id]
+        if session_queue:
+            # Back of the line: other sessions get a turn first
+            self.sessions[session_id] = session_queue
+        self.queued -= 1
+        QUEUE_DEPTH.set(self.queued, route=self.name)
+        return job
+
+    def position(self, job: Job) -> int:
+        """Position of a queued job in round-robin service order (0 if not queued)"""
+        with self.condition:
+            queues = [list(q) for q in self.sessions.values()]
+            ahead, depth = 0, 0
+            while any(depth < len(q) for q in queues):
+                for q in queues:
+                    if depth < len(q):
+                        if q[depth] is job:
+                            return ahead + 1
+                        if not q[depth].future.cancelled():
+                            ahead += 1
+                depth += 1
+            return 0
+
+    def _work(self):
+        while True:
+            with self.condition:
+                while not self.sessions:
+                    self.condition.wait()
+                job = self._next_job()
+
+            if not job.future.set_running_or_notify_cancel():
+                continue
+
+            waited = time.perf_counter() - job.enqueued_at
+            QUEUE_WAIT_SECONDS.observe(waited, route=self.name)
+            if self.max_wait_seconds is not None and waited > self.max_wait_seconds:
+                # Fail fast instead of starting work the user has likely given up on
+                QUEUE_REJECTED.inc(route=self.name, reason="wait_timeout")
+                job.future.set_exception(QueueTimeoutError(
+                    f"Waited {waited:.0f}s in the {self.name} queue (limit {self.max_wait_seconds}s)"))
+                continue
+
+            try:
+                job.future.set_result(job.context.run(job.fn, *job.args))
+            except BaseException as e:
+                job.future.set_exception(e)
+
+
+class RequestScheduler:
+    """
+    Routes chat work to per-route pools (SQL and RAG) configured in config/agents.yaml,
+    plus a small router pool that classifies messages before they are routed.
+    """
+
+    DEFAULTS = {
+        "router": {"workers": 4, "max_queue": 32, "max_wait_seconds": 30},
+        "sql": {"workers": 4, "max_queue": 32, "max_wait_seconds": 120},
+        "rag": {"workers": 8, "max_queue": 64, "max_wait_seconds": 60}
+    }
+
+    def __init__(self, config: Dict[str, Any]):
+        per_session = config.get("max_queued_per_session", 3)
+        self.pools = {}
+        for route, defaults in self.DEFAULTS.items():
+            settings = dict(defaults, **(config.get(route) or {}))
+            self.pools[route] = RoutePool(
+                route,
+                workers=settings["workers"],
+                max_queue=settings["max_queue"],
+                max_queued_per_session=per_session,
+                max_wait_seconds=settings.get("max_wait_seconds")
+            )
+        logger.info("Request scheduler started: " + ", ".join(
+            f"{route} {pool.workers} workers / {pool.max_queue} queued" for route, pool in self.pools.items()))
+
+    def submit(self, route: str, session_id: str, fn: Callable, *args) -> Job:
+        """Queue fn(*args) on the pool for route ("SQL" or "RAG")"""
+        return self.pools[route.lower()].submit(session_id, fn, *args)
+
+    def check_room(self, session_id: str):
+        """Raise QueueFullError when no answer pool would take a question from this session"""
+        if not any(self.pools[route].has_room(session_id) for route in ANSWER_ROUTES):
+            QUEUE_REJECTED.inc(route="all", reason="no_room")
+            raise QueueFullError("All answer queues are full for this session")
+
+    @property
+    def capacity(self) -> int:
+        """Questions that can be in flight or queued across the answer pools"""
+        return sum(self.pools[route].workers + self.pools[route].max_queue for route in ANSWER_ROUTES)
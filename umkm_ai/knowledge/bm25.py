@@ -0,0 +1,157 @@
+import json
+import logging
+import re
+from collections import Counter
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+STOPWORDS = {
+    # Indonesian
+    "yang", "dan", "di", "ke", "dari", "untuk", "dengan", "ini", "itu", "atau", "pada", "adalah",
+    "saya", "anda", "kami", "kita", "apa", "ada", "akan", "agar", "juga", "tidak", "bisa", "dalam",
+    "sudah", "belum", "jika", "karena", "oleh", "sebagai", "para", "nya", "lah", "pun",
+    # English
+    "the", "a", "an", "and", "or", "of", "to", "in", "for", "on", "is", "are", "was", "were",
+    "my", "i", "we", "you", "with", "be", "it", "this", "that", "do", "does", "can", "at", "by"
+}
+
+BM25_FILE = "bm25.npz"
+VOCAB_FILE = "bm25_vocab.json"
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stopwords; keeps numbers and brand words (QRIS, sembako) intact"""
+    return [token for token in re.findall(r"\w+", text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Inverted-index BM25 over chunk tokens.
+    Postings are stored as CSR arrays (term -> doc ids, term frequencies);
+    documents added since the last consolidation live in a small tail that
+    is merged automatically once it grows past max_tail.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, max_tail: int = 1000):
+        self.k1 = k1
+        self.b = b
+        self.max_tail = max_tail
+        self.vocab = {}
+        self.term_ptr = np.zeros(1, dtype=np.int64)
+        self.doc_ids = np.zeros(0, dtype=np.int32)
+        self.tfs = np.zeros(0, dtype=np.float32)
+        self.doc_len = np.zeros(0, dtype=np.float32)
+        self.tail = []
+        self.key = ""
+
+    @property
+    def size(self) -> int:
+        return len(self.doc_len) + len(self.tail)
+
+    def add(self, texts: List[str]):
+        """Index documents; their ids continue from the current size"""
+        for text in texts:
+            counts = Counter(tokenize(text))
+            term_ids = np.fromiter((self.vocab.setdefault(t, len(self.vocab)) for t in counts),
+                                   dtype=np.int64, count=len(counts))
+            tfs = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+            self.tail.append((term_ids, tfs))
+        if len(self.tail) > self.max_tail:
+            self.consolidate()
+
+    def consolidate(self):
+        """Merge tail documents into the CSR arrays"""
+        if not self.tail:
+            return
+        base_terms = np.repeat(np.arange(len(self.term_ptr) - 1, dtype=np.int64), np.diff(self.term_ptr))
+        first_new = len(self.doc_len)
+        tail_docs = np.concatenate([np.full(len(t), first_new + i, dtype=np.int32)
+                                    for i, (t, _) in enumerate(self.tail)])
+
+        terms = np.concatenate([base_terms] + [t for t, _ in self.tail])
+        docs = np.concatenate([self.doc_ids, tail_docs])
+        tfs = np.concatenate([self.tfs] + [f for _, f in self.tail])
+
+        order = np.lexsort((docs, terms))
+        counts = np.bincount(terms, minlength=len(self.vocab))
+        self.term_ptr = np.zeros(len(self.vocab) + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.term_ptr[1:])
+        self.doc_ids, self.tfs = docs[order], tfs[order]
+
+        tail_len = np.asarray([f.sum() for _, f in self.tail], dtype=np.float32)
+        self.doc_len = np.concatenate([self.doc_len, tail_len])
+        self.tail = []
+
+    def _postings(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        docs, tfs = np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+        if term_id < len(self.term_ptr) - 1:
+            start, end = self.term_ptr[term_id], self.term_ptr[term_id + 1]
+            docs, tfs = self.doc_ids[start:end], self.tfs[start:end]
+        tail_docs, tail_tfs = [], []
+        for i, (term_ids, term_tfs) in enumerate(self.tail):
+            hit = np.nonzero(term_ids == term_id)[0]
+            if len(hit):
+                tail_docs.append(len(self.doc_len) + i)
+                tail_tfs.append(term_tfs[hit[0]])
+        if tail_docs:
+            docs = np.concatenate([docs, np.asarray(tail_docs, dtype=np.int32)])
+            tfs = np.concatenate([tfs, np.asarray(tail_tfs, dtype=np.float32)])
+        return docs, tfs
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every document for the query"""
+        n_docs = self.size
+        scores = np.zeros(n_docs, dtype=np.float32)
+        terms = [self.vocab[t] for t in set(tokenize(query)) if t in self.vocab]
+        if not n_docs or not terms:
+            return scores
+
+        doc_len = self.doc_len if not self.tail else np.concatenate(
+            [self.doc_len, np.asarray([f.sum() for _, f in self.tail], dtype=np.float32)])
+        norm = self.k1 * (1 - self.b + self.b * doc_len / max(float(doc_len.mean()), 1.0))
+
+        for term_id in terms:
+            docs, tfs = self._postings(term_id)
+            if not len(docs):
+                continue
+            idf = np.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + norm[docs])
+        return scores
+
+    def save(self, index_dir: Path, key: str = ""):
+        """
+        Persist consolidated postings next to the vector index
+
+        Args:
+            index_dir (Path): Vector index directory
+            key (str): Identifies the indexed chunks (checked by the caller on load)
+        """
+        self.consolidate()
+        self.key = key
+        np.savez(Path(index_dir) / BM25_FILE, term_ptr=self.term_ptr, doc_ids=self.doc_ids,
+                 tfs=self.tfs, doc_len=self.doc_len, key=np.asarray(key))
+        with open(Path(index_dir) / VOCAB_FILE, "w", encoding="utf-8") as f:
+            json.dump(self.vocab, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, index_dir: Path, k1: float = 1.5, b: float = 0.75) -> Optional["BM25Index"]:
+        """Load persisted postings, or None when there are none"""
+        path = Path(index_dir) / BM25_FILE
+        if not path.exists() or not (Path(index_dir) / VOCAB_FILE).exists():
+            return None
+        try:
+            index = cls(k1, b)
+            with np.load(path) as data:
+                index.term_ptr, index.doc_ids = data["term_ptr"], data["doc_ids"]
+                index.tfs, index.doc_len = data["tfs"], data["doc_len"]
+                index.key = str(data["key"]) if "key" in data else ""
+            with open(Path(index_dir) / VOCAB_FILE, "r", encoding="utf-8") as f:
+                index.vocab = json.load(f)
+            return index
+        except Exception as e:
+            logger.warning(f"Could not load BM25 index, rebuilding: {str(e)}")
+            return None
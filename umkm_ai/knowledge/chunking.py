@@ -0,0 +1,57 @@
+import hashlib
+import re
+from typing import Dict, Any, List
+
+
+def content_hash(text: str) -> str:
+    """Stable hash of normalized text, used as chunk and document identity"""
+    normalized = re.sub(r"\s+", " ", text).strip().lower()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def chunk_text(text: str, source: str, max_chars: int = 800) -> List[Dict[str, Any]]:
+    """
+    Split text into retrieval chunks along paragraph boundaries
+
+    Paragraphs are merged until max_chars; paragraphs longer than max_chars
+    are split on line boundaries.
+
+    Args:
+        text (str): Document text
+        source (str): Source name stored with each chunk
+        max_chars (int): Target maximum chunk size in characters
+
+    Returns:
+        List[Dict[str, Any]]: Chunks with text, source, position and content hash
+    """
+    pieces = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_chars:
+            pieces.append(paragraph)
+            continue
+        current = ""
+        for line in paragraph.splitlines():
+            if current and len(current) + len(line) + 1 > max_chars:
+                pieces.append(current)
+                current = ""
+            current = f"{current}\n{line}" if current else line
+        if current:
+            pieces.append(current)
+
+    chunks = []
+    current = ""
+    for piece in pieces:
+        if current and len(current) + len(piece) + 2 > max_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+
+    return [
+        {"text": chunk, "source": source, "position": i, "hash": content_hash(chunk)}
+        for i, chunk in enumerate(chunks)
+    ]
@@ -0,0 +1,69 @@
+import hashlib
+import logging
+import re
+from typing import Dict, Any, List
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class HashingEmbedder:
+    """
+    Dependency-free embedder using signed feature hashing of words and
+    character trigrams. Works fully offline; weaker than a trained model
+    but robust to Indonesian affixes and brand words.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text: str) -> List[str]:
+        words = re.findall(r"\w+", text.lower())
+        features = list(words)
+        for word in words:
+            padded = f"#{word}#"
+            features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+        return features
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+                bucket = int.from_bytes(digest[:4], "little") % self.dim
+                sign = 1.0 if digest[4] & 1 else -1.0
+                vectors[row, bucket] += sign
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+
+class HuggingFaceEmbedder:
+    """Sentence-transformer embeddings computed locally on CPU"""
+
+    def __init__(self, model_name: str, batch_size: int = 32):
+        from langchain_huggingface import HuggingFaceEmbeddings
+
+        self.model = HuggingFaceEmbeddings(
+            model_name=model_name,
+            model_kwargs={"device": "cpu"},
+            encode_kwargs={"normalize_embeddings": True, "batch_size": batch_size}
+        )
+        self.name = model_name
+        self.dim = len(self.model.embed_query("dimensi"))
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        return np.asarray(self.model.embed_documents(texts), dtype=np.float32)
+
+
+def get_embedder(config: Dict[str, Any]):
+    """Create the configured embedder, falling back to hashing when the model cannot be loaded"""
+    if config.get("embedder", "huggingface") == "huggingface":
+        model_name = config.get("model_name", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
+        try:
+            return HuggingFaceEmbedder(model_name, config.get("batch_size", 32))
+        except Exception as e:
+            logger.warning(f"Could not load embedding model {model_name}, using hashing embedder: {str(e)}")
+    return HashingEmbedder(config.get("hashing_dim", 384))
@@ -0,0 +1,213 @@
+import argparse
+import logging
+import time
+from pathlib import Path
+from typing import Callable, Dict, Any, List
+
+import numpy as np
+
+from knowledge.chunking import chunk_text, content_hash
+from knowledge.vector_index import VectorIndex
+
+logger = logging.getLogger(__name__)
+
+TEXT_SUFFIXES = {".txt", ".md", ".markdown"}
+PDF_SUFFIXES = {".pdf"}
+
+
+def read_document(path: Path) -> str:
+    """Read a txt/markdown file, or extract the text of a PDF (requires pypdf)"""
+    suffix = path.suffix.lower()
+    if suffix in TEXT_SUFFIXES:
+        return path.read_text(encoding="utf-8")
+    if suffix in PDF_SUFFIXES:
+        try:
+            from pypdf import PdfReader
+        except ImportError:
+            raise ImportError("pypdf is required to ingest PDF files: pip install pypdf")
+        reader = PdfReader(str(path))
+        return "\n\n".join(page.extract_text() or "" for page in reader.pages)
+    raise ValueError(f"Unsupported document type: {path.name}")
+
+
+def expand_paths(paths: List[Path]) -> List[Path]:
+    """Resolve files and directories to supported document files"""
+    files = []
+    for path in paths:
+        if path.is_dir():
+            files.extend(sorted(p for p in path.rglob("*") if p.suffix.lower() in TEXT_SUFFIXES | PDF_SUFFIXES))
+        elif path.exists():
+            files.append(path)
+        else:
+            logger.warning(f"Knowledge source not found: {path}")
+    return files
+
+
+class KnowledgeIngestor:
+    """
+    Incremental knowledge ingestion into the on-disk vector index.
+    Documents are deduplicated by content hash, only chunks not already in
+    the index are embedded (in batches), and vectors plus metadata are
+    appended to disk so startup only has to map the index.
+    """
+
+    def __init__(self, index: VectorIndex, embedder, chunk_chars: int = 800, batch_size: int = 64):
+        self.index = index
+        self.embedder = embedder
+        self.chunk_chars = chunk_chars
+        self.batch_size = batch_size
+        # The index's own lock: concurrent ingests (add_knowledge, SQL insights) never interleave
+        # their appends, and searches snapshot the index between whole documents
+        self.lock = index.lock
+
+    def open(self):
+        """Load the index, creating it (or recreating it for a different embedder) as needed"""
+        if self.index.exists() and self.index.load() and self.index.meta.get("embedder") == self.embedder.name \
+                and self.index.meta.get("chunk_chars") == self.chunk_chars:
+            return
+        logger.info(f"Creating knowledge index for {self.embedder.name} in {self.index.index_dir}")
+        dim = self.embedder.embed(["dimensi"]).shape[1]
+        self.index.create(dim, {"embedder": self.embedder.name, "chunk_chars": self.chunk_chars})
+
+    def _active_documents(self) -> List[Dict[str, Any]]:
+        return [doc for doc in self.index.documents.values() if doc.get("status") == "active"]
+
+    def ingest_text(self, text: str, source: str, replace_source: bool = False) -> Dict[str, int]:
+        """
+        Ingest one document's text
+
+        Args:
+            text (str): Document text
+            source (str): Source name (file path or logical name)
+            replace_source (bool): Retire chunks of earlier versions of the same source
+
+        Returns:
+            Dict[str, int]: Counts of new, reused and skipped chunks
+        """
+        with self.lock:
+            doc_hash = content_hash(text)
+            existing = self.index.documents.get(doc_hash)
+            if existing and existing.get("status") == "active":
+                return {"new_chunks": 0, "reused_chunks": 0, "skipped_chunks": existing["chunks"]}
+
+            chunks = chunk_text(text, source, self.chunk_chars)
+            chunk_hashes = [chunk["hash"] for chunk in chunks]
+
+            if replace_source:
+                self._retire_source(source, doc_hash, set(chunk_hashes))
+
+            active_hashes = self.index.active_chunk_hashes()
+            positions = {chunk["hash"]: i for i, chunk in enumerate(self.index.chunks)}
+            new_chunks, reused = [], []
+            seen = set()
+            for chunk in chunks:
+                if chunk["hash"] in active_hashes or chunk["hash"] in seen:
+                    continue
+                seen.add(chunk["hash"])
+                chunk["document"] = doc_hash
+                # Vectors of retired chunks are reused instead of re-embedded
+                if chunk["hash"] in positions:
+                    reused.append((chunk, positions[chunk["hash"]]))
+                else:
+                    new_chunks.append(chunk)
+
+            if reused:
+                self.index.append([c for c, _ in reused],
+                                  np.asarray(self.index.vectors[[p for _, p in reused]]))
+            for start in range(0, len(new_chunks), self.batch_size):
+                batch = new_chunks[start:start + self.batch_size]
+                self.index.append(batch, self.embedder.embed([chunk["text"] for chunk in batch]))
+
+            self.index.add_document({
+                "hash": doc_hash,
+                "source": source,
+                "chunks": len(chunks),
+                "chunk_hashes": chunk_hashes,
+                "status": "active",
+                "ingested_at": time.strftime("%Y-%m-%dT%H:%M:%S")
+            })
+
+            stats = {
+                "new_chunks": len(new_chunks),
+                "reused_chunks": len(reused),
+                "skipped_chunks": len(chunks) - len(new_chunks) - len(reused)
+            }
+            logger.info(f"Ingested {source}: {stats}")
+            return stats
+
+    def _retire_source(self, source: str, doc_hash: str, keep_hashes: set):
+        """Mask chunks that only belonged to earlier versions of a source"""
+        retired = [doc for doc in self._active_documents() if doc["hash"] != doc_hash and doc["source"] == source]
+        positions = self._retire_documents(retired, keep_hashes)
+        if retired:
+            logger.info(f"Retired {positions} chunks from earlier versions of {source}")
+
+    def _retire_documents(self, retired: List[Dict[str, Any]], keep_hashes: set = frozenset()) -> int:
+        """Mask chunks used only by the given documents and mark them replaced; returns the chunks masked"""
+        if not retired:
+            return 0
+        retired_ids = {doc["hash"] for doc in retired}
+        still_used = set(keep_hashes)
+        for doc in self._active_documents():
+            if doc["hash"] not in retired_ids:
+                still_used.update(doc.get("chunk_hashes", []))
+
+        retired_hashes = {h for doc in retired for h in doc.get("chunk_hashes", [])} - still_used
+        positions = [i for i, chunk in enumerate(self.index.chunks) if chunk["hash"] in retired_hashes]
+        self.index.remove(positions)
+        for doc in retired:
+            self.index.add_document(dict(doc, status="replaced"))
+        return len(positions)
+
+    def retire_where(self, predicate: Callable[[Dict[str, Any]], bool]) -> int:
+        """Retire every active document the predicate selects; returns the chunks masked"""
+        with self.lock:
+            return self._retire_documents([doc for doc in self._active_documents() if predicate(doc)])
+
+    def ingest_paths(self, paths: List[Path], root: Path = None) -> Dict[str, int]:
+        """Ingest files and directories; file sources replace their earlier versions"""
+        totals = {"documents": 0, "new_chunks": 0, "reused_chunks": 0, "skipped_chunks": 0}
+        for path in expand_paths(paths):
+            try:
+                text = read_document(path)
+            except Exception as e:
+                logger.error(f"Error reading {path}: {str(e)}")
+                continue
+            source = str(path.relative_to(root)) if root and path.is_relative_to(root) else str(path)
+            stats = self.ingest_text(text, source, replace_source=True)
+            totals["documents"] += 1
+            for key, value in stats.items():
+                totals[key] += value
+        return totals
+
+
+def main():
+    """Command line entry point (run from the umkm_ai directory)"""
+    from agents.agent_config import get_section
+    from knowledge.embeddings import get_embedder
+    from knowledge.retriever import PROJECT_ROOT
+
+    parser = argparse.ArgumentParser(description="Ingest UMKM knowledge documents into the retrieval index")
+    parser.add_argument("paths", nargs="+", type=Path, help="Files or directories (txt, md, pdf)")
+    parser.add_argument("--rebuild", action="store_true", help="Discard the existing index first")
+    args = parser.parse_args()
+
+    config = get_section("retrieval")
+    embedder = get_embedder(config)
+    index = VectorIndex(PROJECT_ROOT / config.get("index_dir", "knowledge/index"))
+    ingestor = KnowledgeIngestor(index, embedder, config.get("chunk_chars", 800), config.get("batch_size", 64))
+
+    if args.rebuild:
+        index.create(embedder.embed(["dimensi"]).shape[1],
+                     {"embedder": embedder.name, "chunk_chars": ingestor.chunk_chars})
+    ingestor.open()
+
+    totals = ingestor.ingest_paths([path.resolve() for path in args.paths], PROJECT_ROOT)
+    print(f"Documents: {totals['documents']}  New chunks embedded: {totals['new_chunks']}  "
+          f"Reused: {totals['reused_chunks']}  Already indexed: {totals['skipped_chunks']}  "
+          f"Index size: {index.size}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,83 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from knowledge.bm25 import BM25Index
+from knowledge.chunking import content_hash
+from pipeline.data_version import DataVersionStore
+
+logger = logging.getLogger(__name__)
+
+INSIGHT_SOURCE = "sql_insight"
+
+
+class InsightIndex:
+    """
+    Recent SQL-agent answers, searchable next to the knowledge index but kept
+    only in memory: a bounded LRU of `max_entries` answers that all belong to
+    one data version and are dropped as soon as the loader bumps it.
+
+    Writers rebuild an immutable (chunks, vectors, BM25) snapshot and publish
+    it with a single assignment, so searches never see a half-applied change.
+    """
+
+    def __init__(self, embedder, max_entries: int = 200, data_version: Optional[DataVersionStore] = None):
+        self.embedder = embedder
+        self.max_entries = max_entries
+        self.data_version = data_version or DataVersionStore()
+        self.entries: "OrderedDict[str, Tuple[Dict[str, Any], np.ndarray]]" = OrderedDict()
+        self.version = None
+        self.lock = threading.Lock()
+        self._snapshot = ([], None, BM25Index())
+
+    @property
+    def size(self) -> int:
+        return len(self._snapshot[0])
+
+    def _publish(self):
+        chunks = [chunk for chunk, _ in self.entries.values()]
+        vectors = np.vstack([vector for _, vector in self.entries.values()]) if chunks else None
+        bm25 = BM25Index()
+        bm25.add([chunk["text"] for chunk in chunks])
+        bm25.consolidate()
+        self._snapshot = (chunks, vectors, bm25)
+
+    def _check_version(self) -> int:
+        """Current data version; entries from an older one are dropped (caller holds the lock)"""
+        current = self.data_version.current()
+        if current != self.version:
+            if self.entries:
+                logger.info(f"Dropping {len(self.entries)} SQL insights from data version {self.version}")
+                self.entries.clear()
+                self._publish()
+            self.version = current
+        return current
+
+    def add(self, text: str, data_version: int) -> bool:
+        """Add an answer computed from `data_version`; False when that data has been reloaded since"""
+        vector = np.asarray(self.embedder.embed([text])[0], dtype=np.float32)
+        key = content_hash(text)
+        with self.lock:
+            if data_version != self._check_version():
+                return False
+            self.entries.pop(key, None)
+            self.entries[key] = ({"text": text, "source": INSIGHT_SOURCE, "hash": key,
+                                  "data_version": data_version}, vector)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self._publish()
+            return True
+
+    def snapshot(self) -> Tuple[List[Dict[str, Any]], Optional[np.ndarray], BM25Index]:
+        """(chunks, vectors, BM25) of the answers for the current data version"""
+        with self.lock:
+            self._check_version()
+            return self._snapshot
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self._publish()
@@ -0,0 +1,169 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Any, List
+
+import numpy as np
+
+from knowledge.bm25 import BM25Index, tokenize
+from knowledge.embeddings import get_embedder
+from knowledge.ingest import KnowledgeIngestor
+from knowledge.insight_index import InsightIndex, INSIGHT_SOURCE
+from knowledge.vector_index import VectorIndex
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).parent.parent
+RRF_K = 60
+
+
+def _top_indices(scores: np.ndarray, n: int) -> np.ndarray:
+    """Indices of the n highest finite, positive scores, best first"""
+    valid = np.nonzero(np.isfinite(scores) & (scores > 0))[0]
+    if len(valid) > n:
+        valid = valid[np.argpartition(-scores[valid], n - 1)[:n]]
+    return valid[np.argsort(-scores[valid])]
+
+
+class KnowledgeRetriever:
+    """
+    Local, offline hybrid retrieval over UMKM knowledge sources.
+    BM25 over chunk tokens and vector similarity are fused with reciprocal
+    rank fusion, then the fused candidates are reranked by a blend of
+    cosine similarity, normalized BM25 and query-term coverage.
+
+    SQL-agent answers added via index_insight live in a bounded in-memory
+    InsightIndex (never in the on-disk index) that is emptied whenever the
+    loader bumps the data version; both are searched and ranked together.
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        self.config = config
+        self.top_k = config.get("top_k", 4)
+        self.min_score = config.get("min_score")
+        hybrid = config.get("hybrid") or {}
+        self.candidate_pool = hybrid.get("candidate_pool", 50)
+        self.rerank_pool = hybrid.get("rerank_pool", 20)
+        self.weights = dict({"vector": 0.4, "bm25": 0.4, "coverage": 0.2}, **(hybrid.get("weights") or {}))
+        self.embedder = get_embedder(config)
+        self.index = VectorIndex(PROJECT_ROOT / config.get("index_dir", "knowledge/index"))
+        self.ingestor = KnowledgeIngestor(
+            self.index,
+            self.embedder,
+            chunk_chars=config.get("chunk_chars", 800),
+            batch_size=config.get("batch_size", 64)
+        )
+        self.bm25 = BM25Index()
+        self.insights = InsightIndex(self.embedder, max_entries=config.get("sql_insight_max_entries", 200))
+        self.insight_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="insight-indexer")
+
+    def load_or_build(self):
+        """Map the on-disk index and ingest configured sources (only new content gets embedded)"""
+        self.ingestor.open()
+        sources = [PROJECT_ROOT / source for source in self.config.get("sources", ["prompts/base_context.txt"])]
+        totals = self.ingestor.ingest_paths(sources, PROJECT_ROOT)
+        # Earlier versions wrote SQL answers into the on-disk index
+        self.ingestor.retire_where(lambda doc: doc["source"] == INSIGHT_SOURCE)
+
+        # The saved postings are reused only if they cover a prefix of the current chunks
+        bm25 = BM25Index.load(self.index.index_dir)
+        if bm25 is None or bm25.size > self.index.size or bm25.key != self._bm25_key(bm25.size):
+            bm25 = BM25Index()
+        self.bm25 = bm25
+        if self._sync_bm25():
+            self.bm25.save(self.index.index_dir, self._bm25_key(self.bm25.size))
+
+        logger.info(f"Knowledge index ready: {self.index.size} chunks, "
+                    f"{totals['new_chunks']} newly embedded at startup")
+
+    def _bm25_key(self, size: int) -> str:
+        return f"{size}:{self.index.chunks[size - 1]['hash']}" if size else ""
+
+    def _sync_bm25(self) -> int:
+        """Add chunks appended to the vector index since BM25 was last updated"""
+        with self.index.lock:
+            missing = self.index.chunks[self.bm25.size:self.index.size]
+            if missing:
+                self.bm25.add([chunk["text"] for chunk in missing])
+            return len(missing)
+
+    def retrieve(self, question: str, top_k: int = None) -> List[Dict[str, Any]]:
+        """Get the most relevant chunks (knowledge and recent SQL answers) for a question, best first"""
+        insight_chunks, insight_vectors, insight_bm25 = self.insights.snapshot()
+        if not self.index.size and not insight_chunks:
+            return []
+        query_vector = np.asarray(self.embedder.embed([question])[0], dtype=np.float32).ravel()
+        query_terms = set(tokenize(question))
+
+        # Vectors, mask, chunks and BM25 postings taken together, so an ingest running in
+        # another thread cannot leave them at different sizes
+        with self.index.lock:
+            self._sync_bm25()
+            vectors, removed, chunks = self.index.snapshot()
+            bm25_scores = self.bm25.scores(question)
+
+        ranked = []
+        if chunks:
+            vector_scores = vectors @ query_vector
+            vector_scores[removed] = -np.inf
+            bm25_scores[removed] = 0
+            ranked.extend(self._rank(query_terms, chunks, vector_scores, bm25_scores))
+        if insight_chunks:
+            ranked.extend(self._rank(query_terms, insight_chunks, insight_vectors @ query_vector,
+                                     insight_bm25.scores(question)))
+
+        ranked.sort(key=lambda item: item[0], reverse=True)
+        return [dict(chunk, score=score) for score, chunk in ranked[:top_k or self.top_k]]
+
+    def _rank(self, query_terms: set, chunks: List[Dict[str, Any]], vector_scores: np.ndarray,
+              bm25_scores: np.ndarray) -> List[tuple]:
+        """(score, chunk) of the best candidates of one collection, fused then reranked"""
+        # Reciprocal rank fusion of the two candidate lists
+        fused = {}
+        for ranking in (_top_indices(vector_scores, self.candidate_pool),
+                        _top_indices(bm25_scores, self.candidate_pool)):
+            for rank, position in enumerate(ranking):
+                fused[position] = fused.get(position, 0.0) + 1.0 / (RRF_K + rank + 1)
+        candidates = sorted(fused, key=fused.get, reverse=True)[:self.rerank_pool]
+
+        # Rerank: exact query-term coverage rescues brand words the embedding misses
+        max_bm25 = float(bm25_scores.max()) if len(bm25_scores) else 0.0
+        reranked = []
+        for position in candidates:
+            chunk = chunks[position]
+            coverage = len(query_terms & set(tokenize(chunk["text"]))) / len(query_terms) if query_terms else 0.0
+            score = (
+                self.weights["vector"] * max(float(vector_scores[position]), 0.0)
+                + self.weights["bm25"] * (float(bm25_scores[position]) / max_bm25 if max_bm25 > 0 else 0.0)
+                + self.weights["coverage"] * coverage
+            )
+            if self.min_score is None or score >= self.min_score:
+                reranked.append((score, chunk))
+        return reranked
+
+    def add_text(self, content: str, source: str = "add_knowledge") -> Dict[str, int]:
+        """Ingest additional knowledge and persist it to the index"""
+        stats = self.ingestor.ingest_text(content, source)
+        self._sync_bm25()
+        return stats
+
+    def index_insight(self, question: str, answer: str, data_version: int = None):
+        """
+        Make a SQL-agent answer retrievable (embedded in the background) until the data is reloaded
+
+        Args:
+            question (str): Question the SQL agent answered
+            answer (str): Its answer (with concrete figures)
+            data_version (int): Data version read before the answer was computed; default is the current one
+        """
+        text = f"Wawasan data sebelumnya untuk pertanyaan: {question}\n{answer}"
+        if data_version is None:
+            data_version = self.insights.data_version.current()
+        self.insight_executor.submit(self._index_insight, text, data_version)
+
+    def _index_insight(self, text: str, data_version: int):
+        try:
+            # False when a reload finished after the answer was computed: its figures are already stale
+            self.insights.add(text, data_version)
+        except Exception as e:
+            logger.error(f"Error indexing SQL insight: {str(e)}")
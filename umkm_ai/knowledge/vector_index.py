@@ -0,0 +1,169 @@
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+VECTORS_FILE = "vectors.f32"
+CHUNKS_FILE = "chunks.jsonl"
+DOCUMENTS_FILE = "documents.jsonl"
+META_FILE = "meta.json"
+
+
+class VectorIndex:
+    """
+    On-disk vector index: float32 vectors in a raw file that is memory-mapped
+    at load time, with chunk metadata in a JSONL file alongside.
+    Vectors are L2-normalized, so inner product is cosine similarity.
+    The files are append-only; replaced chunks are masked via meta["removed"].
+
+    `lock` (reentrant) guards every change; readers running next to writers
+    take a consistent view with snapshot().
+    """
+
+    def __init__(self, index_dir: Path):
+        self.index_dir = Path(index_dir)
+        self.meta = {}
+        self.chunks = []
+        self.documents = {}
+        self.removed = np.zeros(0, dtype=bool)
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self.lock = threading.RLock()
+
+    @property
+    def size(self) -> int:
+        return len(self.chunks)
+
+    def exists(self) -> bool:
+        return (self.index_dir / META_FILE).exists()
+
+    def load(self) -> bool:
+        """Memory-map an existing index"""
+        try:
+            with open(self.index_dir / META_FILE, "r", encoding="utf-8") as f:
+                self.meta = json.load(f)
+            with open(self.index_dir / CHUNKS_FILE, "r", encoding="utf-8") as f:
+                self.chunks = [json.loads(line) for line in f if line.strip()]
+            self.documents = {}
+            documents_path = self.index_dir / DOCUMENTS_FILE
+            if documents_path.exists():
+                with open(documents_path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            document = json.loads(line)
+                            self.documents[document["hash"]] = document
+
+            # Only the first meta["count"] rows are committed; drop any tail left by a crashed append
+            count, dim = min(len(self.chunks), self.meta["count"]), self.meta["dim"]
+            if len(self.chunks) > count:
+                logger.warning(f"Discarding {len(self.chunks) - count} uncommitted chunks in {self.index_dir}")
+                self.chunks = self.chunks[:count]
+                with open(self.index_dir / CHUNKS_FILE, "w", encoding="utf-8") as f:
+                    for chunk in self.chunks:
+                        f.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+            vectors_path = self.index_dir / VECTORS_FILE
+            if vectors_path.stat().st_size > count * dim * 4:
+                os.truncate(vectors_path, count * dim * 4)
+            self._map_vectors(count, dim)
+            self.removed = np.zeros(count, dtype=bool)
+            self.removed[[i for i in self.meta.get("removed", []) if i < count]] = True
+
+            logger.info(f"Vector index loaded: {count} chunks, dim {dim} from {self.index_dir}")
+            return True
+        except Exception as e:
+            logger.error(f"Error loading vector index from {self.index_dir}: {str(e)}")
+            return False
+
+    def _map_vectors(self, count: int, dim: int):
+        if count:
+            self.vectors = np.memmap(self.index_dir / VECTORS_FILE, dtype=np.float32,
+                                     mode="r", shape=(count, dim))
+        else:
+            self.vectors = np.zeros((0, dim), dtype=np.float32)
+
+    def _write_meta(self):
+        with open(self.index_dir / META_FILE, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f, indent=2)
+
+    def create(self, dim: int, meta: Dict[str, Any]):
+        """Create a new empty index, replacing any existing one"""
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        for name in (VECTORS_FILE, CHUNKS_FILE, DOCUMENTS_FILE):
+            (self.index_dir / name).write_bytes(b"")
+        self.meta = dict(meta, dim=int(dim), count=0, removed=[])
+        self._write_meta()
+        self.load()
+
+    def append(self, chunks: List[Dict[str, Any]], vectors: np.ndarray):
+        """Append chunks and their vectors to disk and remap the vectors"""
+        if not chunks:
+            return
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self.lock:
+            with open(self.index_dir / VECTORS_FILE, "ab") as f:
+                f.write(vectors.tobytes())
+            with open(self.index_dir / CHUNKS_FILE, "a", encoding="utf-8") as f:
+                for chunk in chunks:
+                    f.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+
+            # meta.json is written last, so it only ever counts fully written rows
+            self.chunks.extend(chunks)
+            self.meta["count"] = len(self.chunks)
+            self._write_meta()
+            self._map_vectors(len(self.chunks), self.meta["dim"])
+            self.removed = np.concatenate([self.removed, np.zeros(len(chunks), dtype=bool)])
+
+    def remove(self, positions: List[int]):
+        """Mask chunks so they are no longer returned by search"""
+        if not positions:
+            return
+        with self.lock:
+            self.removed[positions] = True
+            self.meta["removed"] = sorted(set(self.meta.get("removed", [])) | set(positions))
+            self._write_meta()
+
+    def snapshot(self) -> Tuple[np.ndarray, np.ndarray, List[Dict[str, Any]]]:
+        """(vectors, removed mask, chunks) of the same size, unaffected by later appends and removals"""
+        with self.lock:
+            return self.vectors, self.removed.copy(), self.chunks[:len(self.removed)]
+
+    def add_document(self, document: Dict[str, Any]):
+        """Record an ingested document (keyed by content hash)"""
+        with self.lock:
+            with open(self.index_dir / DOCUMENTS_FILE, "a", encoding="utf-8") as f:
+                f.write(json.dumps(document, ensure_ascii=False) + "\n")
+            self.documents[document["hash"]] = document
+
+    def active_chunk_hashes(self) -> set:
+        """Content hashes of chunks that are still searchable"""
+        return {chunk["hash"] for chunk, removed in zip(self.chunks, self.removed) if not removed}
+
+    def similarities(self, query_vector: np.ndarray) -> np.ndarray:
+        """Cosine similarity of every chunk to the query (-inf for removed chunks)"""
+        vectors, removed, _ = self.snapshot()
+        if not len(removed):
+            return np.zeros(0, dtype=np.float32)
+        scores = vectors @ np.asarray(query_vector, dtype=np.float32).ravel()
+        scores[removed] = -np.inf
+        return scores
+
+    def search(self, query_vector: np.ndarray, top_k: int = 4,
+               min_score: Optional[float] = None) -> List[Tuple[float, Dict[str, Any]]]:
+        """Return the top-k (score, chunk) pairs by cosine similarity"""
+        vectors, removed, chunks = self.snapshot()
+        if not len(chunks):
+            return []
+        scores = vectors @ np.asarray(query_vector, dtype=np.float32).ravel()
+        scores[removed] = -np.inf
+        top_k = min(top_k, len(chunks))
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        ranked = candidates[np.argsort(-scores[candidates])]
+        return [
+            (float(scores[i]), chunks[i]) for i in ranked
+            if not removed[i] and (min_score is None or scores[i] >= min_score)
+        ]
@@ -2,6 +2,7 @@ import argparse
 import logging
 import sys
 import os
+from monitoring.startup import STARTUP
 
 # Setup logging
 logging.basicConfig(
@@ -15,13 +16,23 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+def setup_tracing():
+    """Configure per-request tracing (TRACE_EXPORTER=jsonl|otlp|none)"""
+    try:
+        from monitoring.tracing import configure_tracing
+        configure_tracing()
+    except Exception as e:
+        logger.warning(f"Tracing disabled: {str(e)}")
+
 def run_gradio():
     """Run Gradio interface"""
     try:
-        from interfaces.gradioapp import GradioApp
+        with STARTUP.phase("imports"):
+            from interfaces.gradioapp import GradioApp
         
         logger.info("Starting Gradio interface...")
-        app = GradioApp()
+        with STARTUP.phase("app"):
+            app = GradioApp()
         app.launch()
         
     except ImportError as e:
@@ -31,10 +42,25 @@ def run_gradio():
         logger.error(f"Error starting Gradio interface: {str(e)}")
         sys.exit(1)
 
+def run_benchmark(concurrency: int):
+    """Run the offline agent latency benchmark against the mock LLM server"""
+    try:
+        from benchmark.run_benchmark import run_benchmark as run, print_report
+        
+        logger.info("Starting offline agent benchmark...")
+        report = run(concurrency=concurrency)
+        print_report(report)
+        
+    except Exception as e:
+        logger.error(f"Error running benchmark: {str(e)}")
+        sys.exit(1)
+
 def main():
     """Main application runner"""
     # Ensure logs directory exists
     os.makedirs("logs", exist_ok=True)
+    with STARTUP.phase("tracing"):
+        setup_tracing()
     
     # Parse command line arguments
     parser = argparse.ArgumentParser(description="Mas Warung - AI UMKM Assistant")
@@ -43,14 +69,30 @@ def main():
         action="store_true",
         help="Run Gradio web interface"
     )
+    parser.add_argument(
+        "--benchmark", "-b",
+        action="store_true",
+        help="Run offline agent latency benchmark with a mock LLM server"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Concurrent questions for --benchmark (default: 4)"
+    )
     
     args = parser.parse_args()
     
+    if args.benchmark:
+        run_benchmark(args.concurrency)
+        return
+    
     # Check if no arguments provided, default to gradio
     if not args.gradio:
         print("Mas Warung - AI UMKM Assistant")
         print("Usage:")
         print("  python main.py --gradio or  python main.py -g    (Run Gradio web interface)")
+        print("  python main.py --benchmark or python main.py -b  (Run offline agent benchmark)")
         run_gradio()
     else:
         run_gradio()
@@ -0,0 +1,308 @@
+import bisect
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Optional, Sequence, Tuple, TYPE_CHECKING
+from uuid import UUID
+
+if TYPE_CHECKING:
+    from langchain_core.outputs import LLMResult
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 180)
+DB_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+ITERATION_BUCKETS = (1, 2, 3, 4, 5, 6, 8, 10, 12, 15)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{str(value).replace(chr(34), chr(39))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    """Base class for labelled metrics"""
+
+    metric_type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Counter(Metric):
+    """Monotonically increasing counter"""
+
+    metric_type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        with self.lock:
+            return self.values.get(self._key(labels), 0)
+
+
+class Gauge(Metric):
+    """Value that can go up and down"""
+
+    metric_type = "gauge"
+
+    def set(self, value: float, **labels):
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    """Cumulative histogram with fixed buckets"""
+
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self.lock:
+            counts, total, count = self.values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                counts[index] += 1
+            self.values[key] = (counts, total + value, count + 1)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for key, (counts, total, count) in sorted(self.values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    labels = _format_labels(self.labelnames, key, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{labels} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    """Collection of metrics rendered in the Prometheus text exposition format"""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+MESSAGES = REGISTRY.register(Counter(
+    "umkm_chat_messages_total", "Chat messages by route and classification method", ["route", "method"]))
+AGENT_LATENCY = REGISTRY.register(Histogram(
+    "umkm_agent_latency_seconds", "End-to-end agent query latency", ["agent"]))
+AGENT_ITERATIONS = REGISTRY.register(Histogram(
+    "umkm_agent_iterations", "Tool-calling iterations used per SQL agent run", ["agent"], ITERATION_BUCKETS))
+AGENT_QUERIES = REGISTRY.register(Counter(
+    "umkm_agent_queries_total", "Agent queries processed", ["agent"]))
+AGENT_RETRIES = REGISTRY.register(Counter(
+    "umkm_agent_retries_total", "Agent re-runs by reason", ["agent", "reason"]))
+LLM_REQUESTS = REGISTRY.register(Counter(
+    "umkm_llm_requests_total", "LLM requests by model and outcome", ["model", "status"]))
+LLM_TOKENS = REGISTRY.register(Counter(
+    "umkm_llm_tokens_total", "LLM tokens by model and direction", ["model", "direction"]))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    "umkm_cache_requests_total", "Cache lookups by cache and result", ["cache", "result"]))
+DB_QUERY_SECONDS = REGISTRY.register(Histogram(
+    "umkm_db_query_seconds", "SQL statement execution time", ["tool"], DB_BUCKETS))
+ACTIVE_SESSIONS = REGISTRY.register(Gauge(
+    "umkm_active_sessions", "Chat sessions active in the last session window"))
+QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "umkm_queue_depth", "Requests waiting in the scheduler queue", ["route"]))
+QUEUE_WAIT_SECONDS = REGISTRY.register(Histogram(
+    "umkm_queue_wait_seconds", "Time requests waited in the scheduler queue", ["route"]))
+QUEUE_REJECTED = REGISTRY.register(Counter(
+    "umkm_queue_rejected_total", "Requests rejected by the scheduler", ["route", "reason"]))
+LLM_GATEWAY_EVENTS = REGISTRY.register(Counter(
+    "umkm_llm_gateway_events_total", "LLM gateway retries, hedges, fallbacks and rate-limit waits", ["model", "event"]))
+QUERY_GUARD_EVENTS = REGISTRY.register(Counter(
+    "umkm_query_guard_events_total", "Agent SQL rejected (write, cost), timed out or truncated", ["event"]))
+DB_FAILOVERS = REGISTRY.register(Counter(
+    "umkm_db_failovers_total", "Agent database connections opened on the primary because the replica was unreachable"))
+STARTUP_SECONDS = REGISTRY.register(Gauge(
+    "umkm_startup_seconds", "Service startup time by phase (seconds)", ["phase"]))
+
+
+class MetricsCallbacks:
+    """
+    LangChain callbacks that record LLM token usage and SQL execution time.
+    Turned into a BaseCallbackHandler by get_metrics_callback, so the service
+    does not import langchain_core at startup just to expose metrics.
+    """
+
+    def __init__(self):
+        self.runs = {}
+        self.lock = threading.Lock()
+
+    def _model_name(self, serialized: Dict[str, Any], kwargs: Dict[str, Any]) -> str:
+        params = kwargs.get("invocation_params") or {}
+        return params.get("model_name") or params.get("model") or (serialized or {}).get("name", "unknown")
+
+    def _start(self, run_id: UUID, label: str):
+        with self.lock:
+            self.runs[run_id] = (label, time.perf_counter())
+
+    def _finish(self, run_id: UUID) -> Optional[Tuple[str, float]]:
+        with self.lock:
+            run = self.runs.pop(run_id, None)
+        if run:
+            return run[0], time.perf_counter() - run[1]
+        return None
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(run_id, self._model_name(serialized, kwargs))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id, self._model_name(serialized, kwargs))
+
+    def on_llm_end(self, response: "LLMResult", *, run_id, **kwargs):
+        from monitoring.tracing import extract_token_usage
+
+        run = self._finish(run_id)
+        # The LLM gateway reports which model actually answered (primary or fallback)
+        model = (response.llm_output or {}).get("served_by") or (run[0] if run else "unknown")
+        tokens_in, tokens_out = extract_token_usage(response)
+        LLM_REQUESTS.inc(model=model, status="ok")
+        LLM_TOKENS.inc(tokens_in, model=model, direction="in")
+        LLM_TOKENS.inc(tokens_out, model=model, direction="out")
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        run = self._finish(run_id)
+        LLM_REQUESTS.inc(model=run[0] if run else "unknown", status="error")
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        tool_name = (serialized or {}).get("name", "tool")
+        if tool_name == "sql_db_query":
+            self._start(run_id, tool_name)
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        run = self._finish(run_id)
+        if run:
+            DB_QUERY_SECONDS.observe(run[1], tool=run[0])
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        run = self._finish(run_id)
+        if run:
+            DB_QUERY_SECONDS.observe(run[1], tool=run[0])
+
+
+_metrics_callback = None
+_metrics_callback_lock = threading.Lock()
+
+
+def get_metrics_callback():
+    """The process-wide metrics callback handler (langchain_core is imported on first use)"""
+    global _metrics_callback
+    with _metrics_callback_lock:
+        if _metrics_callback is None:
+            from langchain_core.callbacks import BaseCallbackHandler
+
+            class MetricsCallbackHandler(MetricsCallbacks, BaseCallbackHandler):
+                pass
+
+            _metrics_callback = MetricsCallbackHandler()
+        return _metrics_callback
+
+
+class SessionTracker:
+    """Track chat sessions seen recently and publish the active count"""
+
+    def __init__(self, window_seconds: int = 1800):
+        self.window_seconds = window_seconds
+        self.last_seen = {}
+        self.lock = threading.Lock()
+
+    def touch(self, session_id: str):
+        now = time.time()
+        with self.lock:
+            self.last_seen[session_id] = now
+            cutoff = now - self.window_seconds
+            self.last_seen = {sid: ts for sid, ts in self.last_seen.items() if ts >= cutoff}
+            ACTIVE_SESSIONS.set(len(self.last_seen))
+
+
+class MetricsServer:
+    """
+    Serve the registry on /metrics from a background thread. Listens on localhost
+    by default: the metrics carry no authentication, so exposing them to the
+    network (host "0.0.0.0", e.g. for a Prometheus in another container) is opt-in.
+    """
+
+    def __init__(self, port: int = 9090, host: str = "127.0.0.1", registry: Registry = REGISTRY):
+        self.port = port
+        self.host = host
+        self.registry = registry
+        self.server = None
+
+    def start(self):
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                data = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        logger.info(f"Metrics endpoint listening on http://{self.host}:{self.port}/metrics")
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
@@ -0,0 +1,58 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimer:
+    """
+    Records how long each startup phase takes (imports, agent construction,
+    interface build, ...). Deliberately dependency-free so it can be used
+    before the heavy libraries are imported.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: List[Tuple[str, float]] = []
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time a startup phase"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def record(self, name: str, seconds: float):
+        with self.lock:
+            self.phases.append((name, seconds))
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def summary(self) -> Dict[str, float]:
+        """Phase durations in seconds, plus the total since process start"""
+        with self.lock:
+            summary = {name: round(seconds, 3) for name, seconds in self.phases}
+        summary["total"] = round(self.elapsed(), 3)
+        return summary
+
+    def report(self, title: str = "Startup"):
+        """Log the phase breakdown and export it as the umkm_startup_seconds gauge"""
+        summary = self.summary()
+        breakdown = "  ".join(f"{name}={seconds:.2f}s" for name, seconds in summary.items())
+        logger.info(f"{title} time: {breakdown}")
+        try:
+            from monitoring.metrics import STARTUP_SECONDS
+            for name, seconds in summary.items():
+                STARTUP_SECONDS.set(seconds, phase=name)
+        except Exception as e:
+            logger.debug(f"Startup metrics unavailable: {str(e)}")
+
+
+STARTUP = StartupTimer()
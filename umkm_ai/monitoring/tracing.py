@@ -0,0 +1,361 @@
+import contextvars
+import json
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Any, List, Optional, TYPE_CHECKING
+from uuid import UUID
+
+if TYPE_CHECKING:
+    from langchain_core.outputs import LLMResult
+
+logger = logging.getLogger(__name__)
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """A timed unit of work inside a trace"""
+
+    def __init__(self, name: str, trace_id: str, parent: Optional["Span"] = None,
+                 attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent = parent
+        self.attributes = dict(attributes or {})
+        self.start_time = time.time()
+        self.end_time = None
+        self.status = "OK"
+        self.tokens_in = 0
+        self.tokens_out = 0
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_time or time.time()
+        return (end - self.start_time) * 1000
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def add_tokens(self, tokens_in: int, tokens_out: int):
+        self.tokens_in += tokens_in
+        self.tokens_out += tokens_out
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent.span_id if self.parent else None,
+            "name": self.name,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "duration_ms": round(self.duration_ms, 3),
+            "status": self.status,
+            "tokens_in": self.tokens_in,
+            "tokens_out": self.tokens_out,
+            "attributes": self.attributes
+        }
+
+
+class JSONLExporter:
+    """Append finished spans to a local JSONL file, one span per line"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+
+    def export(self, spans: List[Span]):
+        lines = "".join(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n" for span in spans)
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(lines)
+
+
+class OTLPExporter:
+    """Send finished traces to an OTLP/HTTP collector (JSON encoding) from a background thread"""
+
+    def __init__(self, endpoint: str, service_name: str = "mas-warung"):
+        self.endpoint = endpoint.rstrip("/") + "/v1/traces"
+        self.service_name = service_name
+        self.queue = queue.Queue(maxsize=1000)
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+
+    def export(self, spans: List[Span]):
+        try:
+            self.queue.put_nowait(spans)
+        except queue.Full:
+            logger.warning("OTLP export queue full, dropping trace")
+
+    def _attribute(self, key: str, value: Any) -> Dict[str, Any]:
+        if isinstance(value, bool):
+            return {"key": key, "value": {"boolValue": value}}
+        if isinstance(value, int):
+            return {"key": key, "value": {"intValue": str(value)}}
+        if isinstance(value, float):
+            return {"key": key, "value": {"doubleValue": value}}
+        return {"key": key, "value": {"stringValue": str(value)}}
+
+    def _encode(self, spans: List[Span]) -> Dict[str, Any]:
+        otlp_spans = []
+        for span in spans:
+            attributes = dict(span.attributes, tokens_in=span.tokens_in, tokens_out=span.tokens_out)
+            otlp_span = {
+                "traceId": span.trace_id,
+                "spanId": span.span_id,
+                "name": span.name,
+                "kind": 1,
+                "startTimeUnixNano": str(int(span.start_time * 1e9)),
+                "endTimeUnixNano": str(int((span.end_time or time.time()) * 1e9)),
+                "attributes": [self._attribute(k, v) for k, v in attributes.items()],
+                "status": {"code": 1 if span.status == "OK" else 2}
+            }
+            if span.parent:
+                otlp_span["parentSpanId"] = span.parent.span_id
+            otlp_spans.append(otlp_span)
+
+        return {"resourceSpans": [{
+            "resource": {"attributes": [self._attribute("service.name", self.service_name)]},
+            "scopeSpans": [{"scope": {"name": "umkm_ai"}, "spans": otlp_spans}]
+        }]}
+
+    def _run(self):
+        while True:
+            spans = self.queue.get()
+            try:
+                request = urllib.request.Request(
+                    self.endpoint,
+                    data=json.dumps(self._encode(spans), default=str).encode("utf-8"),
+                    headers={"Content-Type": "application/json"},
+                    method="POST"
+                )
+                urllib.request.urlopen(request, timeout=5).close()
+            except Exception as e:
+                logger.warning(f"OTLP export failed: {str(e)}")
+
+
+class Tracer:
+    """Per-request tracer: one trace per chat message, nested spans via context variables"""
+
+    def __init__(self, exporter=None):
+        self.exporter = exporter
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def start_span(self, name: str, parent: Optional[Span] = None, **attributes) -> Span:
+        """Start a span under the given parent (or the current span, or as a new trace root)"""
+        parent = parent or _current_span.get()
+        trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        span = Span(name, trace_id, parent, attributes)
+        with self.lock:
+            self.pending.setdefault(trace_id, []).append(span)
+        return span
+
+    def end_span(self, span: Span, error: Optional[BaseException] = None):
+        """Finish a span, roll its tokens up to the parent and export the trace when the root ends"""
+        span.end_time = time.time()
+        if error is not None:
+            span.status = "ERROR"
+            span.set_attribute("error", str(error))
+        if span.parent:
+            span.parent.add_tokens(span.tokens_in, span.tokens_out)
+
+        to_export = None
+        with self.lock:
+            if span.parent is None or span.parent.end_time is not None:
+                # Root finished (or orphaned late span): flush everything finished in this trace
+                spans = self.pending.get(span.trace_id, [])
+                to_export = [s for s in spans if s.end_time is not None]
+                remaining = [s for s in spans if s.end_time is None]
+                if remaining:
+                    self.pending[span.trace_id] = remaining
+                else:
+                    self.pending.pop(span.trace_id, None)
+
+        if to_export and self.exporter:
+            try:
+                self.exporter.export(to_export)
+            except Exception as e:
+                logger.warning(f"Trace export failed: {str(e)}")
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Context manager for a span that becomes the current span inside the block"""
+        span = self.start_span(name, **attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            _current_span.reset(token)
+            self.end_span(span, error=e)
+            raise
+        _current_span.reset(token)
+        self.end_span(span)
+
+    @contextmanager
+    def activate(self, span: Span):
+        """Make an already started span current inside the block (without ending it)"""
+        token = _current_span.set(span)
+        try:
+            yield span
+        finally:
+            _current_span.reset(token)
+
+    @contextmanager
+    def trace(self, name: str, **attributes):
+        """Start a new trace, independent of any current span"""
+        token = _current_span.set(None)
+        try:
+            with self.span(name, **attributes) as span:
+                yield span
+        finally:
+            _current_span.reset(token)
+
+
+class TracingCallbacks:
+    """
+    LangChain callbacks that record LLM calls and tool runs (SQL statements) as spans.
+    Turned into a BaseCallbackHandler by create_callback_handler, so importing this
+    module (at startup) does not import langchain_core.
+    """
+
+    def __init__(self, tracer: Tracer):
+        self.tracer = tracer
+        self.runs = {}
+        self.lock = threading.Lock()
+
+    def _start(self, run_id: UUID, name: str, **attributes):
+        span = self.tracer.start_span(name, **attributes)
+        with self.lock:
+            self.runs[run_id] = span
+
+    def _end(self, run_id: UUID, error: Optional[BaseException] = None) -> Optional[Span]:
+        with self.lock:
+            span = self.runs.pop(run_id, None)
+        if span:
+            self.tracer.end_span(span, error=error)
+        return span
+
+    def _model_name(self, serialized: Dict[str, Any], kwargs: Dict[str, Any]) -> str:
+        params = kwargs.get("invocation_params") or {}
+        return params.get("model_name") or params.get("model") or (serialized or {}).get("name", "unknown")
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(run_id, "llm.call", model=self._model_name(serialized, kwargs))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id, "llm.call", model=self._model_name(serialized, kwargs))
+
+    def on_llm_end(self, response: "LLMResult", *, run_id, **kwargs):
+        with self.lock:
+            span = self.runs.get(run_id)
+        if span:
+            tokens_in, tokens_out = extract_token_usage(response)
+            span.add_tokens(tokens_in, tokens_out)
+            served_by = (response.llm_output or {}).get("served_by")
+            if served_by:
+                span.set_attribute("served_by", served_by)
+        self._end(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=error)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        tool_name = (serialized or {}).get("name", "tool")
+        if tool_name == "sql_db_query":
+            self._start(run_id, "db.sql", statement=input_str[:2000])
+        else:
+            self._start(run_id, f"tool.{tool_name}", input=input_str[:500])
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        with self.lock:
+            span = self.runs.get(run_id)
+        if span:
+            span.set_attribute("output_chars", len(str(output)))
+        self._end(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=error)
+
+
+def create_callback_handler(tracer: Tracer):
+    """A LangChain callback handler recording spans on the tracer (langchain_core is imported here)"""
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class TracingCallbackHandler(TracingCallbacks, BaseCallbackHandler):
+        pass
+
+    return TracingCallbackHandler(tracer)
+
+
+def extract_token_usage(response: "LLMResult") -> tuple:
+    """Get (input, output) token counts from an LLM result"""
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    if usage:
+        return usage.get("prompt_tokens", 0) or 0, usage.get("completion_tokens", 0) or 0
+
+    tokens_in = tokens_out = 0
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+            tokens_in += metadata.get("input_tokens", 0)
+            tokens_out += metadata.get("output_tokens", 0)
+    return tokens_in, tokens_out
+
+
+_tracer = None
+_callback_handler = None
+
+
+def configure_tracing(exporter_name: Optional[str] = None) -> Tracer:
+    """
+    Configure the process-wide tracer from environment variables
+
+    TRACE_EXPORTER: jsonl (default), otlp or none
+    TRACE_FILE: JSONL output path (default logs/traces.jsonl)
+    OTEL_EXPORTER_OTLP_ENDPOINT: collector base URL (default http://localhost:4318)
+    """
+    global _tracer, _callback_handler
+
+    exporter_name = (exporter_name or os.getenv("TRACE_EXPORTER", "jsonl")).lower()
+    if exporter_name == "otlp":
+        exporter = OTLPExporter(
+            os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4318"),
+            os.getenv("OTEL_SERVICE_NAME", "mas-warung")
+        )
+    elif exporter_name == "jsonl":
+        exporter = JSONLExporter(os.getenv("TRACE_FILE", "logs/traces.jsonl"))
+    else:
+        exporter = None
+
+    _tracer = Tracer(exporter)
+    # Built on the first get_callbacks call, i.e. when an agent runs, not during startup
+    _callback_handler = None
+    logger.info(f"Tracing configured with exporter: {exporter_name}")
+    return _tracer
+
+
+def get_tracer() -> Tracer:
+    """Get the process-wide tracer, configuring it on first use"""
+    if _tracer is None:
+        configure_tracing()
+    return _tracer
+
+
+def get_callbacks() -> List[Any]:
+    """Get LangChain callbacks that record LLM and tool spans and metrics"""
+    global _callback_handler
+    from monitoring.metrics import get_metrics_callback
+
+    tracer = get_tracer()
+    if _callback_handler is None:
+        _callback_handler = create_callback_handler(tracer)
+    return [_callback_handler, get_metrics_callback()]
@@ -0,0 +1,71 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Any, Iterable, Optional
+
+DEFAULT_PATH = Path(__file__).parent.parent / "data" / "data_version.json"
+
+
+class DataVersionStore:
+    """
+    Monotonic data version shared by the loader and the chat service.
+    The loader bumps the global version (and per-table versions) after each
+    successful load; caches keyed by the version are invalidated implicitly.
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path or DEFAULT_PATH)
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+        self._cached = None
+        self._cached_mtime = None
+
+    def read(self) -> Dict[str, Any]:
+        """Current state ({"version": 0, "tables": {}} before the first load)"""
+        try:
+            mtime = self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return {"version": 0, "tables": {}, "updated_at": None}
+
+        with self.lock:
+            if self._cached is None or mtime != self._cached_mtime:
+                try:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        self._cached = json.load(f)
+                    self._cached_mtime = mtime
+                except (OSError, ValueError) as e:
+                    self.logger.warning(f"Could not read data version from {self.path}: {e}")
+                    return {"version": 0, "tables": {}, "updated_at": None}
+            return self._cached
+
+    def current(self) -> int:
+        return int(self.read().get("version", 0))
+
+    def table_version(self, table_name: str) -> int:
+        return int(self.read().get("tables", {}).get(table_name, 0))
+
+    def bump(self, tables: Iterable[str]) -> int:
+        """Increment the global version and the given tables' versions; returns the new version"""
+        state = dict(self.read())
+        table_versions = dict(state.get("tables", {}))
+        for table_name in tables:
+            table_versions[table_name] = int(table_versions.get(table_name, 0)) + 1
+        state.update(
+            version=int(state.get("version", 0)) + 1,
+            tables=table_versions,
+            updated_at=time.strftime("%Y-%m-%dT%H:%M:%S")
+        )
+
+        # Write atomically so readers never see a partial file
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix=".data_version")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+        self.logger.info(f"Data version bumped to {state['version']} ({', '.join(sorted(tables)) or 'no tables'})")
+        return state["version"]
@@ -1,13 +1,87 @@
 import pandas as pd
 import psycopg2
+from psycopg2 import errors, sql
 from psycopg2.extras import execute_values
 import logging
+import json
+import re
+import time
+from datetime import date
 from pathlib import Path
-from typing import Dict, Set
+from typing import Dict, List, Optional, Set
 import yaml
 import numpy as np
 import os
 
+try:
+    from data_version import DataVersionStore
+    from run_ledger import RunLedger, file_checksum, new_run_id
+    from validation import ValidationEngine, FULL_SCOPE
+except ImportError:
+    from pipeline.data_version import DataVersionStore
+    from pipeline.run_ledger import RunLedger, file_checksum, new_run_id
+    from pipeline.validation import ValidationEngine, FULL_SCOPE
+
+SHADOW_SUFFIX = "__shadow"
+OLD_SUFFIX = "__old"
+
+# Ledger checksum of a table derived in the database rather than loaded from a file
+DERIVED_CHECKSUM = "derived"
+
+# Tables kas_harian is derived from, with the date column that places each row on a day
+KAS_SOURCES = {'penjualan': 'tanggal_transaksi', 'pengeluaran': 'tanggal_pengeluaran'}
+
+# Daily cash book from sales and expenses: one row per business per calendar day from
+# first_day to the later of the last movement and the last day the table covered before
+# the rebuild, with a running balance (window SUM) on top of the balance before first_day
+# (or the configured opening balance). saldo_akhir is a generated column.
+KAS_HARIAN_SQL = """
+INSERT INTO {kas} (kas_id, bisnis_id, tanggal, saldo_awal, total_penjualan, total_pengeluaran)
+WITH daily AS (
+    SELECT bisnis_id, tanggal, SUM(masuk) AS total_penjualan, SUM(keluar) AS total_pengeluaran
+    FROM (
+        SELECT bisnis_id, tanggal_transaksi::date AS tanggal, total AS masuk, 0 AS keluar
+        FROM {penjualan}
+        WHERE %(from_date)s::date IS NULL OR tanggal_transaksi >= %(from_date)s::date
+        UNION ALL
+        SELECT bisnis_id, tanggal_pengeluaran, 0, jumlah
+        FROM {pengeluaran}
+        WHERE %(from_date)s::date IS NULL OR tanggal_pengeluaran >= %(from_date)s::date
+    ) movements
+    GROUP BY bisnis_id, tanggal
+),
+span AS (
+    SELECT COALESCE(%(from_date)s::date, MIN(tanggal)) AS first_day,
+           GREATEST(MAX(tanggal), %(previous_last_day)s::date) AS last_day
+    FROM daily
+),
+opening AS (
+    SELECT b.bisnis_id, COALESCE(
+        (SELECT k.saldo_akhir FROM {kas} k
+         WHERE k.bisnis_id = b.bisnis_id AND k.tanggal < s.first_day
+         ORDER BY k.tanggal DESC LIMIT 1),
+        (%(opening_balances)s::jsonb ->> b.bisnis_id::text)::numeric,
+        0
+    ) AS saldo
+    FROM {bisnis} b CROSS JOIN span s
+),
+ledger AS (
+    SELECT o.bisnis_id, d.day::date AS tanggal,
+           COALESCE(x.total_penjualan, 0) AS total_penjualan,
+           COALESCE(x.total_pengeluaran, 0) AS total_pengeluaran,
+           o.saldo + SUM(COALESCE(x.total_penjualan, 0) - COALESCE(x.total_pengeluaran, 0))
+               OVER (PARTITION BY o.bisnis_id ORDER BY d.day) AS saldo_akhir
+    FROM opening o
+    CROSS JOIN span s
+    CROSS JOIN generate_series(s.first_day, s.last_day, interval '1 day') AS d(day)
+    LEFT JOIN daily x ON x.bisnis_id = o.bisnis_id AND x.tanggal = d.day::date
+)
+SELECT (SELECT COALESCE(MAX(kas_id), 0) FROM {kas}) + ROW_NUMBER() OVER (ORDER BY tanggal, bisnis_id),
+       bisnis_id, tanggal, saldo_akhir - total_penjualan + total_pengeluaran,
+       total_penjualan, total_pengeluaran
+FROM ledger
+"""
+
 class ExcelToPostgreSQL:
     """Excel to PostgreSQL data loader for UMKM data pipeline"""
     
@@ -16,7 +90,24 @@ class ExcelToPostgreSQL:
         self.config = self._load_config()
         self.conn = None
         self.cursor = None
-        self._loaded_penjualan_ids = set()
+        self._parent_keys = {}
+        self.rejected_rows = {}
+        self.load_tallies = {}
+        self._failed_tables = set()
+        self.load_errors = {}
+        self.skipped_tables = []
+        self._partitioned = {}
+        self._known_partitions = set()
+        self._partition_values = {}
+        self._kas_changed_from = None
+        self.data_version = DataVersionStore()
+        self.reload_config = self.config.get('reload', {})
+        self.use_shadow = False
+        self.ledger = None
+        self.run_id = None
+        self.validation_config = self.config.get('validation', {})
+        self.validator = ValidationEngine(
+            db_config, self.config, max_workers=self.validation_config.get('max_workers', 4))
         
         # Setup logging
         self._setup_logging()
@@ -71,6 +162,14 @@ class ExcelToPostgreSQL:
             self.conn = psycopg2.connect(**self.db_config)
             self.cursor = self.conn.cursor()
             self.logger.info(f"Connected to database: {self.db_config['database']}")
+            if self.config.get('ledger', {}).get('enabled', True):
+                try:
+                    ledger = RunLedger(self.conn)
+                    ledger.ensure_table()
+                    self.ledger = ledger
+                except Exception as e:
+                    self.logger.warning(f"Run ledger unavailable, loading without checkpoints: {e}")
+                    self.conn.rollback()
             return True
         except Exception as e:
             self.logger.error(f"Database connection failed: {e}")
@@ -84,22 +183,26 @@ class ExcelToPostgreSQL:
             self.conn.close()
         self.logger.info("Database connection closed")
 
-    def _clear_tables(self) -> bool:
-        """Clear all tables in reverse dependency order"""
+    def _clear_tables(self, tables: Optional[List[str]] = None) -> bool:
+        """Clear all tables (or the given ones) in reverse dependency order (their shadow copies during a shadow reload)"""
         try:
             # Get load order and reverse it for clearing
-            clear_order = list(reversed(self.config['load_order']))
+            clear_order = [t for t in reversed(self.config['load_order']) if tables is None or t in tables]
             
             self.logger.info("Clearing existing data from tables...")
             
             for table_name in clear_order:
                 if table_name in self.config['tables']:
-                    schema = self.config['tables'][table_name]['schema']
-                    self.cursor.execute(f"TRUNCATE TABLE {schema}.{table_name} CASCADE;")
-                    self.logger.info(f"Cleared {schema}.{table_name}")
+                    target = self._qualified(table_name)
+                    self.cursor.execute(f"TRUNCATE TABLE {target} CASCADE;")
+                    self.logger.info(f"Cleared {target}")
             
             self.conn.commit()
             self.logger.info("All tables cleared successfully")
+            
+            # Their ledger entries no longer describe the data
+            for table_name in clear_order:
+                self._ledger_call('record', self.run_id, table_name, 'cleared', target=self._ledger_target())
             return True
         except Exception as e:
             self.logger.error(f"Error clearing tables: {e}")
@@ -107,6 +210,296 @@ class ExcelToPostgreSQL:
                 self.conn.rollback()
             return False
 
+    def _qualified(self, table_name: str) -> str:
+        """Table the loader writes to: the shadow copy during a shadow reload, else the live table"""
+        schema = self.config['tables'][table_name]['schema']
+        suffix = SHADOW_SUFFIX if self.use_shadow else ""
+        return f"{schema}.{table_name}{suffix}"
+
+    def _partition_settings(self, table_name: str) -> Optional[Dict]:
+        """Partitioning settings of a table that is range-partitioned in the database, else None"""
+        if table_name not in self._partitioned:
+            settings = self.config.get('partitioning', {}).get(table_name)
+            is_partitioned = False
+            if settings:
+                schema = self.config['tables'][table_name]['schema']
+                self.cursor.execute(
+                    "SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(%s)", (f"{schema}.{table_name}",))
+                row = self.cursor.fetchone()
+                is_partitioned = bool(row and row[0])
+            self._partitioned[table_name] = settings if is_partitioned else None
+        return self._partitioned[table_name]
+
+    def _load_columns(self, table_name: str) -> List[str]:
+        """Configured columns, plus the partition column when the table carries it only for partitioning"""
+        columns = list(self.config['tables'][table_name]['columns'])
+        partition = self._partition_settings(table_name)
+        if partition and partition['column'] not in columns:
+            columns.append(partition['column'])
+        return columns
+
+    def _ensure_partition(self, table_name: str, month: pd.Timestamp) -> str:
+        """Create the monthly partition holding `month` if needed; returns its qualified name"""
+        schema = self.config['tables'][table_name]['schema']
+        parent = self._qualified(table_name)
+        name = f"{parent.split('.', 1)[1]}_{month:%Y_%m}"
+        if name not in self._known_partitions:
+            end = month + pd.offsets.MonthBegin(1)
+            self.cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {schema}.{name} PARTITION OF {parent} "
+                f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{end:%Y-%m-%d}');"
+            )
+            self._known_partitions.add(name)
+        return f"{schema}.{name}"
+
+    def _load_partition_values(self, table_name: str, keys: Optional[List] = None) -> None:
+        """Read the partition values co-partitioned child tables copy from rows of a table not loaded by this loader"""
+        partition = self._partition_settings(table_name)
+        if not partition:
+            return
+        for settings in self.config.get('partitioning', {}).values():
+            source = (settings or {}).get('copy_from') or {}
+            if source.get('table') == table_name:
+                query = f"SELECT {source['key']}, {partition['column']} FROM {self._qualified(table_name)}"
+                if keys is None:
+                    self.cursor.execute(query)
+                else:
+                    self.cursor.execute(f"{query} WHERE {source['key']} = ANY(%s)", (list(keys),))
+                self._partition_values.setdefault(table_name, {}).update(dict(self.cursor.fetchall()))
+
+    def _create_shadow_tables(self) -> bool:
+        """Create empty <table>__shadow copies (columns, defaults, checks, indexes, grants) of every table"""
+        # Shadow tables kept from an unfinished reload are replaced
+        self._ledger_call('discard_shadow')
+        try:
+            self.logger.info("Creating shadow tables for reload...")
+            for table_name in self.config['load_order']:
+                schema = self.config['tables'][table_name]['schema']
+                shadow = f"{schema}.{table_name}{SHADOW_SUFFIX}"
+                self.cursor.execute(f"DROP TABLE IF EXISTS {shadow} CASCADE;")
+                # LIKE copies a partitioned table as a plain one, so repeat the partitioning
+                partition = self._partition_settings(table_name)
+                partition_clause = f" PARTITION BY RANGE ({partition['column']})" if partition else ""
+                self.cursor.execute(
+                    f"CREATE TABLE {shadow} (LIKE {schema}.{table_name} INCLUDING ALL){partition_clause};")
+                
+                # LIKE does not copy privileges: the read-only chatbot role must keep access after the swap
+                self.cursor.execute("""
+                    SELECT grantee, privilege_type FROM information_schema.role_table_grants
+                    WHERE table_schema = %s AND table_name = %s AND grantee <> current_user
+                """, (schema, table_name))
+                for grantee, privilege in self.cursor.fetchall():
+                    role = sql.SQL("PUBLIC") if grantee == "PUBLIC" else sql.Identifier(grantee)
+                    self.cursor.execute(sql.SQL("GRANT {} ON {} TO {}").format(
+                        sql.SQL(privilege), sql.Identifier(schema, f"{table_name}{SHADOW_SUFFIX}"), role))
+                self.logger.info(f"Created {shadow}")
+            
+            self.conn.commit()
+            return True
+        except Exception as e:
+            self.logger.error(f"Error creating shadow tables: {e}")
+            if self.conn:
+                self.conn.rollback()
+            return False
+
+    def _drop_shadow_tables(self) -> None:
+        """Discard shadow tables after a failed reload (live tables are untouched)"""
+        try:
+            for table_name in reversed(self.config['load_order']):
+                schema = self.config['tables'][table_name]['schema']
+                self.cursor.execute(f"DROP TABLE IF EXISTS {schema}.{table_name}{SHADOW_SUFFIX} CASCADE;")
+            self.conn.commit()
+            self._ledger_call('discard_shadow')
+            self.logger.info("Dropped shadow tables, live data left unchanged")
+        except Exception as e:
+            self.logger.error(f"Error dropping shadow tables: {e}")
+            if self.conn:
+                self.conn.rollback()
+
+    def _copy_live_rows(self, table_name: str) -> int:
+        """Carry a table's current rows into its shadow copy when there is no file to reload it from"""
+        try:
+            schema = self.config['tables'][table_name]['schema']
+            columns_str = ', '.join(self._load_columns(table_name))
+            partition = self._partition_settings(table_name)
+            if partition:
+                self.cursor.execute(
+                    f"SELECT DISTINCT date_trunc('month', {partition['column']}) FROM {schema}.{table_name}")
+                for (month,) in self.cursor.fetchall():
+                    self._ensure_partition(table_name, pd.Timestamp(month))
+            self.cursor.execute(
+                f"INSERT INTO {self._qualified(table_name)} ({columns_str}) "
+                f"SELECT {columns_str} FROM {schema}.{table_name};"
+            )
+            copied = self.cursor.rowcount
+            self.conn.commit()
+            self._record_tally(table_name, copied, None)  # Already validated when first loaded
+            self._load_partition_values(table_name)
+            self.logger.info(f"Kept {copied} existing rows of {schema}.{table_name}")
+            return copied
+        except Exception as e:
+            self.logger.error(f"Failed to copy existing rows of {table_name}: {e}")
+            self._failed_tables.add(table_name)
+            if self.conn:
+                self.conn.rollback()
+            return 0
+
+    def _shadow_tables_exist(self) -> bool:
+        """True when every table has a shadow copy (kept from an unfinished shadow reload)"""
+        for table_name in self.config['load_order']:
+            schema = self.config['tables'][table_name]['schema']
+            self.cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (f"{schema}.{table_name}{SHADOW_SUFFIX}",))
+            if not self.cursor.fetchone()[0]:
+                return False
+        return True
+
+    def _add_shadow_foreign_keys(self) -> bool:
+        """
+        Recreate each live table's foreign keys on its shadow copy (LIKE does not copy them),
+        pointing at the shadow parents. Added after loading, so they are validated once in bulk.
+        Keys already present (a resumed reload whose swap failed before) are left as they are.
+        """
+        load_order = self.config['load_order']
+        try:
+            for table_name in load_order:
+                schema = self.config['tables'][table_name]['schema']
+                self.cursor.execute(
+                    "SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+                    (f"{schema}.{table_name}{SHADOW_SUFFIX}",))
+                existing = {row[0] for row in self.cursor.fetchall()}
+                self.cursor.execute("""
+                    SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+                    WHERE conrelid = %s::regclass AND contype = 'f'
+                """, (f"{schema}.{table_name}",))
+                for name, definition in self.cursor.fetchall():
+                    if name in existing:
+                        continue
+                    definition = re.sub(
+                        r"REFERENCES\s+(?:(\w+)\.)?(\w+)\(",
+                        lambda m: (f"REFERENCES {m.group(1) or schema}.{m.group(2)}{SHADOW_SUFFIX}("
+                                   if m.group(2) in load_order else m.group(0)),
+                        definition
+                    )
+                    self.cursor.execute(
+                        f"ALTER TABLE {schema}.{table_name}{SHADOW_SUFFIX} ADD CONSTRAINT {name} {definition};")
+            self.conn.commit()
+            self.logger.info("Foreign keys validated on shadow tables")
+            return True
+        except Exception as e:
+            self.logger.error(f"Foreign key validation failed on shadow tables: {e}")
+            if self.conn:
+                self.conn.rollback()
+            return False
+
+    def _table_indexes(self, schema: str, table_name: str) -> Dict[tuple, str]:
+        """Index name by (unique, definition without name/table), used to pair live and shadow indexes"""
+        self.cursor.execute(
+            "SELECT indexname, indexdef FROM pg_indexes WHERE schemaname = %s AND tablename = %s",
+            (schema, table_name))
+        indexes = {}
+        for name, definition in self.cursor.fetchall():
+            head, _, method = definition.partition(" USING ")
+            indexes[(head.startswith("CREATE UNIQUE"), method)] = name
+        return indexes
+
+    def _swap_table(self, schema: str, table_name: str) -> None:
+        """Swap one shadow table in for the live one (inside the caller's transaction)"""
+        live, shadow, old = table_name, f"{table_name}{SHADOW_SUFFIX}", f"{table_name}{OLD_SUFFIX}"
+        live_indexes = self._table_indexes(schema, live)
+        shadow_indexes = self._table_indexes(schema, shadow)
+        
+        if self._partition_settings(table_name):
+            # Monthly partitions are named after their parent: <table>_YYYY_MM
+            self.cursor.execute("""
+                SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = %s::regclass
+            """, (f"{schema}.{live}",))
+            for (name,) in self.cursor.fetchall():
+                self.cursor.execute(f"ALTER TABLE {schema}.{name} RENAME TO {name[:63 - len(OLD_SUFFIX)]}{OLD_SUFFIX};")
+            self.cursor.execute("""
+                SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = %s::regclass
+            """, (f"{schema}.{shadow}",))
+            for (name,) in self.cursor.fetchall():
+                self.cursor.execute(f"ALTER TABLE {schema}.{name} RENAME TO {live}{name[len(shadow):]};")
+        
+        self.cursor.execute(f"ALTER TABLE {schema}.{live} RENAME TO {old};")
+        self.cursor.execute(f"ALTER TABLE {schema}.{shadow} RENAME TO {live};")
+        
+        # Give the new table the original index (and so PK/unique constraint) names, so the next
+        # reload's shadow indexes do not collide with them
+        for key, name in live_indexes.items():
+            self.cursor.execute(f"ALTER INDEX {schema}.{name} RENAME TO {name[:63 - len(OLD_SUFFIX)]}{OLD_SUFFIX};")
+            if key in shadow_indexes:
+                self.cursor.execute(f"ALTER INDEX {schema}.{shadow_indexes[key]} RENAME TO {name};")
+        
+        # SERIAL sequences are owned by the old table and shared through the column default:
+        # hand them to the new table so dropping the old one keeps them
+        self.cursor.execute("""
+            SELECT attname, pg_get_serial_sequence(%s, attname) FROM pg_attribute
+            WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped
+        """, (f"{schema}.{old}", f"{schema}.{old}"))
+        for column, sequence in self.cursor.fetchall():
+            if sequence:
+                self.cursor.execute(f"ALTER SEQUENCE {sequence} OWNED BY {schema}.{live}.{column};")
+
+    def _dependent_views(self, tables: List[tuple]) -> List[tuple]:
+        """(schema, name, definition) of the views reading the given (schema, table)s, oldest first"""
+        self.cursor.execute("""
+            SELECT DISTINCT v.oid, n.nspname, v.relname, pg_get_viewdef(v.oid)
+            FROM pg_depend d
+            JOIN pg_rewrite r ON r.oid = d.objid
+            JOIN pg_class v ON v.oid = r.ev_class
+            JOIN pg_namespace n ON n.oid = v.relnamespace
+            WHERE d.classid = 'pg_rewrite'::regclass AND d.refclassid = 'pg_class'::regclass
+              AND d.refobjid = ANY(%s::regclass[]) AND v.relkind = 'v'
+            ORDER BY v.oid
+        """, ([f"{schema}.{table_name}" for schema, table_name in tables],))
+        return [(schema, name, definition) for _, schema, name, definition in self.cursor.fetchall()]
+
+    def _swap_shadow_tables(self) -> bool:
+        """
+        Atomically replace every live table with its loaded shadow copy in one short transaction.
+        A lock_timeout keeps the swap from queueing readers behind it while a long query runs;
+        the swap is retried instead. Views on the tables follow the renamed old tables, so they
+        are redefined against the new ones; any other object still depending on an old table
+        (e.g. a materialized view) makes the swap fail rather than being dropped with it.
+        """
+        load_order = self.config['load_order']
+        lock_timeout_ms = int(self.reload_config.get('lock_timeout_ms', 5000))
+        retries = int(self.reload_config.get('swap_retries', 5))
+        
+        for attempt in range(1, retries + 1):
+            try:
+                self.cursor.execute(f"SET LOCAL lock_timeout = {lock_timeout_ms};")
+                # Definitions are read before the renames, while they still name the live tables
+                views = self._dependent_views(
+                    [(self.config['tables'][table_name]['schema'], table_name) for table_name in load_order])
+                for table_name in load_order:
+                    self._swap_table(self.config['tables'][table_name]['schema'], table_name)
+                for schema, name, definition in views:
+                    self.cursor.execute(sql.SQL("CREATE OR REPLACE VIEW {} AS ").format(
+                        sql.Identifier(schema, name)).as_string(self.conn) + definition)
+                if views:
+                    self.logger.info(f"Recreated {len(views)} views on the reloaded tables")
+                for table_name in reversed(load_order):
+                    schema = self.config['tables'][table_name]['schema']
+                    self.cursor.execute(f"DROP TABLE {schema}.{table_name}{OLD_SUFFIX};")
+                self.conn.commit()
+                self.logger.info(f"Swapped {len(load_order)} reloaded tables into place")
+                return True
+            except errors.LockNotAvailable:
+                self.conn.rollback()
+                self.logger.warning(f"Tables busy, swap attempt {attempt}/{retries} timed out waiting for locks")
+                time.sleep(attempt)
+            except Exception as e:
+                self.logger.error(f"Error swapping shadow tables: {e}")
+                self.conn.rollback()
+                return False
+        
+        self.logger.error("Could not acquire locks to swap shadow tables")
+        return False
+
     def _convert_value(self, value):
         """Convert pandas/numpy types to PostgreSQL compatible types"""
         if pd.isna(value):
@@ -160,8 +553,15 @@ class ExcelToPostgreSQL:
             
         return True
 
-    def _handle_penjualan_duplicates(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Handle duplicate transaction numbers in penjualan data"""
+    def _handle_penjualan_duplicates(self, df: pd.DataFrame, only_batch: bool = False) -> pd.DataFrame:
+        """
+        Handle duplicate transaction numbers in penjualan data
+
+        Args:
+            df (pd.DataFrame): penjualan rows
+            only_batch (bool): Look up only this batch's transaction numbers in the database
+                instead of reading them all (incremental loads into a filled table)
+        """
         self.logger.info("Checking for duplicate transaction numbers...")
         
         # Remove internal duplicates first
@@ -174,7 +574,12 @@ class ExcelToPostgreSQL:
         
         # Check against existing data in database
         try:
-            self.cursor.execute("SELECT nomor_transaksi FROM umkm.penjualan")
+            if only_batch:
+                self.cursor.execute(
+                    f"SELECT nomor_transaksi FROM {self._qualified('penjualan')} WHERE nomor_transaksi = ANY(%s)",
+                    ([self._convert_value(v) for v in df['nomor_transaksi'].dropna().unique()],))
+            else:
+                self.cursor.execute(f"SELECT nomor_transaksi FROM {self._qualified('penjualan')}")
             existing_transactions = {row[0] for row in self.cursor.fetchall()}
             
             if existing_transactions:
@@ -190,24 +595,100 @@ class ExcelToPostgreSQL:
         self.logger.info(f"Final penjualan records to load: {len(df)}")
         return df
 
+    def _get_parent_keys(self, parent_table: str, parent_column: str) -> Set:
+        """Key set of a parent column, read from the database once and kept up to date by load_file"""
+        cache_key = (parent_table, parent_column)
+        if cache_key not in self._parent_keys:
+            self.cursor.execute(f"SELECT DISTINCT {parent_column} FROM {self._qualified(parent_table)}")
+            self._parent_keys[cache_key] = {row[0] for row in self.cursor.fetchall()}
+            self.logger.info(f"Cached {len(self._parent_keys[cache_key])} keys of {parent_table}.{parent_column}")
+        return self._parent_keys[cache_key]
+
+    def _remember_parent_keys(self, df: pd.DataFrame, table_name: str) -> None:
+        """Add freshly loaded keys to the cached key sets of this table"""
+        for (parent_table, parent_column), keys in self._parent_keys.items():
+            if parent_table == table_name and parent_column in df.columns:
+                keys.update(df[parent_column].dropna().tolist())
+
+    def _write_reject_report(self, rejects: pd.DataFrame, table_name: str) -> None:
+        """Save rejected rows with the reason, so they can be fixed and reloaded"""
+        reject_dir = Path(self.config['paths'].get('reject_directory', 'logs/rejects'))
+        reject_dir.mkdir(parents=True, exist_ok=True)
+        report_path = reject_dir / f"{table_name}_{time.strftime('%Y%m%d_%H%M%S')}.csv"
+        rejects.to_csv(report_path, index=False)
+        self.logger.warning(f"Rejected {len(rejects)} {table_name} rows, see {report_path}")
+
     def _validate_foreign_keys(self, df: pd.DataFrame, table_name: str) -> pd.DataFrame:
-        """Validate foreign key references"""
-        if table_name == 'detail_penjualan':
-            if not self._loaded_penjualan_ids:
-                self.logger.error("No penjualan IDs available for detail validation")
-                return pd.DataFrame(columns=df.columns)
-            
-            initial_count = len(df)
-            df = df[df['penjualan_id'].isin(self._loaded_penjualan_ids)]
-            
-            if len(df) < initial_count:
-                invalid = initial_count - len(df)
-                self.logger.warning(f"Filtered out {invalid} detail records with invalid penjualan_id references")
+        """
+        Drop rows whose foreign keys (config foreign_keys) have no parent row, before the insert.
+        Orphans go to a reject report instead of failing the whole table's batch in PostgreSQL.
+        """
+        references = self.config.get('foreign_keys', {}).get(table_name) or {}
+        valid = pd.Series(True, index=df.index)
+        reasons = pd.Series("", index=df.index)
+        
+        for column, reference in references.items():
+            if column not in df.columns:
+                continue
+            parent_table, parent_column = reference.split('.')
+            keys = self._get_parent_keys(parent_table, parent_column)
+            # NULLs are not orphans; NOT NULL is the required-column check's job
+            orphan = df[column].notna() & ~df[column].isin(keys)
+            if orphan.any():
+                # Parents loaded since the cache was filled (e.g. by another loader) are not orphans
+                self.cursor.execute(
+                    f"SELECT {parent_column} FROM {self._qualified(parent_table)} WHERE {parent_column} = ANY(%s)",
+                    ([self._convert_value(v) for v in df.loc[orphan, column].unique()],))
+                keys.update(row[0] for row in self.cursor.fetchall())
+                orphan = df[column].notna() & ~df[column].isin(keys)
+            if orphan.any():
+                self.logger.warning(
+                    f"Found {int(orphan.sum())} {table_name} records with invalid {column} references")
+                reasons[orphan] = reasons[orphan] + f"{column} not in {reference}; "
+                valid &= ~orphan
+        
+        if not valid.all():
+            rejects = df[~valid].copy()
+            rejects['reject_reason'] = reasons[~valid].str.rstrip('; ')
+            self.rejected_rows[table_name] = self.rejected_rows.get(table_name, 0) + len(rejects)
+            try:
+                self._write_reject_report(rejects, table_name)
+            except Exception as e:
+                self.logger.warning(f"Could not write reject report for {table_name}: {e}")
+            df = df[valid]
         
         return df
 
-    def load_file(self, file_path: Path, table_name: str) -> int:
-        """Load single Excel file to PostgreSQL table"""
+    def reset_caches(self) -> None:
+        """Forget cached key sets and partition values (after a failed load or a reload by someone else)"""
+        self._parent_keys = {}
+        self._partition_values = {}
+        self._known_partitions.clear()
+
+    def _new_rows(self, df: pd.DataFrame, table_name: str) -> pd.DataFrame:
+        """Rows whose primary key is not in the table yet (incremental loads)"""
+        key = self.config['tables'][table_name]['columns'][0]
+        if key not in df.columns:
+            return df
+        # Look up only this batch's keys instead of reading every key of the table
+        self.cursor.execute(
+            f"SELECT {key} FROM {self._qualified(table_name)} WHERE {key} = ANY(%s)",
+            ([self._convert_value(v) for v in df[key].dropna().unique()],))
+        existing = df[key].isin({row[0] for row in self.cursor.fetchall()})
+        if existing.any():
+            self.logger.info(f"Skipping {int(existing.sum())} {table_name} rows already loaded")
+        return df[~existing]
+
+    def load_file(self, file_path: Path, table_name: str, incremental: bool = False) -> int:
+        """
+        Load single Excel file to PostgreSQL table
+
+        Args:
+            file_path (Path): Excel file
+            table_name (str): Target table
+            incremental (bool): Insert only rows whose primary key is new, into a table that
+                already holds the earlier rows (instead of a freshly cleared one)
+        """
         if table_name not in self.config['tables']:
             self.logger.error(f"No configuration for table {table_name}")
             return 0
@@ -228,9 +709,17 @@ class ExcelToPostgreSQL:
             if not self._validate_data(df, table_name):
                 return 0
 
+            # Incremental loads first drop the rows already loaded, so only the new ones are
+            # checked for duplicate transaction numbers
+            if incremental:
+                df = self._new_rows(df, table_name)
+                if df.empty:
+                    self.logger.info(f"No new {table_name} rows in {file_path.name}")
+                    return 0
+            
             # Special handling for penjualan duplicates
             if table_name == 'penjualan':
-                df = self._handle_penjualan_duplicates(df)
+                df = self._handle_penjualan_duplicates(df, only_batch=incremental)
             
             # Validate foreign keys
             df = self._validate_foreign_keys(df, table_name)
@@ -239,10 +728,23 @@ class ExcelToPostgreSQL:
                 self.logger.warning(f"No valid records to load for {table_name} after validation")
                 return 0
 
+            # Co-partitioned child tables take the partition column from their parent rows
+            partition = self._partition_settings(table_name)
+            if partition and partition.get('copy_from') and partition['column'] not in df.columns:
+                source = partition['copy_from']
+                known = self._partition_values.setdefault(source['table'], {})
+                missing = set(df[source['key']].dropna()) - known.keys()
+                if missing:
+                    # Parent rows this loader did not load itself (earlier runs, other loaders)
+                    self._load_partition_values(source['table'], [self._convert_value(k) for k in missing])
+                df[partition['column']] = df[source['key']].map(known)
+                unmatched = df[partition['column']].isna().sum()
+                if unmatched:
+                    self.logger.warning(f"Dropped {unmatched} {table_name} rows without a {source['table']} date")
+                    df = df[df[partition['column']].notna()]
+            
             # Prepare for database insert
-            table_config = self.config['tables'][table_name]
-            schema = table_config['schema']
-            columns = table_config['columns']
+            columns = self._load_columns(table_name)
             
             # Filter to only configured columns that exist in the data
             available_columns = [col for col in columns if col in df.columns]
@@ -250,114 +752,418 @@ class ExcelToPostgreSQL:
                 missing = set(columns) - set(available_columns)
                 self.logger.warning(f"Missing columns in {table_name} data: {missing}")
             
-            # Convert values to PostgreSQL-compatible types
-            records = []
-            for _, row in df[available_columns].iterrows():
-                record = tuple(self._convert_value(val) for val in row.values)
-                records.append(record)
-            
-            # Insert into database
-            columns_str = ', '.join(available_columns)
-            sql = f"INSERT INTO {schema}.{table_name} ({columns_str}) VALUES %s"
+            target = self._qualified(table_name)
+            if partition:
+                # Load partition by partition, creating monthly partitions on demand; inserting
+                # into the partition directly skips per-row routing through the parent
+                months = pd.to_datetime(df[partition['column']]).dt.to_period('M').dt.to_timestamp()
+                loaded_count = 0
+                for month, month_df in df.groupby(months):
+                    partition_table = self._ensure_partition(table_name, month)
+                    loaded_count += self._insert_records(partition_table, available_columns, month_df)
+                self.logger.info(f"Loaded {table_name} into {months.nunique()} monthly partitions")
+            else:
+                loaded_count = self._insert_records(target, available_columns, df)
             
-            execute_values(self.cursor, sql, records, page_size=1000)
+            # Check just this batch (its key range) inside the transaction, before it becomes visible
+            scope = self._batch_scope(table_name, df)
+            if self.validation_config.get('per_batch', True) and not self.validator.validate(
+                    {table_name: scope}, cursor=self.cursor, qualify=self._qualified):
+                raise ValueError(f"Batch validation failed for {table_name}")
             self.conn.commit()
+            self._record_tally(table_name, loaded_count, scope)
             
-            loaded_count = len(records)
-            self.logger.info(f"Successfully loaded {loaded_count} rows to {schema}.{table_name}")
+            self.logger.info(f"Successfully loaded {loaded_count} rows to {target}")
             
-            # Store penjualan IDs for foreign key validation
-            if table_name == 'penjualan':
-                self._loaded_penjualan_ids.update(df['penjualan_id'].tolist())
-                self.logger.info(f"Stored {len(self._loaded_penjualan_ids)} penjualan IDs for FK validation")
+            # Keep parent key sets current for the child tables loaded next
+            self._remember_parent_keys(df, table_name)
+            
+            # Cash balances from the earliest loaded day onwards are now stale
+            if table_name in KAS_SOURCES and KAS_SOURCES[table_name] in df.columns:
+                earliest = pd.to_datetime(df[KAS_SOURCES[table_name]]).min().date()
+                if self._kas_changed_from is None or earliest < self._kas_changed_from:
+                    self._kas_changed_from = earliest
+            
+            # Remember partition values that co-partitioned child tables copy
+            for settings in self.config.get('partitioning', {}).values():
+                source = (settings or {}).get('copy_from') or {}
+                if source.get('table') == table_name and partition:
+                    values = df.set_index(source['key'])[partition['column']]
+                    self._partition_values.setdefault(table_name, {}).update(values.to_dict())
             
             return loaded_count
             
         except Exception as e:
             self.logger.error(f"Failed to load {table_name} from {file_path.name}: {e}")
+            self._failed_tables.add(table_name)
+            self.load_errors[table_name] = str(e)
+            # Keys and partitions read inside the rolled-back transaction may not exist
+            self.reset_caches()
             if self.conn:
                 self.conn.rollback()
             return 0
 
-    def process_all_files(self, data_dir: Path) -> int:
-        """Process all Excel files in configured dependency order"""
+    def _derives_kas_harian(self) -> bool:
+        return bool(self.config.get('derived', {}).get('kas_harian', {}).get('enabled', False))
+
+    def derive_kas_harian(self, from_date: Optional[date] = None) -> int:
+        """
+        Recompute kas_harian in the database from penjualan and pengeluaran
+
+        Args:
+            from_date (date): Earliest changed day; rows from this day on are rebuilt on top of
+                the balance of the day before. None rebuilds the whole table from the configured
+                opening balances.
+
+        Returns:
+            int: Number of daily cash rows written (-1 on failure)
+        """
+        settings = self.config.get('derived', {}).get('kas_harian', {})
+        kas = self._qualified('kas_harian')
+        try:
+            start = time.perf_counter()
+            previous_last_day = None
+            if from_date is None:
+                self.cursor.execute(f"DELETE FROM {kas};")
+            else:
+                # Days deleted below are rebuilt even when no movement falls on or after from_date
+                self.cursor.execute(f"SELECT MAX(tanggal) FROM {kas};")
+                previous_last_day = self.cursor.fetchone()[0]
+                self.cursor.execute(f"DELETE FROM {kas} WHERE tanggal >= %s;", (from_date,))
+            
+            opening_balances = {str(k): v for k, v in (settings.get('opening_balances') or {}).items()}
+            self.cursor.execute(
+                KAS_HARIAN_SQL.format(
+                    kas=kas,
+                    penjualan=self._qualified('penjualan'),
+                    pengeluaran=self._qualified('pengeluaran'),
+                    bisnis=self._qualified('bisnis')
+                ),
+                {"from_date": from_date, "previous_last_day": previous_last_day,
+                 "opening_balances": json.dumps(opening_balances)}
+            )
+            derived = self.cursor.rowcount
+            self._advance_kas_sequence(kas)
+            self.conn.commit()
+            self._record_tally('kas_harian', derived,
+                               FULL_SCOPE if from_date is None else ("tanggal >= %s", [from_date]))
+            
+            scope = f"from {from_date}" if from_date else "full rebuild"
+            self.logger.info(f"Derived {derived} kas_harian rows ({scope}) in {time.perf_counter() - start:.2f}s")
+            self._kas_changed_from = None
+            return derived
+        except Exception as e:
+            self.logger.error(f"Failed to derive kas_harian: {e}")
+            self._failed_tables.add('kas_harian')
+            self.load_errors['kas_harian'] = str(e)
+            if self.conn:
+                self.conn.rollback()
+            return -1
+
+    def _advance_kas_sequence(self, kas: str) -> None:
+        """Move the kas_id SERIAL sequence past the ids assigned by KAS_HARIAN_SQL (MAX + ROW_NUMBER)"""
+        # The sequence is owned by the live table; a shadow copy only shares it through the default
+        schema = self.config['tables']['kas_harian']['schema']
+        self.cursor.execute(f"""
+            SELECT setval(seq, COALESCE((SELECT MAX(kas_id) FROM {kas}), 1), (SELECT MAX(kas_id) FROM {kas}) IS NOT NULL)
+            FROM pg_get_serial_sequence(%s, 'kas_id') AS seq
+            WHERE seq IS NOT NULL
+        """, (f"{schema}.kas_harian",))
+
+    def _derive_kas_recorded(self, from_date: Optional[date] = None) -> int:
+        """derive_kas_harian with its outcome written to the run ledger"""
+        entry_id = self._ledger_call('start', self.run_id, 'kas_harian', None, DERIVED_CHECKSUM,
+                                     target=self._ledger_target())
+        derived = self.derive_kas_harian(from_date)
+        if entry_id is not None:
+            self._ledger_call('finish', entry_id, 'failed' if derived < 0 else 'loaded', max(derived, 0),
+                              None, self.load_errors.get('kas_harian'))
+        return derived
+
+    def take_kas_changes(self) -> Optional[date]:
+        """Earliest day whose cash balance went stale through this loader's loads since the last call"""
+        from_date, self._kas_changed_from = self._kas_changed_from, None
+        return from_date
+
+    def load_incremental(self, file_path: Path, table_name: str, force: bool = False) -> int:
+        """
+        Load the new rows of a new or changed file into the live table (watch-folder ingestion)
+
+        Args:
+            file_path (Path): Excel file
+            table_name (str): Target table
+            force (bool): Load even if the run ledger shows this exact file was loaded already
+
+        Returns:
+            int: Rows loaded (0 when nothing was new), -1 on failure
+        """
+        if not self.run_id:
+            self.run_id = new_run_id()
+        checksum = file_checksum(file_path)
+        if not force and self._ledger_call('is_current', table_name, checksum):
+            self.logger.info(f"{file_path.name} unchanged since it was loaded, skipping")
+            return 0
+        
+        self._failed_tables.discard(table_name)
+        self.load_errors.pop(table_name, None)
+        rejected_before = self.rejected_rows.get(table_name, 0)
+        entry_id = self._ledger_call('start', self.run_id, table_name, file_path.name, checksum)
+        count = self.load_file(file_path, table_name, incremental=True)
+        failed = table_name in self._failed_tables
+        if entry_id is not None:
+            self._ledger_call('finish', entry_id, 'failed' if failed else 'loaded', count,
+                              self.rejected_rows.get(table_name, 0) - rejected_before,
+                              self.load_errors.get(table_name))
+        return -1 if failed else count
+
+    def derive_incremental(self, from_date: Optional[date]) -> int:
+        """Re-derive kas_harian in the live table from from_date (None: full rebuild); -1 on failure"""
+        if not self.run_id:
+            self.run_id = new_run_id()
+        self._failed_tables.discard('kas_harian')
+        self.load_errors.pop('kas_harian', None)
+        return self._derive_kas_recorded(from_date)
+
+    def _batch_scope(self, table_name: str, df: pd.DataFrame):
+        """Validation scope of a loaded batch: its primary key range (plus partition range, for pruning)"""
+        key = self.config['tables'][table_name]['columns'][0]
+        if key not in df.columns or df[key].isna().all():
+            return FULL_SCOPE
+        predicate = f"{key} BETWEEN %s AND %s"
+        params = [self._convert_value(df[key].min()), self._convert_value(df[key].max())]
+        partition = self._partition_settings(table_name)
+        if partition and partition['column'] in df.columns:
+            dates = pd.to_datetime(df[partition['column']])
+            predicate += f" AND {partition['column']} BETWEEN %s AND %s"
+            params += [dates.min().to_pydatetime(), dates.max().to_pydatetime()]
+        return predicate, params
+
+    def _record_tally(self, table_name: str, rows: int, scope) -> None:
+        """Accumulate rows loaded per table and the union of their validation scopes"""
+        tally = self.load_tallies.setdefault(table_name, {"rows": 0, "scope": None})
+        tally["rows"] += rows
+        if scope is None:
+            return
+        if tally["scope"] is None:
+            tally["scope"] = scope
+        elif tally["scope"] != scope:
+            if tally["scope"][0] == scope[0] and scope[0].count("BETWEEN") == 1:
+                # Same key column: widen the range to cover both batches
+                low = min(tally["scope"][1][0], scope[1][0])
+                high = max(tally["scope"][1][1], scope[1][1])
+                tally["scope"] = (scope[0], [low, high])
+            else:
+                tally["scope"] = FULL_SCOPE
+
+    def _insert_records(self, target: str, columns: List[str], df: pd.DataFrame) -> int:
+        """Insert DataFrame rows into a table (not committed); returns the row count"""
+        # Convert values to PostgreSQL-compatible types
+        records = []
+        for _, row in df[columns].iterrows():
+            record = tuple(self._convert_value(val) for val in row.values)
+            records.append(record)
+        
+        columns_str = ', '.join(columns)
+        insert_sql = f"INSERT INTO {target} ({columns_str}) VALUES %s"
+        execute_values(self.cursor, insert_sql, records, page_size=1000)
+        return len(records)
+
+    def _ledger_target(self) -> str:
+        """Which copy of the tables the loader's ledger entries describe"""
+        return 'shadow' if self.use_shadow else 'live'
+
+    def _ledger_call(self, method: str, *args, **kwargs):
+        """Write to the run ledger; a ledger failure is logged and never fails the load"""
+        if not self.ledger:
+            return None
+        try:
+            return getattr(self.ledger, method)(*args, **kwargs)
+        except Exception as e:
+            self.logger.warning(f"Run ledger {method} failed: {e}")
+            self.conn.rollback()
+            return None
+
+    def _source_file(self, table_name: str) -> Optional[str]:
+        """File name mapped to a table in file_mappings"""
+        for file_key, table_key in self.config['file_mappings'].items():
+            if table_key == table_name:
+                return file_key
+        return None
+
+    def _source_checksum(self, data_dir: Path, table_name: str) -> Optional[str]:
+        """Ledger checksum of what a table would be loaded from (None when there is no file)"""
+        if table_name == 'kas_harian' and self._derives_kas_harian():
+            return DERIVED_CHECKSUM
+        filename = self._source_file(table_name)
+        if filename and (data_dir / filename).exists():
+            return file_checksum(data_dir / filename)
+        return None
+
+    def _resume_plan(self, data_dir: Path, target: str) -> List[str]:
+        """
+        Tables a resumed run must reload: everything from the first table (in load order)
+        whose live data (or shadow copy, for target 'shadow') was not loaded from an identical
+        file. TRUNCATE ... CASCADE on that table clears its dependents, so the tables after it
+        are reloaded too; derived kas_harian is current only if it and everything before it is.
+        """
+        load_order = self.config['load_order']
+        for index, table_name in enumerate(load_order):
+            if not self.ledger.is_current(table_name, self._source_checksum(data_dir, table_name), target):
+                return load_order[index:]
+        return []
+
+    def process_all_files(self, data_dir: Path, resume: bool = False) -> int:
+        """
+        Process all Excel files in configured dependency order
+
+        Args:
+            data_dir (Path): Directory with the Excel files
+            resume (bool): Skip the leading tables the run ledger shows were loaded from identical
+                files and reload the rest: into the shadow tables kept by an unfinished shadow
+                reload (then swap them in), otherwise in place
+
+        Returns:
+            int: Number of records loaded
+        """
         if not data_dir.exists():
             self.logger.error(f"Data directory not found: {data_dir}")
             return 0
         
         self.logger.info(f"Starting data loading from: {data_dir}")
+        self.run_id = new_run_id()
+        self._failed_tables = set()
+        self.load_errors = {}
+        self.skipped_tables = []
+        self._partitioned = {}
+        self._known_partitions = set()
+        self.reset_caches()
+        self.rejected_rows = {}
+        self.load_tallies = {}
         
-        # Clear tables first
-        if not self._clear_tables():
-            self.logger.error("Failed to clear tables, aborting load")
-            return 0
+        load_order = self.config['load_order']
+        if resume and not self.ledger:
+            self.logger.warning("Run ledger unavailable, cannot resume: reloading everything")
+            resume = False
+        
+        if resume:
+            # A failed shadow reload keeps its shadow tables: finish that reload and swap it in.
+            # Otherwise the skipped tables are already live and the rest is reloaded in place.
+            self.use_shadow = bool(self.ledger.has_shadow_entries()) and self._shadow_tables_exist()
+            reload_tables = self._resume_plan(data_dir, self._ledger_target())
+            self.skipped_tables = [t for t in load_order if t not in reload_tables]
+            for table_name in self.skipped_tables:
+                self.logger.info(f"Skipping {table_name}: already loaded from an identical file")
+                self._ledger_call('record', self.run_id, table_name, 'skipped', target=self._ledger_target())
+            if not reload_tables and not self.use_shadow:
+                self.logger.info("All tables are up to date, nothing to resume")
+                return 0
+            self.logger.info(f"Resuming into {'shadow' if self.use_shadow else 'live'} tables (run {self.run_id}): "
+                             f"reloading {', '.join(reload_tables) or 'nothing'}")
+            if reload_tables and not self._clear_tables(reload_tables):
+                self.logger.error("Failed to clear tables, aborting load")
+                self.use_shadow = False
+                return 0
+        else:
+            reload_tables = load_order
+            # shadow: load into copies and swap them in at the end, so readers never see empty tables
+            # or wait on TRUNCATE locks; truncate: clear the live tables first and load in place
+            strategy = self.reload_config.get('strategy', 'shadow')
+            self.use_shadow = strategy == 'shadow'
+            if self.use_shadow:
+                if not self._create_shadow_tables():
+                    self.logger.error("Failed to create shadow tables, aborting load")
+                    return 0
+            elif not self._clear_tables():
+                self.logger.error("Failed to clear tables, aborting load")
+                return 0
         
         total_records = 0
-        load_order = self.config['load_order']
         
         # Load files in dependency order
-        for table_name in load_order:
+        for table_name in reload_tables:
+            if table_name == 'kas_harian' and self._derives_kas_harian():
+                continue  # Derived from penjualan and pengeluaran below, not loaded from a file
+            
             # Find matching file
-            filename = None
-            for file_key, table_key in self.config['file_mappings'].items():
-                if table_key == table_name:
-                    filename = file_key
-                    break
+            filename = self._source_file(table_name)
             
             if filename:
                 file_path = data_dir / filename
                 if file_path.exists():
                     self.logger.info(f"Processing {filename} -> {table_name}")
+                    entry_id = self._ledger_call('start', self.run_id, table_name, filename,
+                                                 file_checksum(file_path), target=self._ledger_target())
                     count = self.load_file(file_path, table_name)
                     total_records += count
+                    if entry_id is not None:
+                        failed = table_name in self._failed_tables
+                        self._ledger_call('finish', entry_id, 'failed' if failed else 'loaded', count,
+                                          self.rejected_rows.get(table_name, 0), self.load_errors.get(table_name))
                 else:
                     self.logger.warning(f"File not found: {filename}")
+                    if self.use_shadow:
+                        self._copy_live_rows(table_name)
             else:
                 self.logger.warning(f"No file mapping found for table: {table_name}")
+                if self.use_shadow:
+                    self._copy_live_rows(table_name)
+        
+        if self._derives_kas_harian() and 'kas_harian' in reload_tables:
+            derived = self._derive_kas_recorded()
+            if derived > 0:
+                total_records += derived
+        
+        swapped_in = False
+        if self.use_shadow:
+            # Only a complete, consistent reload replaces the live data. After a failed load or
+            # swap the shadow tables are kept, so --resume redoes only the failed work
+            self.use_shadow = False
+            if self._failed_tables:
+                self.logger.error(f"Reload failed for {', '.join(sorted(self._failed_tables))}, keeping current data "
+                                  f"(shadow tables kept for --resume)")
+                return 0
+            if not self._add_shadow_foreign_keys():
+                self._drop_shadow_tables()
+                return 0
+            if not self._swap_shadow_tables():
+                self.logger.error("Keeping current data (shadow tables kept for --resume)")
+                return 0
+            self._ledger_call('promote_shadow')
+            swapped_in = True
         
         self.logger.info(f"Data loading completed. Total records loaded: {total_records}")
+        
+        # The reloaded tables changed (all of them, when shadow tables were swapped in), so
+        # cached answers about them are stale
+        try:
+            self.data_version.bump(load_order if swapped_in else reload_tables)
+        except Exception as e:
+            self.logger.warning(f"Could not update data version: {e}")
         return total_records
 
     def validate_loaded_data(self) -> bool:
-        """Validate that data was loaded correctly"""
+        """
+        Validate the data loaded in this run: row counts come from the loader's tallies
+        (planner estimates for tables not loaded), and integrity checks scoped to the
+        loaded rows run in parallel on separate connections
+        """
         try:
             self.logger.info("=== Data Validation ===")
             
-            validation_queries = [
-                ("Businesses", "SELECT COUNT(*) FROM umkm.bisnis"),
-                ("Products", "SELECT COUNT(*) FROM umkm.produk"),
-                ("Sales Transactions", "SELECT COUNT(*) FROM umkm.penjualan"),
-                ("Sales Details", "SELECT COUNT(*) FROM umkm.detail_penjualan"),
-                ("Expenses", "SELECT COUNT(*) FROM umkm.pengeluaran"),
-                ("Daily Cash Records", "SELECT COUNT(*) FROM umkm.kas_harian"),
-            ]
-            
-            for name, query in validation_queries:
-                self.cursor.execute(query)
-                count = self.cursor.fetchone()[0]
-                self.logger.info(f"{name}: {count} records")
-            
-            # Check referential integrity
-            self.cursor.execute("""
-                SELECT COUNT(*) FROM umkm.detail_penjualan dp
-                LEFT JOIN umkm.penjualan p ON dp.penjualan_id = p.penjualan_id
-                WHERE p.penjualan_id IS NULL
-            """)
-            orphaned = self.cursor.fetchone()[0]
-            
-            if orphaned > 0:
-                self.logger.error(f"Found {orphaned} orphaned detail records!")
-                return False
-            
-            # Check for negative balances (business logic validation)
-            self.cursor.execute("""
-                SELECT COUNT(*) FROM umkm.kas_harian 
-                WHERE saldo_akhir < 0
-            """)
-            negative_balances = self.cursor.fetchone()[0]
+            load_order = self.config['load_order']
+            untallied = [t for t in load_order if t not in self.load_tallies]
+            estimates = self.validator.estimated_row_counts(self.cursor, untallied) if untallied else {}
+            for table_name in load_order:
+                if table_name in self.load_tallies:
+                    self.logger.info(f"{table_name}: {self.load_tallies[table_name]['rows']} records loaded")
+                else:
+                    estimate = estimates.get(table_name)
+                    self.logger.info(f"{table_name}: ~{estimate if estimate is not None else '?'} records "
+                                     f"(estimated, not loaded in this run)")
             
-            if negative_balances > 0:
-                self.logger.warning(f"Found {negative_balances} days with negative cash balances")
+            scopes = {t: tally['scope'] for t, tally in self.load_tallies.items() if tally.get('scope')}
+            if not self.validator.validate(scopes):
+                return False
             
             self.logger.info("[SUCCESS] Data validation completed successfully")
             self.logger.info("[SUCCESS] All foreign key relationships are valid")
@@ -365,4 +1171,4 @@ class ExcelToPostgreSQL:
                 
         except Exception as e:
             self.logger.error(f"Data validation failed: {e}")
-            return False
\ No newline at end of file
+            return False
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Export the umkm schema to Parquet snapshots partitioned by bisnis_id and month
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import shutil
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import psycopg2
+import yaml
+from dotenv import load_dotenv
+
+sys.path.append(str(Path(__file__).parent))
+
+try:
+    from data_version import DataVersionStore
+    from load_to_postgre import load_db_config
+except ImportError:
+    from pipeline.data_version import DataVersionStore
+    from pipeline.load_to_postgre import load_db_config
+
+PROJECT_ROOT = Path(__file__).parent.parent
+CONFIG_PATH = PROJECT_ROOT / "config" / "pipeline.yaml"
+
+# PostgreSQL type OIDs -> Arrow types (anything else is exported as text)
+_INTEGER_TYPES = {21: "int16", 23: "int32", 20: "int64"}
+_FLOAT_TYPES = {700: "float32", 701: "float64"}
+_TEXT_TYPES = {25, 1042, 1043}
+_NUMERIC, _BOOL, _DATE, _TIMESTAMP, _TIMESTAMPTZ = 1700, 16, 1082, 1114, 1184
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("pyarrow is required to export Parquet snapshots: pip install pyarrow")
+    return pyarrow
+
+
+class ParquetExporter:
+    """
+    Streams each umkm table out of PostgreSQL into Parquet files laid out as
+    <table>/bisnis_id=<id>/month=<YYYY-MM>/part-0.parquet, with a manifest.
+
+    Rows are read through server-side (named) cursors in batches, ordered by
+    partition, so memory stays constant whatever the table size. All tables are
+    read in one REPEATABLE READ transaction, so the snapshot is consistent.
+    """
+
+    def __init__(self, db_config: Dict[str, str], output_dir: Optional[Path] = None):
+        self.db_config = db_config
+        self.config = self._load_config()
+        self.export_config = self.config.get('export', {})
+        self.output_dir = Path(output_dir or PROJECT_ROOT / self.export_config.get('directory', 'data/snapshots'))
+        self.batch_rows = int(self.export_config.get('batch_rows', 50000))
+        self.conn = None
+        self.pa = _import_pyarrow()
+        self.logger = logging.getLogger(__name__)
+
+    def _load_config(self) -> Dict:
+        """Load configuration from pipeline.yaml"""
+        with open(CONFIG_PATH) as f:
+            return yaml.safe_load(f)
+
+    def connect_db(self) -> bool:
+        """Open a read-only, repeatable-read connection (one consistent snapshot for every table)"""
+        try:
+            self.conn = psycopg2.connect(**self.db_config)
+            self.conn.set_session(isolation_level='REPEATABLE READ', readonly=True)
+            self.logger.info(f"Connected to database: {self.db_config['database']}")
+            return True
+        except Exception as e:
+            self.logger.error(f"Database connection failed: {e}")
+            return False
+
+    def close_db(self) -> None:
+        if self.conn:
+            self.conn.close()
+        self.logger.info("Database connection closed")
+
+    def _arrow_type(self, column) -> Any:
+        """Arrow type for a cursor.description column"""
+        pa = self.pa
+        if column.type_code in _INTEGER_TYPES:
+            return getattr(pa, _INTEGER_TYPES[column.type_code])()
+        if column.type_code in _FLOAT_TYPES:
+            return getattr(pa, _FLOAT_TYPES[column.type_code])()
+        if column.type_code == _NUMERIC:
+            # NUMERIC(p,s) stays exact; unconstrained NUMERIC falls back to double
+            if column.precision and column.precision <= 38:
+                return pa.decimal128(column.precision, column.scale or 0)
+            return pa.float64()
+        if column.type_code == _BOOL:
+            return pa.bool_()
+        if column.type_code == _DATE:
+            return pa.date32()
+        if column.type_code == _TIMESTAMP:
+            return pa.timestamp("us")
+        if column.type_code == _TIMESTAMPTZ:
+            return pa.timestamp("us", tz="UTC")
+        return pa.string()
+
+    def _export_query(self, table_name: str) -> str:
+        """SELECT of every column plus the partition keys (_part_bisnis, _part_month), ordered by partition"""
+        schema = self.config['tables'][table_name]['schema']
+        settings = self.export_config.get('tables', {}).get(table_name) or {}
+        bisnis = settings.get('bisnis', 'NULL')
+        month = f"to_char({settings['date']}, 'YYYY-MM')" if settings.get('date') else 'NULL'
+        return (
+            f"SELECT t.*, {bisnis} AS _part_bisnis, {month} AS _part_month "
+            f"FROM {schema}.{table_name} t {settings.get('join', '')} "
+            f"ORDER BY _part_bisnis, _part_month, 1"
+        )
+
+    def _partition_path(self, table_name: str, bisnis_id, month) -> Path:
+        path = self.output_dir / table_name
+        if bisnis_id is not None:
+            path = path / f"bisnis_id={bisnis_id}"
+        if month is not None:
+            path = path / f"month={month}"
+        return path / "part-0.parquet"
+
+    def export_table(self, table_name: str) -> Dict[str, Any]:
+        """Stream one table into partitioned Parquet files; returns its manifest entry"""
+        pq = self.pa.parquet
+        cursor = self.conn.cursor(name=f"export_{table_name}")
+        cursor.itersize = self.batch_rows
+        cursor.execute(self._export_query(table_name))
+
+        writer, current_key, schema = None, None, None
+        rows_total, files, max_values = 0, [], {}
+        value_columns, temporal_columns = [], []
+        try:
+            while True:
+                batch = cursor.fetchmany(self.batch_rows)
+                if not batch:
+                    break
+                if schema is None:
+                    # Named cursors only describe their columns after the first fetch
+                    value_columns = [c for c in cursor.description if c.name not in ("_part_bisnis", "_part_month")]
+                    schema = self.pa.schema([(c.name, self._arrow_type(c)) for c in value_columns])
+                    temporal_columns = [i for i, c in enumerate(value_columns)
+                                        if c.type_code in (_DATE, _TIMESTAMP, _TIMESTAMPTZ)]
+
+                width = len(value_columns)
+                for key, group in itertools.groupby(batch, key=lambda row: (row[width], row[width + 1])):
+                    rows = [row[:width] for row in group]
+                    if key != current_key:
+                        if writer:
+                            writer.close()
+                        path = self._partition_path(table_name, *key)
+                        path.parent.mkdir(parents=True, exist_ok=True)
+                        writer = pq.ParquetWriter(str(path), schema, compression="zstd")
+                        files.append(str(path.relative_to(self.output_dir)))
+                        current_key = key
+
+                    columns = list(zip(*rows))
+                    arrays = [
+                        self.pa.array(values if not self.pa.types.is_string(field.type)
+                                      else [None if v is None else str(v) for v in values], type=field.type)
+                        for values, field in zip(columns, schema)
+                    ]
+                    writer.write_table(self.pa.Table.from_arrays(arrays, schema=schema))
+
+                    for i in temporal_columns:
+                        present = [v for v in columns[i] if v is not None]
+                        if present:
+                            name = value_columns[i].name
+                            latest = max(present)
+                            if name not in max_values or latest > max_values[name]:
+                                max_values[name] = latest
+                    rows_total += len(rows)
+        finally:
+            if writer:
+                writer.close()
+            cursor.close()
+
+        self.logger.info(f"Exported {rows_total:,} rows of {table_name} into {len(files)} files")
+        return {
+            "rows": rows_total,
+            "columns": [c.name for c in value_columns],
+            "partitions": len(files),
+            "files": files,
+            "max_timestamps": {name: value.isoformat() for name, value in max_values.items()}
+        }
+
+    def export_all(self) -> Dict[str, Any]:
+        """
+        Export every table in load order into a fresh directory and swap it in for the
+        previous snapshot, so readers never see a half-written export
+
+        Returns:
+            Dict[str, Any]: The manifest (also written to manifest.json)
+        """
+        final_dir = self.output_dir
+        build_dir = final_dir.with_name(final_dir.name + ".build")
+        if build_dir.exists():
+            shutil.rmtree(build_dir)
+        build_dir.mkdir(parents=True)
+
+        start = time.perf_counter()
+        self.output_dir = build_dir
+        try:
+            manifest = {
+                "exported_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "database": self.db_config['database'],
+                "data_version": DataVersionStore().current(),
+                "layout": "<table>/bisnis_id=<id>/month=<YYYY-MM>/part-0.parquet",
+                "tables": {}
+            }
+            for table_name in self.config['load_order']:
+                manifest["tables"][table_name] = self.export_table(table_name)
+            self.conn.rollback()  # End the read-only snapshot transaction
+            manifest["seconds"] = round(time.perf_counter() - start, 2)
+
+            with open(build_dir / "manifest.json", "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=2)
+        except Exception:
+            shutil.rmtree(build_dir, ignore_errors=True)
+            raise
+        finally:
+            self.output_dir = final_dir
+
+        old_dir = final_dir.with_name(final_dir.name + ".old")
+        if old_dir.exists():
+            shutil.rmtree(old_dir)
+        if final_dir.exists():
+            final_dir.rename(old_dir)
+        build_dir.rename(final_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+        total = sum(t["rows"] for t in manifest["tables"].values())
+        self.logger.info(f"Snapshot of {total:,} rows written to {final_dir} in {manifest['seconds']}s")
+        return manifest
+
+
+def main() -> int:
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Export the umkm schema to partitioned Parquet snapshots")
+    parser.add_argument("--output", "-o", type=Path, help="Snapshot directory (default: export.directory)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+    load_dotenv()
+    exporter = ParquetExporter(load_db_config(), output_dir=args.output)
+    if not exporter.connect_db():
+        return 1
+    try:
+        exporter.export_all()
+        return 0
+    except Exception as e:
+        logging.getLogger(__name__).error(f"Export failed: {e}")
+        return 1
+    finally:
+        exporter.close_db()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,6 +3,7 @@
 Main script for UMKM Excel to PostgreSQL data loading pipeline
 """
 
+import argparse
 import os
 import sys
 from pathlib import Path
@@ -107,10 +108,20 @@ def display_summary(total_loaded: int, validation_passed: bool, logger):
     
     logger.info("=" * 50)
 
-def main() -> int:
+def parse_args(argv=None) -> argparse.Namespace:
+    """Command line options"""
+    parser = argparse.ArgumentParser(description="Load the UMKM Excel files into PostgreSQL")
+    parser.add_argument(
+        "--resume", action="store_true",
+        help="Skip tables already loaded from identical files (per the run ledger) and reload the rest"
+    )
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
     """Main execution function"""
     loader = None
     logger = None
+    args = parse_args(argv)
     
     try:
         # Setup logging first
@@ -164,8 +175,16 @@ def main() -> int:
             return 1
         
         # Process all files
-        logger.info("Starting file processing...")
-        total_loaded = loader.process_all_files(data_dir)
+        logger.info("Starting file processing..." + (" (resume)" if args.resume else ""))
+        total_loaded = loader.process_all_files(data_dir, resume=args.resume)
+        for table_name, rejected in loader.rejected_rows.items():
+            logger.warning(f"{table_name}: {rejected:,} rows rejected for missing parent records (see reject report)")
+        if loader.ledger and loader.run_id:
+            logger.info(f"Run {loader.run_id} recorded in the run ledger")
+        
+        if args.resume and loader.skipped_tables == loader.config['load_order']:
+            logger.info("[SUCCESS] All tables already loaded from identical files, nothing to do")
+            return 0
         
         if total_loaded > 0:
             logger.info(f"File processing completed - {total_loaded:,} records loaded")
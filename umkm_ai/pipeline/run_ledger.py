@@ -0,0 +1,129 @@
+import hashlib
+import logging
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+LEDGER_TABLE = "pipeline.run_ledger"
+
+LEDGER_DDL = """
+CREATE SCHEMA IF NOT EXISTS pipeline;
+CREATE TABLE IF NOT EXISTS pipeline.run_ledger (
+    entry_id BIGSERIAL PRIMARY KEY,
+    run_id VARCHAR(40) NOT NULL,
+    table_name VARCHAR(63) NOT NULL,
+    file_name TEXT,
+    checksum VARCHAR(64),
+    row_count INTEGER,
+    rejected_rows INTEGER,
+    status VARCHAR(10) NOT NULL CHECK (status IN ('running', 'loaded', 'failed', 'skipped', 'cleared', 'discarded')),
+    target VARCHAR(6) NOT NULL DEFAULT 'live' CHECK (target IN ('live', 'shadow')),
+    started_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP,
+    duration_seconds NUMERIC(10,3),
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_run_ledger_table ON pipeline.run_ledger(table_name, entry_id);
+"""
+
+
+def file_checksum(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def new_run_id() -> str:
+    return f"{datetime.now():%Y%m%d_%H%M%S}_{uuid.uuid4().hex[:6]}"
+
+
+class RunLedger:
+    """
+    Per-table record of pipeline runs (pipeline.run_ledger): file checksum, row counts,
+    duration and status, for either the live table or its shadow copy (target). A
+    table's latest non-skipped, non-discarded entry for a target says whether that
+    copy matches a file: 'loaded' means it does (with that checksum); 'cleared',
+    'failed' and 'running' mean it must be reloaded.
+
+    Shadow entries become live entries when the shadow tables are swapped in, and are
+    discarded when the shadow tables are dropped or recreated.
+
+    Entries are written on the loader's connection and committed immediately, so they
+    survive a failing load.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.logger = logging.getLogger(__name__)
+
+    def ensure_table(self) -> None:
+        with self.conn.cursor() as cursor:
+            cursor.execute(LEDGER_DDL)
+        self.conn.commit()
+
+    def start(self, run_id: str, table_name: str, file_name: Optional[str] = None,
+              checksum: Optional[str] = None, status: str = "running", target: str = "live") -> int:
+        """Open an entry; returns its id"""
+        with self.conn.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {LEDGER_TABLE} (run_id, table_name, file_name, checksum, status, target) "
+                f"VALUES (%s, %s, %s, %s, %s, %s) RETURNING entry_id",
+                (run_id, table_name, file_name, checksum, status, target)
+            )
+            entry_id = cursor.fetchone()[0]
+        self.conn.commit()
+        return entry_id
+
+    def finish(self, entry_id: int, status: str, row_count: Optional[int] = None,
+               rejected_rows: Optional[int] = None, error: Optional[str] = None) -> None:
+        with self.conn.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {LEDGER_TABLE} SET status = %s, row_count = %s, rejected_rows = %s, error = %s, "
+                f"finished_at = CURRENT_TIMESTAMP, "
+                f"duration_seconds = EXTRACT(EPOCH FROM (clock_timestamp() - started_at)) "
+                f"WHERE entry_id = %s",
+                (status, row_count, rejected_rows, error, entry_id)
+            )
+        self.conn.commit()
+
+    def record(self, run_id: str, table_name: str, status: str, error: Optional[str] = None,
+               target: str = "live") -> None:
+        """One-shot entry (cleared / skipped)"""
+        self.finish(self.start(run_id, table_name, status=status, target=target), status, error=error)
+
+    def promote_shadow(self) -> None:
+        """The shadow tables were swapped in: their entries now describe the live tables"""
+        with self.conn.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {LEDGER_TABLE} SET target = 'live' WHERE target = 'shadow' AND status <> 'discarded'")
+        self.conn.commit()
+
+    def discard_shadow(self) -> None:
+        """The shadow tables were dropped or are being recreated: their entries no longer describe anything"""
+        with self.conn.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {LEDGER_TABLE} SET status = 'discarded' WHERE target = 'shadow' AND status <> 'discarded'")
+        self.conn.commit()
+
+    def has_shadow_entries(self) -> bool:
+        """True when kept shadow tables hold data from an unfinished shadow reload"""
+        with self.conn.cursor() as cursor:
+            cursor.execute(
+                f"SELECT EXISTS (SELECT 1 FROM {LEDGER_TABLE} WHERE target = 'shadow' "
+                f"AND status NOT IN ('discarded', 'skipped'))")
+            return cursor.fetchone()[0]
+
+    def is_current(self, table_name: str, checksum: Optional[str], target: str = "live") -> bool:
+        """True when the table (or its shadow copy) was last loaded successfully from a file with this checksum"""
+        with self.conn.cursor() as cursor:
+            cursor.execute(
+                f"SELECT status, checksum FROM {LEDGER_TABLE} "
+                f"WHERE table_name = %s AND target = %s AND status NOT IN ('skipped', 'discarded') "
+                f"ORDER BY entry_id DESC LIMIT 1",
+                (table_name, target))
+            row = cursor.fetchone()
+        return bool(row) and row[0] == "loaded" and checksum is not None and row[1] == checksum
@@ -0,0 +1,148 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import psycopg2
+
+# A scope limits a check to the rows a load touched: (SQL predicate, parameters)
+Scope = Tuple[str, List[Any]]
+FULL_SCOPE: Scope = ("TRUE", [])
+
+
+class Check:
+    """One integrity check: a COUNT query whose result is the number of offending rows"""
+
+    def __init__(self, name: str, table: str, sql: str, params: List[Any], severity: str = "error"):
+        self.name = name
+        self.table = table
+        self.sql = sql
+        self.params = params
+        self.severity = severity
+
+
+class ValidationEngine:
+    """
+    Integrity checks for loaded UMKM data, scoped to what a load touched.
+
+    Checks are generated from pipeline.yaml (foreign_keys, plus cash-book rules for
+    kas_harian) and restricted by a scope per table, typically the primary key range
+    of the rows just loaded, so their cost follows the batch size, not the table size.
+    After a load they run in parallel, one connection per worker; during an
+    incremental load they run on the loader's own cursor, inside its transaction.
+    """
+
+    def __init__(self, db_config: Dict[str, str], config: Dict, max_workers: int = 4):
+        self.db_config = db_config
+        self.config = config
+        self.max_workers = max_workers
+        self.logger = logging.getLogger(__name__)
+
+    def _table(self, table_name: str, qualify=None) -> str:
+        if qualify:
+            return qualify(table_name)
+        return f"{self.config['tables'][table_name]['schema']}.{table_name}"
+
+    def build_checks(self, scopes: Dict[str, Scope], qualify=None) -> List[Check]:
+        """
+        Checks for the scoped tables
+
+        Args:
+            scopes (Dict[str, Scope]): Tables to check and the rows to check in each
+            qualify (Callable): Maps a table name to the table to query (default: the live table)
+        """
+        checks = []
+        for table_name, (predicate, params) in scopes.items():
+            child = self._table(table_name, qualify)
+            for column, reference in (self.config.get('foreign_keys', {}).get(table_name) or {}).items():
+                parent_table, parent_column = reference.split('.')
+                parent = self._table(parent_table, qualify)
+                checks.append(Check(
+                    f"{table_name}.{column} -> {reference}", table_name,
+                    f"SELECT COUNT(*) FROM {child} c WHERE ({predicate}) AND c.{column} IS NOT NULL "
+                    f"AND NOT EXISTS (SELECT 1 FROM {parent} p WHERE p.{parent_column} = c.{column})",
+                    params
+                ))
+
+            if table_name == 'kas_harian':
+                checks.append(Check(
+                    "kas_harian negative balance", table_name,
+                    f"SELECT COUNT(*) FROM {child} WHERE ({predicate}) AND saldo_akhir < 0",
+                    params, severity="warning"
+                ))
+                # Each day must open with the previous day's closing balance. The window only reads
+                # the scoped rows plus, per business, the last row before them
+                checks.append(Check(
+                    "kas_harian balance continuity", table_name,
+                    f"WITH scoped AS (SELECT bisnis_id AS scoped_bisnis, MIN(tanggal) AS first_day "
+                    f"FROM {child} WHERE ({predicate}) GROUP BY bisnis_id), "
+                    f"bounds AS (SELECT scoped_bisnis, COALESCE((SELECT MAX(p.tanggal) FROM {child} p "
+                    f"WHERE p.bisnis_id = scoped_bisnis AND p.tanggal < first_day), first_day) AS from_day "
+                    f"FROM scoped) "
+                    f"SELECT COUNT(*) FROM (SELECT saldo_awal, LAG(saldo_akhir) OVER "
+                    f"(PARTITION BY bisnis_id ORDER BY tanggal) AS previous_saldo, ({predicate}) AS in_scope "
+                    f"FROM {child} JOIN bounds ON bisnis_id = scoped_bisnis AND tanggal >= from_day) k "
+                    f"WHERE in_scope AND previous_saldo IS NOT NULL AND saldo_awal <> previous_saldo",
+                    params + params
+                ))
+        return checks
+
+    def _run_check(self, check: Check, cursor=None) -> Dict[str, Any]:
+        start = time.perf_counter()
+        result = {"name": check.name, "table": check.table, "severity": check.severity,
+                  "violations": None, "error": None}
+        try:
+            if cursor is not None:
+                cursor.execute(check.sql, check.params)
+                result["violations"] = cursor.fetchone()[0]
+            else:
+                conn = psycopg2.connect(**self.db_config)
+                try:
+                    conn.set_session(readonly=True)
+                    with conn.cursor() as own_cursor:
+                        own_cursor.execute(check.sql, check.params)
+                        result["violations"] = own_cursor.fetchone()[0]
+                finally:
+                    conn.close()
+        except Exception as e:
+            result["error"] = str(e)
+        result["seconds"] = round(time.perf_counter() - start, 3)
+        return result
+
+    def run(self, checks: List[Check], cursor=None) -> List[Dict[str, Any]]:
+        """Run checks in parallel on separate connections, or in order on `cursor` when given"""
+        if cursor is not None:
+            return [self._run_check(check, cursor) for check in checks]
+        if not checks:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(checks))) as executor:
+            return list(executor.map(self._run_check, checks))
+
+    def report(self, results: List[Dict[str, Any]]) -> bool:
+        """Log results; False if any error-severity check found violations or could not run"""
+        passed = True
+        for r in results:
+            if r["error"]:
+                self.logger.error(f"Check '{r['name']}' could not run: {r['error']}")
+                passed = False
+            elif r["violations"]:
+                log = self.logger.error if r["severity"] == "error" else self.logger.warning
+                log(f"Check '{r['name']}': {r['violations']} violating rows ({r['seconds']}s)")
+                passed = passed and r["severity"] != "error"
+            else:
+                self.logger.info(f"Check '{r['name']}': OK ({r['seconds']}s)")
+        return passed
+
+    def validate(self, scopes: Dict[str, Scope], cursor=None, qualify=None) -> bool:
+        results = self.run(self.build_checks(scopes, qualify), cursor=cursor)
+        return self.report(results)
+
+    def estimated_row_counts(self, cursor, tables: List[str]) -> Dict[str, Optional[int]]:
+        """Planner row estimates (pg_class.reltuples): constant time, for tables without load tallies"""
+        estimates = {}
+        for table_name in tables:
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)",
+                           (self._table(table_name),))
+            row = cursor.fetchone()
+            estimates[table_name] = int(row[0]) if row and row[0] is not None and row[0] >= 0 else None
+        return estimates
@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""
+Watch-folder ingestion service: loads new or changed Excel files from the data directory
+into PostgreSQL incrementally, as they arrive
+"""
+
+import argparse
+import logging
+import signal
+import sys
+import threading
+import time
+from datetime import date
+from pathlib import Path
+from typing import Dict, Optional, Set
+
+from dotenv import load_dotenv
+
+sys.path.append(str(Path(__file__).parent))
+
+try:
+    from data_version import DataVersionStore
+    from excel_to_postgre import KAS_SOURCES, ExcelToPostgreSQL
+    from load_to_postgre import load_db_config
+    from run_ledger import new_run_id
+except ImportError:
+    from pipeline.data_version import DataVersionStore
+    from pipeline.excel_to_postgre import KAS_SOURCES, ExcelToPostgreSQL
+    from pipeline.load_to_postgre import load_db_config
+    from pipeline.run_ledger import new_run_id
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+# File system events that mean a file's content may have changed (not opened / read)
+_CHANGE_EVENTS = {"created", "modified", "moved", "closed"}
+
+
+class IngestionService:
+    """
+    Watches paths.data_directory (inotify through watchdog, or polling when watchdog is
+    missing or disabled) and loads each new or changed mapped file with
+    ExcelToPostgreSQL.load_incremental: only rows with new primary keys are inserted into
+    the live tables. Derived kas_harian is re-derived from the earliest changed day.
+
+    Each table has its own worker thread and database connection. A table waits while
+    any table it depends on (foreign_keys, partition copy_from and kas_harian sources,
+    earlier in load_order) has pending or running work, so parents always land before
+    their children; unrelated tables load in parallel. Writes are debounced: a file is
+    loaded once it has been quiet for watch.debounce_seconds. Every load that changes
+    data bumps the data version, which invalidates the chatbot's caches.
+    """
+
+    def __init__(self, db_config: Dict[str, str], data_dir: Optional[Path] = None):
+        self.db_config = db_config
+        self.loader = ExcelToPostgreSQL(db_config)  # Configuration and logging setup
+        self.config = self.loader.config
+        self.watch_config = self.config.get('watch', {})
+        self.data_dir = Path(data_dir or PROJECT_ROOT / self.config['paths'].get('data_directory', 'data'))
+        self.debounce_seconds = float(self.watch_config.get('debounce_seconds', 2.0))
+        self.poll_seconds = float(self.watch_config.get('poll_seconds', 1.0))
+        self.max_retries = int(self.watch_config.get('max_retries', 3))
+        self.retry_seconds = float(self.watch_config.get('retry_seconds', 30))
+        self.derives_kas = bool(self.config.get('derived', {}).get('kas_harian', {}).get('enabled', False))
+        self.logger = logging.getLogger(__name__)
+
+        load_order = self.config['load_order']
+        self.files = {
+            file_name: table_name for file_name, table_name in self.config['file_mappings'].items()
+            if table_name in load_order and not (table_name == 'kas_harian' and self.derives_kas)
+        }
+        self.tables = [t for t in load_order if t in self.files.values() or (t == 'kas_harian' and self.derives_kas)]
+        self.upstream = self._upstream_tables()
+
+        self.run_id = new_run_id()
+        self.data_version = DataVersionStore()
+        self.condition = threading.Condition()
+        self.version_lock = threading.Lock()
+        self.published_version = self.data_version.current()  # Data version after this service's last bump
+        self.cache_generation = 0                 # Bumped when the data changed outside this service
+        self.stop_event = threading.Event()
+        self.pending: Dict[str, float] = {}       # table -> monotonic time it becomes due
+        self.running: Set[str] = set()
+        self.forced: Set[str] = set()             # Reload even if the ledger shows the file unchanged
+        self.failures: Dict[str, int] = {}
+        self.rejected: Dict[str, int] = {}        # Rows rejected by each table's last load
+        self.kas_from: Optional[date] = None
+        self.kas_full = False
+        self.workers = []
+        self.observer = None
+
+    def _upstream_tables(self) -> Dict[str, Set[str]]:
+        """Tables each table depends on (transitively), restricted to tables earlier in load_order"""
+        load_order = self.config['load_order']
+        direct = {}
+        for table_name in load_order:
+            parents = {reference.split('.')[0]
+                       for reference in (self.config.get('foreign_keys', {}).get(table_name) or {}).values()}
+            source = ((self.config.get('partitioning', {}).get(table_name) or {}).get('copy_from') or {})
+            if source.get('table'):
+                parents.add(source['table'])
+            if table_name == 'kas_harian' and self.derives_kas:
+                parents.update(KAS_SOURCES)
+            position = load_order.index(table_name)
+            direct[table_name] = {p for p in parents if p in load_order and load_order.index(p) < position}
+
+        upstream = {}
+        for table_name in load_order:
+            seen, stack = set(), list(direct[table_name])
+            while stack:
+                parent = stack.pop()
+                if parent not in seen:
+                    seen.add(parent)
+                    stack.extend(direct[parent])
+            upstream[table_name] = seen
+        return upstream
+
+    # Events
+
+    def notify(self, path: Path) -> None:
+        """A file changed: (re)schedule its table after the debounce period"""
+        table_name = self.files.get(path.name)
+        if not table_name:
+            return
+        with self.condition:
+            self.pending[table_name] = time.monotonic() + self.debounce_seconds
+            self.failures.pop(table_name, None)
+            self.condition.notify_all()
+
+    def _schedule(self, table_name: str, delay: float = 0.0, force: bool = False) -> None:
+        """Queue a table (caller holds the condition)"""
+        due = time.monotonic() + delay
+        self.pending[table_name] = max(self.pending.get(table_name, due), due)
+        if force:
+            self.forced.add(table_name)
+        self.condition.notify_all()
+
+    def _start_observer(self) -> bool:
+        """Watch the data directory with inotify (watchdog); False when unavailable"""
+        if not self.watch_config.get('use_inotify', True):
+            return False
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            self.logger.info("watchdog is not installed, polling the data directory instead")
+            return False
+
+        service = self
+
+        class DataDirectoryHandler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if event.is_directory or event.event_type not in _CHANGE_EVENTS:
+                    return
+                for path in (event.src_path, getattr(event, 'dest_path', '')):
+                    if path:
+                        service.notify(Path(path))
+
+        try:
+            self.observer = Observer()
+            self.observer.schedule(DataDirectoryHandler(), str(self.data_dir), recursive=False)
+            self.observer.start()
+        except Exception as e:
+            self.logger.warning(f"Could not watch {self.data_dir} ({e}), polling instead")
+            self.observer = None
+            return False
+        self.logger.info(f"Watching {self.data_dir} for changes (inotify)")
+        return True
+
+    def _file_states(self) -> Dict[str, tuple]:
+        states = {}
+        for file_name in self.files:
+            try:
+                stat = (self.data_dir / file_name).stat()
+                states[file_name] = (stat.st_mtime_ns, stat.st_size)
+            except FileNotFoundError:
+                pass
+        return states
+
+    def _poll(self) -> None:
+        """Polling fallback: compare modification time and size of the mapped files"""
+        self.logger.info(f"Polling {self.data_dir} every {self.poll_seconds}s")
+        states = self._file_states()
+        while not self.stop_event.wait(self.poll_seconds):
+            current = self._file_states()
+            for file_name, state in current.items():
+                if states.get(file_name) != state:
+                    self.notify(self.data_dir / file_name)
+            states = current
+
+    # Workers
+
+    def _ready(self, table_name: str, now: float) -> bool:
+        if table_name not in self.pending or self.pending[table_name] > now:
+            return False
+        busy = set(self.pending) | self.running
+        return not (self.upstream[table_name] & busy)
+
+    def _next_wait(self, now: float) -> float:
+        due = [t - now for t in self.pending.values() if t > now]
+        return min(due + [1.0])
+
+    def _worker(self, table_name: str) -> None:
+        loader = ExcelToPostgreSQL(self.db_config)
+        while not self.stop_event.is_set() and not loader.connect_db():
+            self.logger.error(f"{table_name} worker cannot connect, retrying in {self.retry_seconds}s")
+            self.stop_event.wait(self.retry_seconds)
+        loader.run_id = self.run_id
+        cache_generation = self.cache_generation
+
+        try:
+            while not self.stop_event.is_set():
+                with self.condition:
+                    now = time.monotonic()
+                    if not self._ready(table_name, now):
+                        self.condition.wait(timeout=self._next_wait(now))
+                        continue
+                    del self.pending[table_name]
+                    self.running.add(table_name)
+                    force = table_name in self.forced
+                    self.forced.discard(table_name)
+                    kas_from, kas_full = self.kas_from, self.kas_full
+                    if table_name == 'kas_harian' and self.derives_kas:
+                        self.kas_from, self.kas_full = None, False
+                try:
+                    if self._check_outside_changes() != cache_generation:
+                        # Cached parent keys and partition values may be gone (reload, manual delete)
+                        loader.reset_caches()
+                        cache_generation = self.cache_generation
+                    if table_name == 'kas_harian' and self.derives_kas:
+                        self._derive_kas(loader, None if kas_full else kas_from)
+                    else:
+                        self._load(loader, table_name, force)
+                finally:
+                    with self.condition:
+                        self.running.discard(table_name)
+                        self.condition.notify_all()
+        finally:
+            loader.close_db()
+
+    def _load(self, loader: ExcelToPostgreSQL, table_name: str, force: bool) -> None:
+        file_name = next(f for f, t in self.files.items() if t == table_name)
+        file_path = self.data_dir / file_name
+        if not file_path.exists():
+            return
+
+        start = time.perf_counter()
+        rejected_before = loader.rejected_rows.get(table_name, 0)
+        count = loader.load_incremental(file_path, table_name, force=force)
+        kas_changed_from = loader.take_kas_changes()
+
+        with self.condition:
+            if count < 0:
+                self.failures[table_name] = self.failures.get(table_name, 0) + 1
+                if self.failures[table_name] <= self.max_retries:
+                    self.logger.warning(f"Loading {file_name} failed, retry {self.failures[table_name]}/"
+                                        f"{self.max_retries} in {self.retry_seconds}s")
+                    self._schedule(table_name, self.retry_seconds, force=True)
+                else:
+                    self.logger.error(f"Giving up on {file_name} until it changes again")
+                return
+            self.failures.pop(table_name, None)
+            self.rejected[table_name] = loader.rejected_rows.get(table_name, 0) - rejected_before
+
+            if count > 0:
+                # Children whose rows were rejected for missing parents get another chance
+                for child in self.tables:
+                    if table_name in self.upstream[child] and self.rejected.get(child):
+                        self._schedule(child, force=True)
+                if kas_changed_from and self.derives_kas:
+                    if self.kas_from is None or kas_changed_from < self.kas_from:
+                        self.kas_from = kas_changed_from
+                    self._schedule('kas_harian')
+
+        if count > 0:
+            self._bump([table_name])
+            self.logger.info(f"Ingested {count} new {table_name} rows from {file_name} "
+                             f"in {time.perf_counter() - start:.2f}s")
+
+    def _derive_kas(self, loader: ExcelToPostgreSQL, from_date: Optional[date]) -> None:
+        derived = loader.derive_incremental(from_date)
+        if derived < 0:
+            with self.condition:
+                # A failed partial rebuild leaves later balances stale: rebuild everything next time
+                self.kas_full = True
+                self._schedule('kas_harian', self.retry_seconds)
+            return
+        self._bump(['kas_harian'])
+
+    def _bump(self, tables) -> None:
+        """Publish a data-version bump (serialized: the store's read-modify-write is not atomic)"""
+        try:
+            with self.version_lock:
+                self._note_outside_changes()
+                self.published_version = self.data_version.bump(tables)
+        except Exception as e:
+            self.logger.warning(f"Could not update data version: {e}")
+
+    def _note_outside_changes(self) -> None:
+        """Start a new cache generation if someone else bumped the data version (caller holds version_lock)"""
+        current = self.data_version.current()
+        if current != self.published_version:
+            self.logger.info(f"Data version moved to {current} outside the ingestion service, dropping loader caches")
+            self.cache_generation += 1
+            self.published_version = current
+
+    def _check_outside_changes(self) -> int:
+        """Current cache generation, after checking the data version for outside changes"""
+        with self.version_lock:
+            self._note_outside_changes()
+            return self.cache_generation
+
+    # Lifecycle
+
+    def start(self) -> None:
+        if not self.data_dir.exists():
+            raise FileNotFoundError(f"Data directory not found: {self.data_dir}")
+
+        for table_name in self.tables:
+            worker = threading.Thread(target=self._worker, args=(table_name,), name=f"ingest-{table_name}",
+                                      daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+        if not self._start_observer():
+            poller = threading.Thread(target=self._poll, name="ingest-poll", daemon=True)
+            poller.start()
+            self.workers.append(poller)
+
+        # Catch up on files that changed while the service was down (unchanged ones are skipped)
+        with self.condition:
+            for table_name in self.files.values():
+                self._schedule(table_name)
+        self.logger.info(f"Ingestion service started (run {self.run_id}): {', '.join(self.tables)}")
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        with self.condition:
+            self.condition.notify_all()
+        if self.observer:
+            self.observer.stop()
+            self.observer.join()
+        for worker in self.workers:
+            worker.join(timeout=30)
+        self.loader.close_db()
+        self.logger.info("Ingestion service stopped")
+
+
+def main() -> int:
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Continuously load new and changed UMKM Excel files")
+    parser.add_argument("--data-dir", type=Path, help="Directory to watch (default: paths.data_directory)")
+    args = parser.parse_args()
+
+    load_dotenv()
+    try:
+        service = IngestionService(load_db_config(), data_dir=args.data_dir)
+        service.start()
+    except Exception as e:
+        logging.getLogger(__name__).error(f"Could not start ingestion service: {e}")
+        return 1
+
+    signal.signal(signal.SIGTERM, lambda *_: service.stop_event.set())
+    try:
+        while not service.stop_event.wait(1.0):
+            pass
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,39 @@
+import pytest
+
+from agents.query_guard import QueryGuard, QueryRejected, is_single_statement
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT 1",
+    "SELECT * FROM penjualan WHERE catatan = 'a;b'",
+    "SELECT * FROM penjualan WHERE catatan = 'it''s; fine'",
+    r"SELECT E'\';' AS x",
+    "SELECT $$;$$, $tag$ a; b $tag$",
+    'SELECT 1 AS "a;b"',
+    "SELECT 1 -- ; trailing comment",
+    "SELECT /* ; */ 1",
+])
+def test_semicolons_inside_literals_and_comments_are_one_statement(sql):
+    assert is_single_statement(sql)
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT 1; COMMIT; DELETE FROM umkm.penjualan",
+    "SELECT 'a;b'; DROP TABLE umkm.produk",
+    r"SELECT E'\'' ; DELETE FROM umkm.produk",
+    "SELECT $$x$$; SELECT 2",
+    'SELECT 1 AS "a"; SELECT 2',
+    "SELECT 1 -- comment\n; DELETE FROM umkm.bisnis",
+    "SELECT /* ; */ 1; SELECT 2",
+    "SELECT a$b$c; SELECT $b$",
+])
+def test_semicolons_in_code_are_several_statements(sql):
+    assert not is_single_statement(sql)
+
+
+def test_run_rejects_before_touching_the_database():
+    guard = QueryGuard(engine=None)
+    with pytest.raises(QueryRejected):
+        guard.run("SELECT 1; COMMIT; DELETE FROM umkm.penjualan")
+    with pytest.raises(QueryRejected):
+        guard.run("DELETE FROM umkm.penjualan")
@@ -0,0 +1,36 @@
+import pytest
+
+pytest.importorskip("langchain_core")
+pytest.importorskip("langchain_community")
+
+from agents.sql_tools import is_cacheable, normalize_sql, referenced_tables  # noqa: E402
+
+
+def test_normalize_sql_ignores_case_whitespace_and_comments():
+    assert normalize_sql("SELECT  *\nFROM Penjualan -- latest\n;") == normalize_sql("select * from penjualan")
+    assert normalize_sql("SELECT /* all */ * FROM produk") == "select * from produk"
+
+
+def test_normalize_sql_keeps_string_literals_verbatim():
+    assert normalize_sql("SELECT * FROM penjualan WHERE metode = 'QRIS'") != \
+        normalize_sql("SELECT * FROM penjualan WHERE metode = 'qris'")
+    assert "'it''s  --  here'" in normalize_sql("SELECT 'it''s  --  here'")
+
+
+def test_referenced_tables_skips_string_literals():
+    assert referenced_tables("SELECT * FROM umkm.penjualan p JOIN detail_penjualan d USING (nomor_transaksi)") == \
+        ("detail_penjualan", "penjualan")
+    assert referenced_tables("SELECT * FROM produk WHERE nama = 'kas_harian'") == ("produk",)
+    assert referenced_tables("SELECT 1") == ()
+
+
+@pytest.mark.parametrize("sql, cacheable", [
+    ("SELECT sum(total) FROM penjualan", True),
+    ("SELECT * FROM penjualan WHERE tanggal > now() - interval '7 days'", False),
+    ("SELECT * FROM pengeluaran WHERE tanggal = CURRENT_DATE", False),
+    ("SELECT * FROM produk ORDER BY random() LIMIT 3", False),
+    ("SELECT * FROM penjualan WHERE catatan = 'now()'", True),
+    ("SELECT count(*) FROM information_schema.tables", False),
+])
+def test_is_cacheable(sql, cacheable):
+    assert is_cacheable(sql) is cacheable